@@ -0,0 +1,294 @@
+from django.db.models import F, Q, FilteredRelation
+from pantry.models import Product, PantryItem, UserProductConflict
+from users.models import UserSettings
+from .utils import get_localised_names
+
+
+class ConflictProfile:
+    """
+    A user's allergens and dietary requirements, interned as integer bitsets.
+
+    Each of the user's allergens and required label tags is given one bit, so that
+    checking a product comes down to a bitwise AND against the user's masks.
+    """
+    def __init__(self, allergens=(), required_tags=(), language_code='en'):
+        # allergens are (id, api_tag) pairs, ordered by tag so warnings are listed consistently
+        allergens = sorted(allergens, key=lambda allergen: allergen[1])
+        required_tags = sorted(required_tags)
+
+        self.language_code = language_code
+        self.allergen_bits = {allergen_id: 1 << i for i, (allergen_id, _) in enumerate(allergens)}
+        self.allergen_tags = [api_tag for _, api_tag in allergens]
+        self.allergen_mask = (1 << len(allergens)) - 1
+        self.label_bits = {api_tag: 1 << i for i, api_tag in enumerate(required_tags)}
+        self.required_tags = required_tags
+        self.required_mask = (1 << len(required_tags)) - 1
+
+    @classmethod
+    def from_profile(cls, profile):
+        """Builds the conflict profile from a request's `UserProfile`, without any queries."""
+        if profile is None:
+            return None
+        return cls(allergens=profile.allergens, required_tags=profile.dietary_tags, language_code=profile.language_code)
+
+    @classmethod
+    def for_users(cls, user_ids):
+        """Builds the profiles of several users at once, keyed by user id, in three queries."""
+        settings_by_id = dict(UserSettings.objects.filter(user_id__in=user_ids).values_list('id', 'user_id'))
+        allergens = {settings_id: [] for settings_id in settings_by_id}
+        required_tags = {settings_id: [] for settings_id in settings_by_id}
+
+        user_allergens = UserSettings.allergens.through.objects.filter(
+            usersettings_id__in=list(settings_by_id)
+        ).values_list('usersettings_id', 'allergen_id', 'allergen__api_tag')
+        for settings_id, allergen_id, api_tag in user_allergens:
+            allergens[settings_id].append((allergen_id, api_tag))
+
+        user_requirements = UserSettings.dietary_requirements.through.objects.filter(
+            usersettings_id__in=list(settings_by_id)
+        ).values_list('usersettings_id', 'dietaryrequirement__api_tag')
+        for settings_id, api_tag in user_requirements:
+            required_tags[settings_id].append(api_tag)
+
+        return {
+            user_id: cls(allergens=allergens[settings_id], required_tags=required_tags[settings_id])
+            for settings_id, user_id in settings_by_id.items()
+        }
+
+    @property
+    def is_empty(self):
+        return not self.allergen_mask and not self.required_mask
+
+    def tags_for_bits(self, allergen_bits, missing_label_bits):
+        """Returns the allergen and label tags whose bits are set, in profile order."""
+        return (
+            [tag for i, tag in enumerate(self.allergen_tags) if allergen_bits & (1 << i)],
+            [tag for i, tag in enumerate(self.required_tags) if missing_label_bits & (1 << i)],
+        )
+
+
+class ProductConflicts:
+    """The allergen and dietary conflicts between one product and a user's profile."""
+    def __init__(self, conflicting_allergens=(), missing_dietary_tags=()):
+        self.conflicting_allergens = list(conflicting_allergens)
+        self.missing_dietary_tags = list(missing_dietary_tags)
+        self.has_allergen_conflict = bool(self.conflicting_allergens)
+        self.has_dietary_mismatch = bool(self.missing_dietary_tags)
+
+    def as_dict(self):
+        return {
+            'has_allergen_conflict': self.has_allergen_conflict,
+            'conflicting_allergens': list(self.conflicting_allergens),
+            'has_dietary_mismatch': self.has_dietary_mismatch,
+            'missing_dietary_tags': list(self.missing_dietary_tags),
+        }
+
+    def apply_to(self, obj):
+        """Sets the conflict data as attributes, for templates that read it from a product or pantry item."""
+        for attribute, value in self.as_dict().items():
+            setattr(obj, attribute, value)
+        return obj
+
+
+NO_CONFLICTS = ProductConflicts()
+
+
+def compute_conflict_tags(products, profile):
+    """
+    Computes the conflicts of a list of products with a user's profile, as API tags.
+
+    Returns a dict of `(conflicting allergen tags, missing dietary tags)` keyed by product
+    id. Allergens for every product are read in a single query on the product/allergen
+    through table, and dietary labels are checked against the products' stored label
+    tags, so the number of queries doesn't grow with the number of products.
+    """
+    products = list(products)
+    if profile is None or profile.is_empty or not products:
+        return {product.id: ([], []) for product in products}
+
+    allergen_masks = {}
+    if profile.allergen_mask:
+        product_allergens = Product.allergens.through.objects.filter(
+            product_id__in=[product.id for product in products],
+            allergen_id__in=list(profile.allergen_bits),
+        ).values_list('product_id', 'allergen_id')
+
+        for product_id, allergen_id in product_allergens:
+            allergen_masks[product_id] = allergen_masks.get(product_id, 0) | profile.allergen_bits[allergen_id]
+
+    conflict_tags = {}
+    for product in products:
+        missing_label_bits = 0
+        if profile.required_mask:
+            present_label_bits = 0
+            for tag in product.labels_tags or []:
+                present_label_bits |= profile.label_bits.get(tag, 0)
+            missing_label_bits = profile.required_mask & ~present_label_bits
+
+        conflict_tags[product.id] = profile.tags_for_bits(allergen_masks.get(product.id, 0), missing_label_bits)
+
+    return conflict_tags
+
+
+def localise_conflicts(conflict_tags, language_code):
+    """
+    Turns conflict tags, keyed by product id, into `ProductConflicts` with localised names.
+
+    Every tag is localised with a single lookup per facet, however many products share it.
+    """
+    allergen_tags = sorted({tag for allergens, _ in conflict_tags.values() for tag in allergens})
+    label_tags = sorted({tag for _, labels in conflict_tags.values() for tag in labels})
+    allergen_names = dict(zip(allergen_tags, get_localised_names(allergen_tags, 'allergens', language_code)))
+    label_names = dict(zip(label_tags, get_localised_names(label_tags, 'labels', language_code)))
+
+    conflicts = {}
+    for product_id, (allergens, labels) in conflict_tags.items():
+        if not allergens and not labels:
+            conflicts[product_id] = NO_CONFLICTS
+            continue
+        conflicts[product_id] = ProductConflicts(
+            conflicting_allergens=[allergen_names[tag] for tag in allergens],
+            missing_dietary_tags=[label_names[tag] for tag in labels],
+        )
+    return conflicts
+
+
+def get_product_conflicts(products, profile):
+    """
+    Returns the localised conflicts of a list of products with a user's profile, keyed by product id.
+
+    Used for products that aren't tracked in the user's conflict table, such as search results.
+    """
+    if profile is None:
+        return {product.id: NO_CONFLICTS for product in products}
+    return localise_conflicts(compute_conflict_tags(products, profile), profile.language_code)
+
+
+def store_conflicts(user_id, conflict_tags):
+    """Writes computed conflict tags for one user to the conflict table, in a single upsert."""
+    if not conflict_tags:
+        return
+    UserProductConflict.objects.bulk_create(
+        [
+            UserProductConflict(user_id=user_id, product_id=product_id, conflicting_allergens=allergens, missing_dietary_tags=labels)
+            for product_id, (allergens, labels) in conflict_tags.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'product'],
+        update_fields=['conflicting_allergens', 'missing_dietary_tags', 'updated'],
+    )
+
+
+def get_tracked_product_ids(user_id):
+    """Returns the ids of the products whose conflicts are stored for a user: those in their pantry or favourites."""
+    pantry_product_ids = PantryItem.objects.filter(pantry__user_id=user_id).values_list('product_id', flat=True)
+    favourite_product_ids = Product.favourited_by.through.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+    return set(pantry_product_ids) | set(favourite_product_ids)
+
+
+def track_products(user_id, product_ids):
+    """Computes and stores a user's conflicts with products entering their pantry or favourites."""
+    if not product_ids:
+        return
+    profile = ConflictProfile.for_users([user_id]).get(user_id)
+    products = Product.objects.filter(id__in=product_ids).only('id', 'labels_tags')
+    store_conflicts(user_id, compute_conflict_tags(products, profile))
+
+
+def untrack_products(user_id, product_ids):
+    """Drops stored conflicts for products that have left both the user's pantry and favourites."""
+    untracked_ids = set(product_ids) - get_tracked_product_ids(user_id)
+    if untracked_ids:
+        UserProductConflict.objects.filter(user_id=user_id, product_id__in=untracked_ids).delete()
+
+
+def refresh_user_conflicts(user_id):
+    """Recomputes every stored conflict of a user, after their allergens or dietary requirements change."""
+    tracked_ids = get_tracked_product_ids(user_id)
+    UserProductConflict.objects.filter(user_id=user_id).exclude(product_id__in=tracked_ids).delete()
+    track_products(user_id, tracked_ids)
+
+
+def refresh_product_conflicts(product_ids):
+    """
+    Recomputes the stored conflicts of products whose tags may have changed, for every
+    user tracking them. Costs a single query when none of the products are tracked.
+    Returns the ids of the users tracking any of the products.
+    """
+    if not product_ids:
+        return set()
+
+    tracked_pairs = list(
+        UserProductConflict.objects.filter(product_id__in=product_ids).values_list('user_id', 'product_id')
+    )
+    if not tracked_pairs:
+        return set()
+
+    products = Product.objects.in_bulk({product_id for _, product_id in tracked_pairs})
+    profiles = ConflictProfile.for_users({user_id for user_id, _ in tracked_pairs})
+
+    products_by_user = {}
+    for user_id, product_id in tracked_pairs:
+        if product_id in products:
+            products_by_user.setdefault(user_id, []).append(products[product_id])
+
+    for user_id, user_products in products_by_user.items():
+        store_conflicts(user_id, compute_conflict_tags(user_products, profiles.get(user_id)))
+
+    return {user_id for user_id, _ in tracked_pairs}
+
+
+def get_tracking_user_ids(product_ids):
+    """Returns the ids of the users tracking any of the products, in a single query."""
+    if not product_ids:
+        return set()
+    return set(UserProductConflict.objects.filter(product_id__in=product_ids).values_list('user_id', flat=True))
+
+
+def with_stored_conflicts(queryset, user, product_path=''):
+    """
+    Annotates a queryset with the user's stored conflicts through a single join.
+
+    `product_path` is the lookup from the queryset's model to `Product`, e.g.
+    `'product__'` for pantry items or `''` for products themselves.
+    """
+    return queryset.annotate(
+        stored_conflict=FilteredRelation(
+            f'{product_path}user_conflicts',
+            condition=Q(**{f'{product_path}user_conflicts__user': user}),
+        ),
+    ).annotate(
+        stored_conflict_id=F('stored_conflict__id'),
+        stored_conflicting_allergens=F('stored_conflict__conflicting_allergens'),
+        stored_missing_dietary_tags=F('stored_conflict__missing_dietary_tags'),
+    )
+
+
+def get_stored_conflict_tags(objects, user, get_product=lambda obj: obj):
+    """
+    Returns the conflict tags of objects annotated by `with_stored_conflicts`, keyed by product id.
+
+    Products with no stored row yet (e.g. tracked before the conflict table existed)
+    are computed in one batch and stored, so that later views find them.
+    """
+    conflict_tags = {}
+    missing_products = []
+
+    for obj in objects:
+        product = get_product(obj)
+        if obj.stored_conflict_id is None:
+            missing_products.append(product)
+        else:
+            conflict_tags[product.id] = (obj.stored_conflicting_allergens or [], obj.stored_missing_dietary_tags or [])
+
+    if missing_products:
+        computed_tags = compute_conflict_tags(missing_products, ConflictProfile.for_users([user.id]).get(user.id))
+        store_conflicts(user.id, computed_tags)
+        conflict_tags.update(computed_tags)
+
+    return conflict_tags
+
+
+def get_stored_conflicts(objects, user, language_code, get_product=lambda obj: obj):
+    """Returns the localised conflicts of objects annotated by `with_stored_conflicts`, keyed by product id."""
+    return localise_conflicts(get_stored_conflict_tags(objects, user, get_product), language_code)
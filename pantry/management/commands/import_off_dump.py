@@ -0,0 +1,181 @@
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+from django.core.management.base import BaseCommand, CommandError
+import requests
+from savor.off_client import OFF_USER_AGENT
+from pantry.utils import save_products_to_db
+
+
+class Command(BaseCommand):
+    help = 'Stream an Open Food Facts JSONL or CSV export into the local product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source',
+            help='Path or URL of the export, e.g. openfoodfacts-products.jsonl.gz or en.openfoodfacts.org.products.csv.gz',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['jsonl', 'csv'],
+            help='Format of the export. Detected from the file name if not given.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of products saved per transaction.',
+        )
+        parser.add_argument(
+            '-c', '--country',
+            action='append',
+            help='Import only products sold in the given country tag (e.g. en:france). Can be used multiple times.',
+        )
+        parser.add_argument(
+            '-f', '--require-field',
+            action='append',
+            default=['product_name'],
+            help='Skip products missing a value for the given field. Can be used multiple times.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording how many records have been processed. Defaults to <source>.checkpoint.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any existing checkpoint and import from the first record.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Stop after processing this many records.',
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        dump_format = options['format'] or self.detect_format(source)
+        checkpoint_path = options['checkpoint'] or f"{os.path.basename(source)}.checkpoint"
+        batch_size = options['batch_size']
+        countries = set(options['country'] or [])
+        required_fields = options['require_field']
+
+        start_offset = 0 if options['restart'] else self.read_checkpoint(checkpoint_path)
+        if start_offset:
+            self.stdout.write(f'Resuming from record {start_offset} (checkpoint {checkpoint_path})')
+
+        offset = 0
+        imported_count = 0
+        batch = []
+
+        with self.open_source(source) as text_stream:
+            for offset, record in enumerate(self.iter_records(text_stream, dump_format), start=1):
+                # records before the checkpoint were handled by a previous run
+                if offset <= start_offset:
+                    continue
+
+                if self.should_import(record, countries, required_fields):
+                    batch.append(record)
+
+                if offset % batch_size == 0:
+                    imported_count += self.save_batch(batch, checkpoint_path, offset)
+                    batch = []
+
+                if options['limit'] and offset - start_offset >= options['limit']:
+                    break
+
+        if offset > start_offset:
+            imported_count += self.save_batch(batch, checkpoint_path, offset)
+
+        self.stdout.write(self.style.SUCCESS(f'Import finished: {imported_count} products saved, {offset} records read.'))
+
+    def detect_format(self, source):
+        name = source.lower().removesuffix('.gz')
+        if name.endswith(('.jsonl', '.json', '.ndjson')):
+            return 'jsonl'
+        if name.endswith(('.csv', '.tsv')):
+            return 'csv'
+        raise CommandError(f'Could not detect the format of {source}, please pass --format.')
+
+    def open_source(self, source):
+        """Opens the export as a text stream, decompressing on the fly so it is never held in memory."""
+        if source.startswith(('http://', 'https://')):
+            # a plain request rather than the shared OFF client, so that the API credentials aren't sent to
+            # whatever host the dump is on and a long download doesn't count towards the API's circuit breaker
+            response = requests.get(source, stream=True, timeout=(10, 300), headers={'User-Agent': OFF_USER_AGENT})
+            response.raise_for_status()
+            raw_stream = response.raw
+            if source.endswith('.gz'):
+                raw_stream = gzip.GzipFile(fileobj=raw_stream)
+            return io.TextIOWrapper(raw_stream, encoding='utf-8', errors='replace')
+
+        if not os.path.exists(source):
+            raise CommandError(f'{source} does not exist.')
+
+        if source.endswith('.gz'):
+            return gzip.open(source, 'rt', encoding='utf-8', errors='replace')
+        return open(source, 'r', encoding='utf-8', errors='replace')
+
+    def iter_records(self, text_stream, dump_format):
+        """Yields one product document at a time from the export."""
+        if dump_format == 'jsonl':
+            for line in text_stream:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.stderr.write(self.style.ERROR(f'Skipping malformed record: {e}'))
+                    yield {}
+            return
+
+        # the OFF CSV export is tab separated, with very long ingredient fields
+        csv.field_size_limit(sys.maxsize)
+        for row in csv.DictReader(text_stream, delimiter='\t', quoting=csv.QUOTE_NONE):
+            yield self.map_csv_row(row)
+
+    def map_csv_row(self, row):
+        """Converts a CSV row into the shape of an API product document."""
+        record = {key: value for key, value in row.items() if key and value not in (None, '')}
+        # tag lists are comma separated in the CSV export
+        for key, value in record.items():
+            if key.endswith('_tags'):
+                record[key] = value.split(',')
+        # the CSV export has no allergens_tags column, its allergens column holds the same tags
+        if 'allergens' in record and 'allergens_tags' not in record:
+            record['allergens_tags'] = record['allergens'].split(',')
+        return record
+
+    def should_import(self, record, countries, required_fields):
+        if not record.get('code'):
+            return False
+        if any(not record.get(field) for field in required_fields):
+            return False
+        if countries and not countries.intersection(record.get('countries_tags') or []):
+            return False
+        return True
+
+    def save_batch(self, batch, checkpoint_path, offset):
+        saved_products = save_products_to_db(batch) if batch else []
+        self.write_checkpoint(checkpoint_path, offset)
+        self.stdout.write(f' -> {offset} records processed, {len(saved_products)} products saved in this batch')
+        return len(saved_products)
+
+    def read_checkpoint(self, checkpoint_path):
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                return int(checkpoint_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            raise CommandError(f'Checkpoint file {checkpoint_path} is corrupt, pass --restart to start over.')
+
+    def write_checkpoint(self, checkpoint_path, offset):
+        # write then rename, so an interrupted run never leaves a half written checkpoint
+        temp_path = f'{checkpoint_path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            checkpoint_file.write(str(offset))
+        os.replace(temp_path, checkpoint_path)
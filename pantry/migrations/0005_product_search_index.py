@@ -0,0 +1,82 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+SQLITE_FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS pantry_product_fts USING fts5(
+        product_name, brands,
+        content='pantry_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pantry_product_fts_insert AFTER INSERT ON pantry_product BEGIN
+        INSERT INTO pantry_product_fts(rowid, product_name, brands) VALUES (new.id, new.product_name, new.brands);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pantry_product_fts_delete AFTER DELETE ON pantry_product BEGIN
+        INSERT INTO pantry_product_fts(pantry_product_fts, rowid, product_name, brands) VALUES ('delete', old.id, old.product_name, old.brands);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS pantry_product_fts_update AFTER UPDATE OF product_name, brands ON pantry_product BEGIN
+        INSERT INTO pantry_product_fts(pantry_product_fts, rowid, product_name, brands) VALUES ('delete', old.id, old.product_name, old.brands);
+        INSERT INTO pantry_product_fts(rowid, product_name, brands) VALUES (new.id, new.product_name, new.brands);
+    END
+    """,
+    "INSERT INTO pantry_product_fts(pantry_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS pantry_product_fts_update",
+    "DROP TRIGGER IF EXISTS pantry_product_fts_delete",
+    "DROP TRIGGER IF EXISTS pantry_product_fts_insert",
+    "DROP TABLE IF EXISTS pantry_product_fts",
+]
+
+POSTGRES_FORWARD_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS pantry_product_name_trgm ON pantry_product USING gin (UPPER(product_name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS pantry_product_brands_trgm ON pantry_product USING gin (UPPER(brands) gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS pantry_product_brands_trgm",
+    "DROP INDEX IF EXISTS pantry_product_name_trgm",
+]
+
+
+def run_vendor_sql(schema_editor, sqlite_sql, postgres_sql):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        try:
+            for statement in sqlite_sql:
+                schema_editor.execute(statement)
+        except OperationalError as e:
+            # SQLite builds without FTS5 fall back to icontains searches
+            print(f"Skipping product full-text index, FTS5 is unavailable: {e}")
+    elif vendor == 'postgresql':
+        for statement in postgres_sql:
+            schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    run_vendor_sql(schema_editor, SQLITE_FORWARD_SQL, POSTGRES_FORWARD_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    run_vendor_sql(schema_editor, SQLITE_REVERSE_SQL, POSTGRES_REVERSE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantry', '0004_product_allergens_tags'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:52
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def backfill_score_totals(apps, schema_editor):
+    Pantry = apps.get_model('pantry', 'Pantry')
+    PantryItem = apps.get_model('pantry', 'PantryItem')
+
+    for score_field, weighted_field, quantity_field, output_field in [
+        ('nutrition_score', 'nutri_weighted_total', 'nutri_quantity_total', 'nutri_score'),
+        ('ecoscore_score', 'eco_weighted_total', 'eco_quantity_total', 'eco_score'),
+    ]:
+        score_data = PantryItem.objects.filter(**{f'product__{score_field}__isnull': False}).values('pantry_id').annotate(
+            total_weighted_score=Sum(ExpressionWrapper(F(f'product__{score_field}') * F('quantity'), output_field=DecimalField())),
+            total_quantity=Sum('quantity'),
+        )
+        for row in score_data:
+            weighted_total = row['total_weighted_score'] or 0
+            quantity_total = row['total_quantity'] or 0
+            Pantry.objects.filter(pk=row['pantry_id']).update(**{
+                weighted_field: weighted_total,
+                quantity_field: quantity_total,
+                output_field: weighted_total / quantity_total if quantity_total > 0 else None,
+            })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantry', '0006_user_product_conflict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pantry',
+            name='eco_quantity_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='pantry',
+            name='eco_weighted_total',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+        migrations.AddField(
+            model_name='pantry',
+            name='nutri_quantity_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='pantry',
+            name='nutri_weighted_total',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=18),
+        ),
+        migrations.RunPython(backfill_score_totals, migrations.RunPython.noop),
+    ]
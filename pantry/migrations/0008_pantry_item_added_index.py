@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pantry', '0007_pantry_score_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pantryitem',
+            index=models.Index(fields=['pantry', 'added_date', 'id'], name='pantry_item_added_idx'),
+        ),
+    ]
@@ -1,7 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField 
+from decimal import Decimal
+from django.db.models import Sum, F, ExpressionWrapper, DecimalField, FloatField, Case, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
+
+# (product score field, pantry weighted total field, pantry quantity total field)
+SCORE_SOURCES = [
+    ('nutrition_score', 'nutri_weighted_total', 'nutri_quantity_total'),
+    ('ecoscore_score', 'eco_weighted_total', 'eco_quantity_total'),
+]
+SCORE_OUTPUTS = {'nutrition_score': 'nutri_score', 'ecoscore_score': 'eco_score'}
+SCORE_TOTAL_FIELDS = [field for _, weighted, quantity in SCORE_SOURCES for field in (weighted, quantity)]
+SCORE_FIELDS = SCORE_TOTAL_FIELDS + list(SCORE_OUTPUTS.values())
+
+
+def average_score(weighted_total, quantity_total):
+    if weighted_total is None or not quantity_total or quantity_total <= 0:
+        return None
+    return weighted_total / quantity_total
 
 
 # Create your models here.
@@ -11,52 +29,101 @@ class Pantry(models.Model):
     products = models.ManyToManyField('Product', through='PantryItem', related_name='contained_in_pantries')
     nutri_score = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
     eco_score = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    # running sums behind the scores, the quantities only count products that have the score
+    nutri_weighted_total = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    nutri_quantity_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    eco_weighted_total = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    eco_quantity_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     def calculate_aggregate_scores(self):
-        nutri_score_data = self.pantry_items.filter(
-            product__nutrition_score__isnull=False
-        ).aggregate(
-            total_weighted_score=Sum(
-                ExpressionWrapper(
-                    F('product__nutrition_score') * F('quantity'),
-                    output_field=DecimalField()
-                )
-            ),
-            total_quantity=Sum('quantity')
-        )
-        
-        nutri_weighted_score = nutri_score_data.get('total_weighted_score')
-        nutri_total_quantity = nutri_score_data.get('total_quantity')
-        new_nutri_score = None
-        
-        if nutri_weighted_score is not None and nutri_total_quantity and nutri_total_quantity > 0:
-            new_nutri_score = nutri_weighted_score / nutri_total_quantity
-            
-        self.nutri_score = new_nutri_score
-
-        eco_score_data = self.pantry_items.filter(
-            product__ecoscore_score__isnull=False
-        ).aggregate(
-            total_weighted_score=Sum(
-                ExpressionWrapper(
-                    F('product__ecoscore_score') * F('quantity'),
-                    output_field=DecimalField()
-                )
-            ),
-            total_quantity=Sum('quantity')
+        """
+        Recalculates the pantry's stored totals and scores from scratch.
+
+        The totals are normally kept up to date incrementally (see `apply_item_change`),
+        this is only needed to repair them or to backfill existing pantries.
+        """
+        Pantry.recalculate_scores([self.pk])
+        self.refresh_from_db(fields=SCORE_FIELDS)
+
+    @classmethod
+    def recalculate_scores(cls, pantry_ids):
+        """Recalculates the stored totals and scores of several pantries, with one aggregate query per score."""
+        totals = {pantry_id: dict.fromkeys(SCORE_TOTAL_FIELDS, Decimal(0)) for pantry_id in pantry_ids}
+
+        for score_field, weighted_field, quantity_field in SCORE_SOURCES:
+            score_data = PantryItem.objects.filter(
+                pantry_id__in=pantry_ids,
+                **{f'product__{score_field}__isnull': False}
+            ).values('pantry_id').annotate(
+                total_weighted_score=Sum(
+                    ExpressionWrapper(
+                        F(f'product__{score_field}') * F('quantity'),
+                        output_field=DecimalField()
+                    )
+                ),
+                total_quantity=Sum('quantity')
+            )
+            for row in score_data:
+                totals[row['pantry_id']][weighted_field] = row['total_weighted_score'] or Decimal(0)
+                totals[row['pantry_id']][quantity_field] = row['total_quantity'] or Decimal(0)
+
+        pantries = []
+        for pantry_id, pantry_totals in totals.items():
+            pantry = cls(pk=pantry_id, **pantry_totals)
+            pantry.nutri_score = average_score(pantry.nutri_weighted_total, pantry.nutri_quantity_total)
+            pantry.eco_score = average_score(pantry.eco_weighted_total, pantry.eco_quantity_total)
+            pantries.append(pantry)
+
+        cls.objects.bulk_update(pantries, SCORE_FIELDS)
+
+    @classmethod
+    def recalculate_scores_for_products(cls, product_ids):
+        """
+        Recalculates the scores of every pantry holding one of the products, after their scores
+        changed. Returns the ids of the users owning those pantries.
+        """
+        if not product_ids:
+            return set()
+
+        pantry_users = dict(
+            PantryItem.objects.filter(product_id__in=product_ids).values_list('pantry_id', 'pantry__user_id').distinct()
         )
+        if pantry_users:
+            cls.recalculate_scores(list(pantry_users))
+        return set(pantry_users.values())
+
+    @classmethod
+    def apply_item_change(cls, pantry_id, product, quantity_delta):
+        """
+        Adjusts a pantry's stored totals and scores for a change in the quantity of one of its
+        products, in a single UPDATE so that concurrent changes to the same pantry add up.
+        """
+        if not quantity_delta:
+            return
+
+        updates = {}
+        for score_field, weighted_field, quantity_field in SCORE_SOURCES:
+            product_score = getattr(product, score_field)
+            if product_score is None:
+                continue
+
+            new_weighted_total = F(weighted_field) + Decimal(product_score) * quantity_delta
+            new_quantity_total = F(quantity_field) + quantity_delta
+            updates[weighted_field] = new_weighted_total
+            updates[quantity_field] = new_quantity_total
+            # the new totals are used for the score too, as UPDATE reads the columns' values from before it.
+            # sqlite stores whole decimals as integers, so the division is made on floats to avoid truncating
+            updates[SCORE_OUTPUTS[score_field]] = Case(
+                When(GreaterThan(new_quantity_total, 0), then=ExpressionWrapper(
+                    Cast(new_weighted_total, FloatField()) / new_quantity_total, output_field=DecimalField()
+                )),
+                default=None,
+                output_field=DecimalField(),
+            )
+
+        if updates:
+            cls.objects.filter(pk=pantry_id).update(**updates)
 
-        eco_weighted_score = eco_score_data.get('total_weighted_score')
-        eco_total_quantity = eco_score_data.get('total_quantity')
-        new_eco_score = None
-        
-        if eco_weighted_score is not None and eco_total_quantity and eco_total_quantity > 0:
-            new_eco_score = eco_weighted_score / eco_total_quantity
-            
-        self.eco_score = new_eco_score
-        
-        self.save()
-        
     @property
     def aggregate_nutri_grade(self):
         score = self.nutri_score
@@ -103,7 +170,17 @@ class PantryItem(models.Model):
 
     class Meta:
         unique_together = ('pantry', 'product')
+        indexes = [
+            # serves the pantry page's keyset pagination, see `pantry.pagination`
+            models.Index(fields=['pantry', 'added_date', 'id'], name='pantry_item_added_idx'),
+        ]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # remembered so that saves can apply the change in quantity to the pantry's scores
+        item._saved_quantity = item.__dict__.get('quantity')
+        return item
 
     def __str__(self):
         return f"{self.quantity} x {self.product.product_quantity} {self.product.product_quantity_unit}  of {self.product.product_name} in pantry of ({self.pantry.user.username})"
@@ -161,3 +238,23 @@ class Product(models.Model):
         return f"{self.product_name}"
 
 
+
+
+class UserProductConflict(models.Model):
+    """
+    The allergen and dietary conflicts between a user's settings and a product in
+    their pantry or favourites, stored as API tags so that pages can read them with
+    a join instead of recomputing them on every view. Kept up to date by signals
+    and by the product save functions, see `pantry.conflicts`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='product_conflicts')
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='user_conflicts')
+    conflicting_allergens = models.JSONField(default=list, blank=True)
+    missing_dietary_tags = models.JSONField(default=list, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'product')
+
+    def __str__(self):
+        return f"Conflicts of {self.product.product_name} for {self.user.username}"
@@ -0,0 +1,266 @@
+from decimal import Decimal, InvalidOperation
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.db.models import Q
+from pantry.models import Pantry, PantryItem, Product
+from .signals import send_pantry_changed, mute_pantry_item_signals
+
+PANTRY_OPERATIONS = ('add', 'remove', 'set')
+# quantities are rounded to, and capped by, what the pantry item column can hold
+QUANTITY_FIELD = PantryItem._meta.get_field('quantity')
+QUANTITY_STEP = Decimal(1).scaleb(-QUANTITY_FIELD.decimal_places)
+QUANTITY_LIMIT = Decimal(10) ** (QUANTITY_FIELD.max_digits - QUANTITY_FIELD.decimal_places)
+# the most operations accepted in one batch
+PANTRY_BATCH_MAX_OPERATIONS = 100
+# how many times a batch is applied before giving up, when a concurrent request adds one of its new products first
+PANTRY_BATCH_ATTEMPTS = 3
+
+
+class PantryOperation:
+    """One change to a pantry item: adding to, removing from or setting the quantity of a product."""
+    def __init__(self, op, quantity, product_id=None, item_id=None):
+        self.op = op
+        self.quantity = quantity
+        self.product_id = product_id
+        self.item_id = item_id
+
+
+def to_quantity(value):
+    """Converts a quantity read by raw SQL, which sqlite may return as a float or integer, to a Decimal."""
+    return Decimal(str(value)).quantize(QUANTITY_STEP)
+
+
+def parse_quantity(value, allow_zero=False):
+    """
+    Parses a quantity from a request, rounded to the precision stored for pantry items,
+    so that the quantities applied are exactly those written. Returns None if the value
+    isn't a number, is negative, rounds to zero (unless `allow_zero`) or is too large to store.
+    """
+    try:
+        quantity = Decimal(str(value))
+        if not quantity.is_finite():
+            return None
+        quantity = quantity.quantize(QUANTITY_STEP)
+    except (InvalidOperation, ValueError):
+        return None
+    if quantity < 0 or (quantity == 0 and not allow_zero) or quantity >= QUANTITY_LIMIT:
+        return None
+    return quantity
+
+
+def parse_pantry_operations(raw_operations):
+    """
+    Validates a list of operations from a request body, as dicts with an `op` of
+    'add', 'remove' or 'set', a `quantity`, and the `product_id` (or for 'remove'
+    and 'set', the pantry `item_id`) to apply it to. Raises `ValidationError` naming
+    the first invalid operation.
+    """
+    if not isinstance(raw_operations, list) or not raw_operations:
+        raise ValidationError("'operations' must be a non-empty list.")
+    if len(raw_operations) > PANTRY_BATCH_MAX_OPERATIONS:
+        raise ValidationError(f"At most {PANTRY_BATCH_MAX_OPERATIONS} operations can be applied at once.")
+
+    operations = []
+    for i, raw_operation in enumerate(raw_operations):
+        if not isinstance(raw_operation, dict) or raw_operation.get('op') not in PANTRY_OPERATIONS:
+            raise ValidationError(f"Operation {i} must have an 'op' of {', '.join(PANTRY_OPERATIONS)}.")
+
+        op = raw_operation['op']
+        quantity = parse_quantity(raw_operation.get('quantity'), allow_zero=(op == 'set'))
+        if quantity is None:
+            raise ValidationError(f"Operation {i} has an invalid quantity.")
+
+        product_id = raw_operation.get('product_id')
+        item_id = raw_operation.get('item_id') if op != 'add' else None
+        if not isinstance(product_id, int) and not isinstance(item_id, int):
+            raise ValidationError(f"Operation {i} must have a 'product_id'" + ("." if op == 'add' else " or an 'item_id'."))
+
+        operations.append(PantryOperation(op, quantity, product_id=product_id, item_id=item_id))
+    return operations
+
+
+def apply_pantry_operations(pantry, operations):
+    """
+    Applies a batch of operations to a pantry in one transaction, with bulk writes.
+
+    Operations are applied in order to the pantry's current quantities, items reaching
+    zero are deleted, and the pantry's scores are recalculated once. A single
+    `pantry_changed` is sent for the whole batch, once it commits, rather than one per item. Raises
+    `ValidationError` if an operation refers to an unknown product or item, in which
+    case nothing is written.
+
+    New items are only locked once they exist, so if another request adds one of the
+    batch's new products first, the insert conflicts and the batch is rolled back and
+    applied again to the quantities that request left.
+
+    Returns the final quantities of the products touched, keyed by product id, with
+    None for products no longer in the pantry.
+    """
+    for attempt in range(PANTRY_BATCH_ATTEMPTS):
+        try:
+            return _apply_pantry_operations_once(pantry, operations)
+        except IntegrityError:
+            if attempt == PANTRY_BATCH_ATTEMPTS - 1:
+                raise
+
+
+def _apply_pantry_operations_once(pantry, operations):
+    product_ids = {operation.product_id for operation in operations if operation.product_id is not None}
+    item_ids = {operation.item_id for operation in operations if operation.item_id is not None}
+
+    with transaction.atomic():
+        existing_items = PantryItem.objects.select_for_update().filter(
+            Q(product_id__in=product_ids) | Q(id__in=item_ids),
+            pantry=pantry,
+        )
+        items_by_product = {item.product_id: item for item in existing_items}
+        product_ids_by_item = {item.id: item.product_id for item in items_by_product.values()}
+
+        unknown_item_ids = item_ids - set(product_ids_by_item)
+        if unknown_item_ids:
+            raise ValidationError(f"Unknown pantry items: {', '.join(map(str, sorted(unknown_item_ids)))}.")
+
+        new_product_ids = product_ids - set(items_by_product)
+        if new_product_ids:
+            unknown_product_ids = new_product_ids - set(Product.objects.filter(id__in=new_product_ids).values_list('id', flat=True))
+            if unknown_product_ids:
+                raise ValidationError(f"Unknown products: {', '.join(map(str, sorted(unknown_product_ids)))}.")
+
+        quantities = {product_id: item.quantity for product_id, item in items_by_product.items()}
+        for operation in operations:
+            product_id = operation.product_id if operation.product_id is not None else product_ids_by_item[operation.item_id]
+            current_quantity = quantities.get(product_id) or Decimal(0)
+
+            if operation.op == 'add':
+                quantities[product_id] = current_quantity + operation.quantity
+            elif operation.op == 'remove':
+                quantities[product_id] = current_quantity - operation.quantity
+            else:
+                quantities[product_id] = operation.quantity
+
+            if quantities[product_id] <= 0:
+                quantities[product_id] = None
+
+        new_items = []
+        changed_items = []
+        removed_items = []
+        for product_id, quantity in quantities.items():
+            item = items_by_product.get(product_id)
+            if item is None:
+                if quantity is not None:
+                    new_items.append(PantryItem(pantry=pantry, product_id=product_id, quantity=quantity))
+            elif quantity is None:
+                removed_items.append(item)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                changed_items.append(item)
+
+        if not (new_items or changed_items or removed_items):
+            return quantities
+
+        with mute_pantry_item_signals():
+            PantryItem.objects.bulk_create(new_items)
+            PantryItem.objects.bulk_update(changed_items, ['quantity'])
+            PantryItem.objects.filter(id__in=[item.id for item in removed_items]).delete()
+
+        Pantry.recalculate_scores([pantry.id])
+        send_pantry_changed(
+            pantry=pantry,
+            user=pantry.user,
+            added_product_ids=[item.product_id for item in new_items],
+            removed_product_ids=[item.product_id for item in removed_items],
+        )
+
+    return quantities
+
+
+def add_to_pantry(user, product, quantity):
+    """
+    Adds a quantity of a product to a user's pantry with a single upsert, so that concurrent
+    adds of the same product (e.g. from two devices) are summed rather than one being lost.
+
+    `quantity` is expected to be parsed by `parse_quantity`, so that it is exactly the
+    quantity stored. Returns `(item id, new quantity, created)`, or None if the user has no pantry.
+    """
+    table = PantryItem._meta.db_table
+    pantry_table = Pantry._meta.db_table
+    added_date = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # the WHERE clause is needed by sqlite to tell the upsert's ON CONFLICT apart from a join
+            cursor.execute(
+                f"INSERT INTO {table} (pantry_id, product_id, quantity, added_date) "
+                f"SELECT id, %s, %s, %s FROM {pantry_table} WHERE user_id = %s "
+                f"ON CONFLICT (pantry_id, product_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity "
+                f"RETURNING id, pantry_id, quantity, added_date = %s",
+                [product.id, connection.ops.adapt_decimalfield_value(quantity), added_date, user.pk, added_date]
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        item_id, pantry_id, new_quantity = row[0], row[1], to_quantity(row[2])
+        # an update keeps the item's original added date, so the row only carries the one just sent if it was inserted
+        created = bool(row[3])
+
+        Pantry.apply_item_change(pantry_id, product, quantity)
+        send_pantry_changed(
+            pantry=Pantry(id=pantry_id, user=user),
+            user=user,
+            added_product_ids=[product.id] if created else [],
+            removed_product_ids=[],
+        )
+
+    return item_id, new_quantity, created
+
+
+def remove_from_pantry(user, item_id, quantity):
+    """
+    Removes a quantity of an item from a user's pantry with a single decrement, deleting
+    the item if that leaves it empty. The delete only goes ahead if the item is still
+    empty, so an add made in between by another request isn't lost.
+
+    Returns `(product, quantity left)`, with a quantity of zero if the item was deleted,
+    or None if the item isn't in the user's pantry.
+    """
+    table = PantryItem._meta.db_table
+    pantry_table = Pantry._meta.db_table
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET quantity = quantity - %s "
+                f"WHERE id = %s AND pantry_id IN (SELECT id FROM {pantry_table} WHERE user_id = %s) "
+                f"RETURNING pantry_id, product_id, quantity",
+                [connection.ops.adapt_decimalfield_value(quantity), item_id, user.pk]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            pantry_id, product_id, quantity_left = row[0], row[1], to_quantity(row[2])
+            removed_quantity = quantity
+
+            deleted = False
+            if quantity_left <= 0:
+                cursor.execute(f"DELETE FROM {table} WHERE id = %s AND quantity <= 0 RETURNING quantity", [item_id])
+                deleted_row = cursor.fetchone()
+                if deleted_row is not None:
+                    deleted = True
+                    # whatever was left (zero, or below if more was removed than held) leaves the pantry too
+                    removed_quantity += to_quantity(deleted_row[0])
+                    quantity_left = Decimal('0.00')
+
+        product = Product.objects.only('id', 'product_name', 'nutrition_score', 'ecoscore_score').get(id=product_id)
+        Pantry.apply_item_change(pantry_id, product, -removed_quantity)
+        send_pantry_changed(
+            pantry=Pantry(id=pantry_id, user=user),
+            user=user,
+            added_product_ids=[],
+            removed_product_ids=[product_id] if deleted else [],
+        )
+
+    return product, max(quantity_left, Decimal('0.00'))
@@ -0,0 +1,80 @@
+import json
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from pantry.models import PantryItem
+from users.models import User
+from .conflicts import with_stored_conflicts
+
+PANTRY_PAGE_SIZE = 24
+FAVOURITES_PAGE_SIZE = 12
+
+
+def encode_cursor(values):
+    """Encodes the sort key of the last row of a page as an opaque, URL safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, length):
+    """Decodes a cursor made by `encode_cursor`, raising ValueError if it isn't a list of the expected length."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor.")
+    return values
+
+
+def get_pantry_items_page(user, cursor=None, page_size=PANTRY_PAGE_SIZE):
+    """
+    Returns a page of a user's pantry items, oldest first, annotated with their stored
+    conflicts, and the cursor of the next page (None on the last page).
+
+    Pages are found by seeking past the `(added_date, id)` of the previous page's last
+    item, so each page costs the same however far in it is, and items added or removed
+    meanwhile don't shift later pages. Raises ValueError for an invalid cursor.
+    """
+    queryset = PantryItem.objects.filter(pantry__user=user).select_related('product').order_by('added_date', 'id')
+
+    if cursor:
+        added_date, item_id = decode_cursor(cursor, 2)
+        added_date = parse_datetime(added_date) if isinstance(added_date, str) else None
+        if added_date is None or not isinstance(item_id, int):
+            raise ValueError("Invalid cursor.")
+        queryset = queryset.filter(Q(added_date__gt=added_date) | Q(added_date=added_date, id__gt=item_id))
+
+    items = list(with_stored_conflicts(queryset, user, product_path='product__')[:page_size + 1])
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        # kept to the microsecond, so that the next page seeks past exactly this item
+        next_cursor = encode_cursor([items[-1].added_date.isoformat(), items[-1].id])
+    return items, next_cursor
+
+
+def get_favourites_page(user, cursor=None, page_size=FAVOURITES_PAGE_SIZE):
+    """
+    Returns a page of a user's favourites, in the order they were favourited, as rows
+    of the favourites table with their product annotated with stored conflicts, and
+    the cursor of the next page (None on the last page). Raises ValueError for an
+    invalid cursor.
+    """
+    queryset = User.favourited_products.through.objects.filter(user=user).select_related('product').order_by('id')
+
+    if cursor:
+        favourite_id, = decode_cursor(cursor, 1)
+        if not isinstance(favourite_id, int):
+            raise ValueError("Invalid cursor.")
+        queryset = queryset.filter(id__gt=favourite_id)
+
+    favourites = list(with_stored_conflicts(queryset, user, product_path='product__')[:page_size + 1])
+
+    next_cursor = None
+    if len(favourites) > page_size:
+        favourites = favourites[:page_size]
+        next_cursor = encode_cursor([favourites[-1].id])
+    return favourites, next_cursor
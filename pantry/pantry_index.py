@@ -0,0 +1,132 @@
+import threading
+import unicodedata
+from collections import OrderedDict
+from pantry.models import PantryItem
+from .conflicts import with_stored_conflicts, get_stored_conflict_tags
+from .versions import get_pantry_version
+
+# how many pantries each process keeps an index of, the least recently searched are dropped first
+PANTRY_INDEX_CACHE_SIZE = 256
+NGRAM_SIZE = 3
+
+_pantry_indexes = OrderedDict()
+_pantry_indexes_lock = threading.Lock()
+
+
+def normalise_search_text(text):
+    """Lowercases text and strips its accents, so that e.g. 'Crème' is found by 'creme'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def get_ngrams(text):
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class PantryIndex:
+    """
+    An in-memory trigram index over the names and brands of one pantry's items.
+
+    Each entry holds the item's JSON payload and its product's conflict tags, so
+    that a search needs no queries. A word of the search term is looked up by
+    intersecting the postings of its trigrams and then checked as a substring,
+    words shorter than a trigram are checked against every entry.
+    """
+    def __init__(self, entries):
+        # entries are (payload, conflict tags) pairs
+        self.entries = entries
+        self.names = [normalise_search_text(payload['product_name']) for payload, _ in entries]
+        self.texts = [f"{name} {normalise_search_text(payload['brands'])}" for name, (payload, _) in zip(self.names, entries)]
+        self.postings = {}
+        for position, text in enumerate(self.texts):
+            for ngram in get_ngrams(text):
+                self.postings.setdefault(ngram, set()).add(position)
+
+    def get_candidates(self, word):
+        if len(word) < NGRAM_SIZE:
+            return None
+
+        candidates = None
+        for ngram in get_ngrams(word):
+            positions = self.postings.get(ngram)
+            if not positions:
+                return set()
+            candidates = positions.copy() if candidates is None else candidates & positions
+        return candidates
+
+    def rank(self, position, words):
+        """Sorts entries whose name starts with the search words first, then by where in the name they match."""
+        name = self.names[position]
+        padded_name = f" {name}"
+        is_prefix_match = all(f" {word}" in padded_name for word in words)
+        match_position = padded_name.find(f" {words[0]}")
+        if match_position < 0:
+            match_position = name.find(words[0])
+        return (not is_prefix_match, match_position if match_position >= 0 else len(name), name)
+
+    def search(self, term):
+        """Returns the (payload, conflict tags) entries matching every word of the term, best matches first."""
+        words = normalise_search_text(term).split()
+        if not words:
+            return list(self.entries)
+
+        candidates = None
+        for word in words:
+            word_candidates = self.get_candidates(word)
+            if word_candidates is not None:
+                candidates = word_candidates if candidates is None else candidates & word_candidates
+        if candidates is None:
+            candidates = range(len(self.entries))
+
+        matches = [position for position in candidates if all(word in self.texts[position] for word in words)]
+        matches.sort(key=lambda position: self.rank(position, words))
+        return [self.entries[position] for position in matches]
+
+
+def get_pantry_item_payload(item):
+    """Returns the JSON data the pantry page needs to render a pantry item, without its conflicts."""
+    return {
+        'id': item.id,
+        'product_id': item.product.id,
+        'quantity': str(item.quantity),
+        'product_quantity': item.product.product_quantity,
+        'product_quantity_unit': item.product.product_quantity_unit,
+        'product_name': item.product.product_name,
+        'brands': item.product.brands or '',
+        'image_url': item.product.image_url,
+    }
+
+
+def build_pantry_index(user):
+    """Loads a user's pantry items with their stored conflicts, in one query, and indexes them."""
+    items = list(with_stored_conflicts(
+        PantryItem.objects.filter(pantry__user=user).select_related('product').order_by('added_date', 'id'),
+        user,
+        product_path='product__',
+    ))
+    conflict_tags = get_stored_conflict_tags(items, user, get_product=lambda item: item.product)
+
+    return PantryIndex([(get_pantry_item_payload(item), conflict_tags[item.product.id]) for item in items])
+
+
+def get_pantry_index(user):
+    """
+    Returns the search index of a user's pantry, rebuilt only when the pantry's version has
+    moved on since it was built. Costs a single cache lookup when the index is current.
+    """
+    version = get_pantry_version(user.pk)
+
+    with _pantry_indexes_lock:
+        cached = _pantry_indexes.get(user.pk)
+        if cached is not None and cached[0] == version:
+            _pantry_indexes.move_to_end(user.pk)
+            return cached[1]
+
+    index = build_pantry_index(user)
+
+    with _pantry_indexes_lock:
+        _pantry_indexes[user.pk] = (version, index)
+        _pantry_indexes.move_to_end(user.pk)
+        while len(_pantry_indexes) > PANTRY_INDEX_CACHE_SIZE:
+            _pantry_indexes.popitem(last=False)
+    return index
@@ -0,0 +1,89 @@
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'pantry_product_fts'
+
+
+class ProductSearchBackend:
+    """
+    Default product text search, used when no text index is available.
+
+    Backends take a `Product` queryset and a search term, and return the queryset
+    narrowed to matching products, ordered with the best matches first.
+    """
+    def search(self, queryset, term):
+        return queryset.filter(Q(product_name__icontains=term) | Q(brands__icontains=term))
+
+
+class SQLiteFTSProductSearchBackend(ProductSearchBackend):
+    """
+    Searches products through the SQLite FTS5 index over product name and brand.
+
+    Each word of the search term is matched as a token prefix, and results are
+    ranked by bm25 with matches in the product name weighted above the brand.
+    """
+    def build_match_query(self, term):
+        words = term.split()
+        # quote each word so FTS5 syntax characters in user input are treated as text
+        return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+    def search(self, queryset, term):
+        match_query = self.build_match_query(term)
+        if not match_query:
+            return queryset.none()
+
+        return queryset.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_query])
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = pantry_product.id",
+                [match_query]
+            )
+        ).order_by('search_rank')
+
+
+class PostgresTrigramProductSearchBackend(ProductSearchBackend):
+    """
+    Searches products through the trigram GIN indexes over product name and brand.
+
+    Substring matches are served by the indexes, and results are ranked by
+    trigram word similarity to the search term.
+    """
+    def search(self, queryset, term):
+        # imported here as it requires a PostgreSQL driver to be installed
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return super().search(queryset, term).annotate(
+            search_rank=TrigramWordSimilarity(term, 'product_name')
+        ).order_by('-search_rank')
+
+
+_search_backend = None
+
+
+def fts_table_exists():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_product_search_backend():
+    """Returns the product search backend for the database in use, selected once per process."""
+    global _search_backend
+
+    if _search_backend is None:
+        if connection.vendor == 'sqlite' and fts_table_exists():
+            _search_backend = SQLiteFTSProductSearchBackend()
+        elif connection.vendor == 'postgresql':
+            _search_backend = PostgresTrigramProductSearchBackend()
+        else:
+            _search_backend = ProductSearchBackend()
+
+    return _search_backend
+
+
+def search_products(queryset, term):
+    """Narrows a `Product` queryset to products whose name or brand match the term, best matches first."""
+    return get_product_search_backend().search(queryset, term.strip())
@@ -1,10 +1,61 @@
-from django.db.models.signals import post_save, post_delete
+import threading
+from contextlib import contextmanager
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.contrib.auth import get_user_model
 from django.contrib.auth.signals import user_logged_in
-from django.dispatch import receiver
+from django.dispatch import receiver, Signal
+from django.db import transaction
 from django.core.cache import cache
-from .models import PantryItem
+from .models import Pantry, PantryItem
+from .conflicts import track_products, untrack_products, refresh_user_conflicts
+from .versions import bump_pantry_version, bump_pantry_versions
+from users.models import UserSettings
 from recipes.tasks import generate_recipes_task
 
+User = get_user_model()
+
+# sent once per change to a user's pantry, whether one item was saved or a batch of operations applied,
+# after the change is committed (see `send_pantry_changed`).
+# provides `pantry`, `user`, and the ids of products that entered (`added_product_ids`) or left
+# (`removed_product_ids`) the pantry
+pantry_changed = Signal()
+
+_muted = threading.local()
+
+
+@contextmanager
+def mute_pantry_item_signals():
+    """
+    Stops single PantryItem saves and deletes from sending `pantry_changed` while the block runs,
+    for bulk changes that send one `pantry_changed` for the whole batch once they are done.
+    """
+    # restores the previous state on exit, so a nested block doesn't unmute the one around it
+    was_muted = pantry_item_signals_muted()
+    _muted.active = True
+    try:
+        yield
+    finally:
+        _muted.active = was_muted
+
+
+def pantry_item_signals_muted():
+    return getattr(_muted, 'active', False)
+
+
+def send_pantry_changed(pantry, user, added_product_ids, removed_product_ids):
+    """
+    Sends `pantry_changed` once the current transaction commits (or straight away outside of one),
+    so that its receivers, and the tasks they queue, only see the pantry once the change is saved.
+    """
+    transaction.on_commit(lambda: pantry_changed.send(
+        sender=Pantry,
+        pantry=pantry,
+        user=user,
+        added_product_ids=added_product_ids,
+        removed_product_ids=removed_product_ids,
+    ))
+
+
 def schedule_recipe_generation_task(user):
     """
     Schedules a Celery task to generate recipes for a user, with debouncing.
@@ -33,10 +84,30 @@ def schedule_recipe_generation_task(user):
 
 
 @receiver(post_save, sender=PantryItem)
+def send_pantry_changed_on_save(sender, instance, created, **kwargs):
+    if not pantry_item_signals_muted():
+        send_pantry_changed(
+            pantry=instance.pantry,
+            user=instance.pantry.user,
+            added_product_ids=[instance.product_id] if created else [],
+            removed_product_ids=[],
+        )
+
+
 @receiver(post_delete, sender=PantryItem)
-def update_recipes_on_pantry_change(sender, instance, **kwargs):
+def send_pantry_changed_on_delete(sender, instance, **kwargs):
+    if not pantry_item_signals_muted():
+        send_pantry_changed(
+            pantry=instance.pantry,
+            user=instance.pantry.user,
+            added_product_ids=[],
+            removed_product_ids=[instance.product_id],
+        )
+
+
+@receiver(pantry_changed)
+def update_recipes_on_pantry_change(sender, user, **kwargs):
     """Triggers recipe generation whenever a user's pantry is modified."""
-    user = instance.pantry.user
     
     # unlock session flag to allow recipe generation 
     if hasattr(user, 'session'):
@@ -49,3 +120,99 @@ def update_recipes_on_pantry_change(sender, instance, **kwargs):
 def trigger_recipes_on_login(sender, request, user, **kwargs):
     """Triggers recipe generation when a user logs in."""
     schedule_recipe_generation_task(user)
+
+
+@receiver(pantry_changed)
+def track_pantry_conflicts(sender, user, added_product_ids, removed_product_ids, **kwargs):
+    """
+    Stores the user's conflicts with products entering their pantry, and drops them
+    for products that have left both their pantry and favourites.
+    """
+    track_products(user.pk, added_product_ids)
+    if removed_product_ids:
+        untrack_products(user.pk, removed_product_ids)
+
+
+@receiver(m2m_changed, sender=User.favourited_products.through)
+def update_favourite_conflicts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keeps stored conflicts in step with products being favourited and unfavourited."""
+    if action == 'post_clear' and not reverse:
+        refresh_user_conflicts(instance.pk)
+        return
+
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    update_conflicts = track_products if action == 'post_add' else untrack_products
+    if reverse:
+        # the product's set of users was changed rather than a user's favourites
+        for user_id in pk_set:
+            update_conflicts(user_id, [instance.pk])
+    else:
+        update_conflicts(instance.pk, pk_set)
+
+
+@receiver(m2m_changed, sender=UserSettings.allergens.through)
+@receiver(m2m_changed, sender=UserSettings.dietary_requirements.through)
+def refresh_conflicts_on_settings_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recomputes a user's stored conflicts when their allergens or dietary requirements change."""
+    if reverse and action == 'pre_clear':
+        # the users losing the allergen or requirement are no longer known once it is cleared
+        cleared_rows = sender.objects.filter(**{instance._meta.model_name: instance})
+        instance._cleared_settings_ids = set(cleared_rows.values_list('usersettings_id', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # an allergen or requirement's set of users was changed, rather than a user's settings
+        settings_ids = getattr(instance, '_cleared_settings_ids', set()) if action == 'post_clear' else pk_set or []
+        user_ids = list(UserSettings.objects.filter(id__in=settings_ids).values_list('user_id', flat=True))
+    else:
+        user_ids = [instance.user_id]
+
+    for user_id in user_ids:
+        refresh_user_conflicts(user_id)
+    bump_pantry_versions(user_ids)
+
+
+@receiver(post_save, sender=PantryItem)
+def update_pantry_scores_on_save(sender, instance, created, **kwargs):
+    """Applies a pantry item's change in quantity to its pantry's stored aggregate scores."""
+    if pantry_item_signals_muted():
+        return
+    saved_quantity = 0 if created else getattr(instance, '_saved_quantity', None)
+    if saved_quantity is None:
+        # the item's previous quantity isn't known, so the pantry is recalculated instead
+        Pantry.recalculate_scores([instance.pantry_id])
+    else:
+        Pantry.apply_item_change(instance.pantry_id, instance.product, instance.quantity - saved_quantity)
+    instance._saved_quantity = instance.quantity
+
+
+@receiver(post_delete, sender=PantryItem)
+def update_pantry_scores_on_delete(sender, instance, **kwargs):
+    """Removes a deleted pantry item's quantity from its pantry's stored aggregate scores."""
+    if pantry_item_signals_muted():
+        return
+    saved_quantity = getattr(instance, '_saved_quantity', instance.quantity)
+    Pantry.apply_item_change(instance.pantry_id, instance.product, -saved_quantity)
+
+
+@receiver(pantry_changed)
+def bump_pantry_version_on_change(sender, user, **kwargs):
+    """Moves the user's pantry on to a new version, so that data cached for the old one is rebuilt."""
+    bump_pantry_version(user.pk)
+
+
+@receiver(m2m_changed, sender=User.favourited_products.through)
+def bump_pantry_version_on_favourites_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Moves the user's pantry on to a new version when their favourites change, as pages show both."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # the product's set of users was changed, so it's their pantries that move on
+        bump_pantry_versions(pk_set or [])
+    else:
+        bump_pantry_version(instance.pk)
@@ -37,23 +37,99 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
+  // load further pages of pantry items as the end of the list comes into view
+  const pantryItemsSentinel = document.getElementById('pantryItemsSentinel');
+  if (pantryItemsSentinel){
+    pantryItemsObserver = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        loadPantryItems(csrfToken);
+      }
+    }, { rootMargin: '400px' });
+    pantryItemsObserver.observe(pantryItemsSentinel);
+  }
+
 });
 
 
-function searchPantry(csrfToken, query){
-  fetch('/search_pantry/', {
-    method: 'POST',
-    headers: {
-      "Content-Type": "application/json",
-      "X-CSRFToken": csrfToken,
-    },
-    body: JSON.stringify({
-      'query': query
-    }),
+// the pantry list shows either pages of the whole pantry or search results, only the latest request's response is used
+let pantryListRequestId = 0;
+let isSearchingPantry = false;
+let isLoadingPantryItems = false;
+let pantryItemsObserver = null;
+
+
+function loadPantryItems(csrfToken, reset = false){
+  const pantryItemsPage = document.querySelector(".pantry-items-page");
+  const cursor = reset ? '' : pantryItemsPage.dataset.nextCursor;
+
+  if (!reset && (!cursor || isSearchingPantry || isLoadingPantryItems)) {
+    return;
+  }
+
+  const requestId = ++pantryListRequestId;
+  isLoadingPantryItems = true;
+
+  fetch(cursor ? `/pantry/items?cursor=${encodeURIComponent(cursor)}` : '/pantry/items')
+  .then(response => response.json())
+  .then(data => {
+    if (requestId !== pantryListRequestId) {
+      return;
+    }
+
+    if (reset) {
+      pantryItemsPage.innerHTML = "";
+      if (data.items.length === 0) {
+        pantryItemsPage.innerHTML = `
+  <div class="col-12 text-center py-5">
+  <p class="text-muted">${gettext('Your pantry is empty! Add some products to get started.')}</p>
+  </div>`;
+      }
+    }
+
+    data.items.forEach((item) => {
+      // skip items already shown, e.g. after the list was reset
+      if (!pantryItemsPage.querySelector(`.remove-button[data-item-id="${item.id}"]`)) {
+        pantryItemsPage.appendChild(createPantryItemCard(item, csrfToken));
+      }
+    });
+    pantryItemsPage.dataset.nextCursor = data.next_cursor || '';
+
+    // the observer only fires when the sentinel enters or leaves view, so it is observed again after a
+    // page loads, to load the next one if a short page left the sentinel in view (errors aren't retried)
+    const sentinel = document.getElementById('pantryItemsSentinel');
+    if (data.next_cursor && pantryItemsObserver && sentinel) {
+      pantryItemsObserver.unobserve(sentinel);
+      pantryItemsObserver.observe(sentinel);
+    }
   })
+  .catch(error => console.error('Error loading pantry items:', error))
+  .finally(() => {
+    if (requestId === pantryListRequestId) {
+      isLoadingPantryItems = false;
+    }
+  });
+}
+
+
+function searchPantry(csrfToken, query){
+  // an empty search goes back to paging through the whole pantry
+  if (!query) {
+    isSearchingPantry = false;
+    loadPantryItems(csrfToken, true);
+    return;
+  }
+
+  isSearchingPantry = true;
+  isLoadingPantryItems = false;
+  const requestId = ++pantryListRequestId;
+
+  // sent as a GET so that the browser can revalidate repeated searches with the response's ETag
+  fetch(`/search_pantry/?query=${encodeURIComponent(query)}`)
   .then(response => response.json())
   .then(data => {
-    updatePantryList(data.found_items, csrfToken);
+    if (requestId === pantryListRequestId) {
+      updatePantryList(data.found_items, csrfToken);
+    }
   })
   .catch(error => console.error('Error during pantry search:', error));
 }
@@ -74,94 +150,100 @@ function updatePantryList(items, csrfToken){
 
   // create html for updated pantry item list
   items.forEach((item) => {
-    const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
-    const imageUrl = item.image_url || placeholderImageUrl;
-    const hasAllergenConflict = item.has_allergen_conflict;
-    const hasDietaryMismatch = item.has_dietary_mismatch;
-    const missingTags = item.missing_dietary_tags || [];
-    const conflictingTags = item.conflicting_allergens || [];
-    let safetyAlertsHtml = '';
-    let cardClasses = "card h-100 border-0 shadow-sm pantry-item";
-
-    const pantryItemWrapper = document.createElement('div');
-    pantryItemWrapper.classList.add('col-12', 'col-md-6', 'col-lg-6', 'col-xl-4', 'mb-4', 'pantry-item-col');
-
-    // alerts based on user's dietary preferences and allergens
-    if (hasAllergenConflict) {
-        const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        cardClasses = "card h-100 shadow-lg border-danger border-3 pantry-item"; 
-        safetyAlertsHtml += `
-        <div class="alert alert-danger p-1 mb-2 small" role="alert">
-        <strong><i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')} : </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
-        </div>`;
-      }
-            
-    if (hasDietaryMismatch) {
-        const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        safetyAlertsHtml += `
-        <div class="alert alert-warning p-1 mb-2 small" role="alert">
-        <strong> <i class="bi bi-question-circle"></i>  ${gettext('POSSIBLE MISMATCH')} : </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
-        </div>`;
+    pantryItemsPage.appendChild(createPantryItemCard(item, csrfToken));
+  });
+}
+
+
+function createPantryItemCard(item, csrfToken){
+  const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
+  const imageUrl = item.image_url || placeholderImageUrl;
+  const hasAllergenConflict = item.has_allergen_conflict;
+  const hasDietaryMismatch = item.has_dietary_mismatch;
+  const missingTags = item.missing_dietary_tags || [];
+  const conflictingTags = item.conflicting_allergens || [];
+  let safetyAlertsHtml = '';
+  let cardClasses = "card h-100 border-0 shadow-sm pantry-item";
+
+  const pantryItemWrapper = document.createElement('div');
+  pantryItemWrapper.classList.add('col-12', 'col-md-6', 'col-lg-6', 'col-xl-4', 'mb-4', 'pantry-item-col');
+
+  // alerts based on user's dietary preferences and allergens
+  if (hasAllergenConflict) {
+      const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+      cardClasses = "card h-100 shadow-lg border-danger border-3 pantry-item"; 
+      safetyAlertsHtml += `
+      <div class="alert alert-danger p-1 mb-2 small" role="alert">
+      <strong><i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')} : </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
+      </div>`;
     }
+          
+  if (hasDietaryMismatch) {
+      const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+      safetyAlertsHtml += `
+      <div class="alert alert-warning p-1 mb-2 small" role="alert">
+      <strong> <i class="bi bi-question-circle"></i>  ${gettext('POSSIBLE MISMATCH')} : </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
+      </div>`;
+  }
 
-    // create the new pantry item card
-    const pantryItemCard = document.createElement('div');
-    pantryItemCard.classList.add(...cardClasses.split(' '));
-    pantryItemCard.innerHTML =`
-             <img src="${imageUrl}" 
-             alt="${item.product_name || gettext("Product Image")}" 
-             class="card-img-top img-fluid rounded-top" 
-             style="max-height: 150px; object-fit: cover;"
-             onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
-
-             <div class="card-body d-flex flex-column justify-content-between">
-            <h3 class="card-title h5 mb-2 text-dark">${
-              item.product_name || gettext("No Name")
-            }</h3>
-            
-             ${safetyAlertsHtml} 
-
-              <p class="card-text text-muted mb-1 small ">
-              <strong>${gettext('Quantity:')}</strong> <span class="pantry-quantity-count">${item.quantity}</span>
-              </p>
-
-              <p class="card-text text-muted mb-1 small ">
-              <strong>${gettext('Product Size:')}</strong> ${item.product_quantity ||""} ${item.product_quantity_unit || gettext('item')}
-              </p>
-
-              <div class="mt-auto d-flex align-items-center justify-content-left">
-                <input class="remove-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1" style="max-width: 80px;">
-                <button class="btn btn-outline-danger btn-sm remove-button"
-                  data-item-id=${ item.id }
-                  data-csrf-token=${csrfToken}>
-                  ${gettext('Remove')}
-                </button>
-              </div>
-
-             <div class="message-container mt-2">
-            </div>`;
-
-    pantryItemWrapper.appendChild(pantryItemCard);
-    pantryItemsPage.appendChild(pantryItemWrapper);
-
-    // event listener for newly created remove button.
-    const removeButton = pantryItemCard.querySelector('.remove-button');
-    removeButton.addEventListener('click', (event) => {
-      const clickedButton = event.target;
-      const csrfToken = clickedButton.dataset.csrfToken;
-      const quantityToRemove = clickedButton.closest(".pantry-item").querySelector(".remove-quantity-input").value;
-      const itemCardDiv = clickedButton.closest(".pantry-item");
-      const itemCardCol = clickedButton.closest(".col-12");
-      const removeRequestData = {
-        itemId: item.id,
-        quantityToRemove: quantityToRemove,
-        csrfToken: csrfToken,
-        itemCardDiv: itemCardDiv,
-        itemCardCol: itemCardCol,
-      };
-      removePantryItem(removeRequestData);
-    })
-  });
+  // create the new pantry item card
+  const pantryItemCard = document.createElement('div');
+  pantryItemCard.classList.add(...cardClasses.split(' '));
+  pantryItemCard.innerHTML =`
+           <img src="${imageUrl}" 
+           alt="${item.product_name || gettext("Product Image")}" 
+           class="card-img-top img-fluid rounded-top" 
+           style="max-height: 150px; object-fit: cover;"
+           onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
+
+           <div class="card-body d-flex flex-column justify-content-between">
+          <h3 class="card-title h5 mb-2 text-dark">${
+            item.product_name || gettext("No Name")
+          }</h3>
+          
+           ${safetyAlertsHtml} 
+
+            <p class="card-text text-muted mb-1 small ">
+            <strong>${gettext('Quantity:')}</strong> <span class="pantry-quantity-count">${item.quantity}</span>
+            </p>
+
+            <p class="card-text text-muted mb-1 small ">
+            <strong>${gettext('Product Size:')}</strong> ${item.product_quantity ||""} ${item.product_quantity_unit || gettext('item')}
+            </p>
+
+            <div class="mt-auto d-flex align-items-center justify-content-left">
+              <input class="remove-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1" style="max-width: 80px;">
+              <button class="btn btn-outline-danger btn-sm remove-button"
+                data-item-id=${ item.id }
+                data-csrf-token=${csrfToken}>
+                ${gettext('Remove')}
+              </button>
+            </div>
+
+           <div class="message-container mt-2">
+          </div>`;
+
+  pantryItemWrapper.appendChild(pantryItemCard);
+
+  // event listener for newly created remove button.
+  const removeButton = pantryItemCard.querySelector('.remove-button');
+  removeButton.addEventListener('click', (event) => {
+    const clickedButton = event.target;
+    const csrfToken = clickedButton.dataset.csrfToken;
+    const quantityToRemove = clickedButton.closest(".pantry-item").querySelector(".remove-quantity-input").value;
+    const itemCardDiv = clickedButton.closest(".pantry-item");
+    const itemCardCol = clickedButton.closest(".col-12");
+    const removeRequestData = {
+      itemId: item.id,
+      quantityToRemove: quantityToRemove,
+      csrfToken: csrfToken,
+      itemCardDiv: itemCardDiv,
+      itemCardCol: itemCardCol,
+    };
+    removePantryItem(removeRequestData);
+  })
+
+  return pantryItemWrapper;
 }
 
 
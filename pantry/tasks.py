@@ -0,0 +1,120 @@
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from .models import Product, PantryItem
+from .utils import fetch_search_results, get_search_cache_key, fetch_products_by_codes, save_products_to_db
+
+PRODUCT_MAX_AGE = settings.PRODUCT_REFRESH['MAX_AGE']
+PRODUCT_REFRESH_BATCH_SIZE = settings.PRODUCT_REFRESH['BATCH_SIZE']
+PRODUCT_REFRESH_MAX_PER_RUN = settings.PRODUCT_REFRESH['MAX_PER_RUN']
+
+
+@shared_task(rate_limit='10/m')
+def refresh_search_cache(api_url, params):
+    """
+    Re-fetches a stale Open Food Facts search and replaces its cache entry.
+
+    Scheduled when a request is served a stale cached search, so that the next
+    request for the same search gets fresh results without waiting on the API.
+    The `rate_limit` is applied to respect API usage policies.
+    """
+    cache_key = get_search_cache_key(api_url, params)
+
+    try:
+        fetch_search_results(api_url, params)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to refresh cached search {params}: {e}")
+    finally:
+        cache.delete(f"{cache_key}_refreshing")
+
+
+@shared_task(rate_limit='5/m')
+def prefetch_search_page(api_url, params):
+    """
+    Fetches and saves a page of Open Food Facts search results ahead of the user
+    asking for it, warming the search cache for the next page flip.
+
+    Pages already in the cache are skipped. The `rate_limit` keeps speculative
+    fetches within the outbound API budget.
+    """
+    cache_key = get_search_cache_key(api_url, params)
+
+    try:
+        if cache.get(cache_key) is None:
+            fetch_search_results(api_url, params)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to prefetch search page {params}: {e}")
+    finally:
+        cache.delete(f"{cache_key}_prefetching")
+
+
+@shared_task
+def refresh_stale_products():
+    """
+    Periodically queues the refresh of products whose data is older than `PRODUCT_REFRESH['MAX_AGE']`.
+
+    Products held in the most pantries and favourites lists are refreshed first, so
+    that request handlers can rely on the local row without refreshing it themselves.
+    At most `MAX_PER_RUN` products are queued per run, split into batches fetched
+    with a single API request each.
+    """
+    stale_before = timezone.now() - PRODUCT_MAX_AGE
+
+    # usage is counted from the pantry and favourites tables, which only hold the products someone
+    # uses, rather than by annotating the whole product table
+    usage = {}
+    last_updated = {}
+    for through_model in (PantryItem, Product.favourited_by.through):
+        rows = (
+            through_model.objects.filter(product__last_updated__lt=stale_before)
+            .values('product_id', 'product__last_updated')
+            .annotate(usage=Count('id'))
+        )
+        for row in rows:
+            usage[row['product_id']] = usage.get(row['product_id'], 0) + row['usage']
+            last_updated[row['product_id']] = row['product__last_updated']
+
+    product_ids = sorted(usage, key=lambda product_id: (-usage[product_id], last_updated[product_id]))[:PRODUCT_REFRESH_MAX_PER_RUN]
+    codes_by_id = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'code'))
+    stale_codes = [codes_by_id[product_id] for product_id in product_ids if product_id in codes_by_id]
+
+    # any room left goes to the longest stale products nobody holds
+    remaining = PRODUCT_REFRESH_MAX_PER_RUN - len(stale_codes)
+    if remaining > 0:
+        stale_codes += list(
+            Product.objects.filter(last_updated__lt=stale_before)
+            .exclude(id__in=PantryItem.objects.values('product_id'))
+            .exclude(id__in=Product.favourited_by.through.objects.values('product_id'))
+            .order_by('last_updated')
+            .values_list('code', flat=True)[:remaining]
+        )
+
+    for start in range(0, len(stale_codes), PRODUCT_REFRESH_BATCH_SIZE):
+        refresh_products_batch.delay(stale_codes[start:start + PRODUCT_REFRESH_BATCH_SIZE])
+
+    print(f"Queued {len(stale_codes)} stale products for refresh.")
+
+
+@shared_task(rate_limit='5/m')
+def refresh_products_batch(codes):
+    """
+    Re-fetches a batch of products from the Open Food Facts API and bulk-updates their local rows.
+
+    Products OFF no longer returns are marked as checked, so they aren't retried on every run.
+    The `rate_limit` is applied to respect API usage policies.
+    """
+    try:
+        products_data = fetch_products_by_codes(codes)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to refresh products {codes}: {e}")
+        return
+
+    saved_products = save_products_to_db(products_data)
+
+    refreshed_codes = {product.code for product in saved_products}
+    missing_codes = [code for code in codes if code not in refreshed_codes]
+    if missing_codes:
+        Product.objects.filter(code__in=missing_codes).update(last_updated=timezone.now())
@@ -0,0 +1,105 @@
+import time
+import heapq
+import unicodedata
+from bisect import bisect_left
+from django.core.cache import cache
+
+# how often (in seconds) each process checks whether a newer index has been published
+INDEX_VERSION_CHECK_INTERVAL = 60
+
+
+def normalise_suggestion_text(text):
+    """Lowercases text and strips accents so that e.g. 'Crème' and 'creme' share a prefix."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).strip()
+
+
+def get_ingredient_index_cache_key(language_code):
+    return f"off_ingredients_index_{language_code}"
+
+
+def get_ingredient_index_version_key(language_code):
+    return f"off_ingredients_index_version_{language_code}"
+
+
+def build_ingredient_index_data(facet_data):
+    """
+    Compiles ingredient facet data into the compact form stored in the cache.
+
+    Names are sorted by their normalised form so that prefix lookups can be
+    answered with a binary search, with product counts kept for ranking.
+    """
+    entries = {}
+    for tag in facet_data.get('tags', []):
+        name = tag.get('name')
+        if not name or tag.get('known') != 1:
+            continue
+        key = normalise_suggestion_text(name)
+        if key and entries.get(key, (None, -1))[1] < tag.get('products', 0):
+            entries[key] = (name, tag.get('products', 0))
+
+    sorted_keys = sorted(entries)
+    return {
+        'keys': sorted_keys,
+        'names': [entries[key][0] for key in sorted_keys],
+        'counts': [entries[key][1] for key in sorted_keys],
+    }
+
+
+class IngredientIndex:
+    """
+    An in-memory prefix index over the ingredients taxonomy for one language.
+
+    Lookups bisect into the sorted normalised names to find the range of entries
+    sharing the query as a prefix, then return the most used of them.
+    """
+    def __init__(self, keys, names, counts, version=None):
+        self.keys = keys
+        self.names = names
+        self.counts = counts
+        self.version = version
+
+    def suggest(self, query, limit=5):
+        prefix = normalise_suggestion_text(query)
+        if not prefix:
+            return []
+
+        start = bisect_left(self.keys, prefix)
+        # every key starting with the prefix sorts before the prefix followed by the highest code point
+        end = bisect_left(self.keys, prefix + '\U0010ffff', lo=start)
+
+        best_matches = heapq.nlargest(limit, range(start, end), key=lambda i: self.counts[i])
+        return [self.names[i] for i in best_matches]
+
+
+# per-process indexes, keyed by language code, along with when their version was last checked
+_loaded_indexes = {}
+_version_checked_at = {}
+
+
+def get_ingredient_index(language_code):
+    """
+    Returns the ingredient index for a language held by this process, or None if none has been published.
+
+    The index is only reloaded from the cache when the Celery task publishes a new version,
+    and the version itself is only checked once every `INDEX_VERSION_CHECK_INTERVAL` seconds.
+    """
+    index = _loaded_indexes.get(language_code)
+    now = time.monotonic()
+
+    if index is not None and now - _version_checked_at.get(language_code, 0) < INDEX_VERSION_CHECK_INTERVAL:
+        return index
+
+    _version_checked_at[language_code] = now
+    version = cache.get(get_ingredient_index_version_key(language_code))
+
+    if version is None:
+        return index
+
+    if index is None or index.version != version:
+        index_data = cache.get(get_ingredient_index_cache_key(language_code))
+        if index_data:
+            index = IngredientIndex(index_data['keys'], index_data['names'], index_data['counts'], version=version)
+            _loaded_indexes[language_code] = index
+
+    return index
@@ -1,3 +1,257 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import Pantry, PantryItem, Product, SCORE_FIELDS
+from .mutations import add_to_pantry, remove_from_pantry
+from .pantry_index import PantryIndex
+from .pagination import encode_cursor, get_pantry_items_page
 
-# Create your tests here.
+User = get_user_model()
+
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PantryTestCase(TestCase):
+    """Gives each test a user with a pantry and a clean cache, without queueing recipe generation."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('pantry.signals.generate_recipes_task.delay', return_value=mock.Mock(id='task'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(username='cook', password='password')
+        self.pantry = Pantry.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def create_product(self, code, product_name, **fields):
+        return Product.objects.create(code=code, product_name=product_name, **fields)
+
+    def post_json(self, url_name, data):
+        # pantry_changed is sent once the request's transaction commits, which TestCase never does
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(f'pantry:{url_name}'), json.dumps(data), content_type='application/json')
+
+
+class PantryMutationTests(PantryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.milk = self.create_product('1', 'Milk')
+
+    def test_adding_a_product_twice_sums_its_quantity(self):
+        item_id, quantity, created = add_to_pantry(self.user, self.milk, Decimal('1.50'))
+        self.assertEqual((quantity, created), (Decimal('1.50'), True))
+
+        self.assertEqual(add_to_pantry(self.user, self.milk, Decimal('2.00')), (item_id, Decimal('3.50'), False))
+        self.assertEqual(PantryItem.objects.get().quantity, Decimal('3.50'))
+
+    def test_adding_to_a_user_without_a_pantry_returns_none(self):
+        user = User.objects.create_user(username='guest', password='password')
+        self.assertIsNone(add_to_pantry(user, self.milk, Decimal('1.00')))
+
+    def test_removing_part_of_an_item_decrements_it(self):
+        item_id, _, _ = add_to_pantry(self.user, self.milk, Decimal('3.00'))
+
+        self.assertEqual(remove_from_pantry(self.user, item_id, Decimal('1.00')), (self.milk, Decimal('2.00')))
+        self.assertEqual(PantryItem.objects.get().quantity, Decimal('2.00'))
+
+    def test_removing_all_of_an_item_deletes_it(self):
+        item_id, _, _ = add_to_pantry(self.user, self.milk, Decimal('2.00'))
+
+        self.assertEqual(remove_from_pantry(self.user, item_id, Decimal('5.00')), (self.milk, Decimal('0.00')))
+        self.assertFalse(PantryItem.objects.exists())
+
+    def test_removing_another_users_item_returns_none(self):
+        item_id, _, _ = add_to_pantry(self.user, self.milk, Decimal('2.00'))
+        other = User.objects.create_user(username='other', password='password')
+        Pantry.objects.create(user=other)
+
+        self.assertIsNone(remove_from_pantry(other, item_id, Decimal('1.00')))
+        self.assertEqual(PantryItem.objects.get().quantity, Decimal('2.00'))
+
+    def test_add_product_view_reports_created_and_updated_items(self):
+        response = self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '1'})
+        self.assertEqual(response.json()['message'], 'Milk added to your pantry.')
+
+        response = self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '1'})
+        self.assertEqual(response.json()['message'], 'Milk quantity updated.')
+        self.assertEqual(PantryItem.objects.get().quantity, Decimal('2.00'))
+
+
+class PantryScoreTotalsTests(PantryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.milk = self.create_product('1', 'Milk', nutrition_score=Decimal('80'), ecoscore_score=Decimal('60'))
+        self.bread = self.create_product('2', 'Bread', nutrition_score=Decimal('40'))
+
+    def assertTotalsMatchRecalculation(self):
+        """Checks the incrementally kept totals and scores against ones recalculated from the pantry's items."""
+        self.pantry.refresh_from_db()
+        kept = {field: getattr(self.pantry, field) for field in SCORE_FIELDS}
+        self.pantry.calculate_aggregate_scores()
+        recalculated = {field: getattr(self.pantry, field) for field in SCORE_FIELDS}
+        for field in SCORE_FIELDS:
+            self.assertAlmostEqual(kept[field] or 0, recalculated[field] or 0, places=2, msg=field)
+        return kept
+
+    def test_totals_follow_adds_and_removes(self):
+        self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '2'})
+        self.post_json('add_product', {'product_id': self.bread.id, 'quantityToAdd': '1'})
+        totals = self.assertTotalsMatchRecalculation()
+        self.assertEqual(totals['nutri_quantity_total'], Decimal('3'))
+        self.assertAlmostEqual(totals['nutri_score'], Decimal('66.67'), places=2)
+        self.assertEqual(totals['eco_score'], Decimal('60'))
+
+        item = PantryItem.objects.get(product=self.milk)
+        self.post_json('remove_pantryitem', {'itemId': item.id, 'quantityToRemove': '2'})
+        totals = self.assertTotalsMatchRecalculation()
+        self.assertEqual(totals['nutri_score'], Decimal('40'))
+        self.assertIsNone(totals['eco_score'])
+
+    def test_totals_follow_a_batch(self):
+        self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '1'})
+        response = self.post_json('batch_pantry_update', {'operations': [
+            {'op': 'add', 'product_id': self.bread.id, 'quantity': '3'},
+            {'op': 'set', 'product_id': self.milk.id, 'quantity': '4'},
+            {'op': 'remove', 'product_id': self.bread.id, 'quantity': '1'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+
+        totals = self.assertTotalsMatchRecalculation()
+        self.assertEqual(totals['nutri_quantity_total'], Decimal('6'))
+        self.assertEqual(totals['eco_quantity_total'], Decimal('4'))
+
+    def test_invalid_batch_leaves_the_totals_alone(self):
+        self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '1'})
+        response = self.post_json('batch_pantry_update', {'operations': [
+            {'op': 'add', 'product_id': self.bread.id, 'quantity': '3'},
+            {'op': 'remove', 'item_id': 999999, 'quantity': '1'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+
+        totals = self.assertTotalsMatchRecalculation()
+        self.assertEqual(totals['nutri_quantity_total'], Decimal('1'))
+        self.assertFalse(PantryItem.objects.filter(product=self.bread).exists())
+
+
+class PantryETagTests(PantryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.milk = self.create_product('1', 'Milk')
+        self.bread = self.create_product('2', 'Bread')
+        self.post_json('add_product', {'product_id': self.milk.id, 'quantityToAdd': '1'})
+
+    def get_revalidated(self, url):
+        """Fetches a URL, then fetches it again with the ETag it was sent, returning both responses."""
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_unchanged_pantry_items_are_not_modified(self):
+        _, second = self.get_revalidated(reverse('pantry:pantry_items'))
+        self.assertEqual(second.status_code, 304)
+
+    def test_changed_pantry_items_are_sent_again(self):
+        first = self.client.get(reverse('pantry:pantry_items'))
+        self.post_json('add_product', {'product_id': self.bread.id, 'quantityToAdd': '1'})
+
+        second = self.client.get(reverse('pantry:pantry_items'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(second.json()['items']), 2)
+
+    def test_pantry_search_is_revalidated_until_the_pantry_changes(self):
+        url = f"{reverse('pantry:search_pantry')}?query=milk"
+        first, second = self.get_revalidated(url)
+        self.assertEqual(second.status_code, 304)
+
+        item = PantryItem.objects.get(product=self.milk)
+        self.post_json('remove_pantryitem', {'itemId': item.id, 'quantityToRemove': '1'})
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.json()['found_items'], [])
+
+    def test_favourites_change_the_tag(self):
+        first = self.client.get(reverse('pantry:favourite_products'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.favourited_products.add(self.bread)
+
+        second = self.client.get(reverse('pantry:favourite_products'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+
+
+class PantryIndexTests(SimpleTestCase):
+    def setUp(self):
+        names_and_brands = [('Goat Cheese', 'Valley Farm'), ('Oat Milk', 'Oatly'), ('Crème fraîche', ''), ('Whole Milk', 'Valley Farm')]
+        self.index = PantryIndex([
+            ({'product_id': product_id, 'product_name': name, 'brands': brands}, [])
+            for product_id, (name, brands) in enumerate(names_and_brands)
+        ])
+
+    def search(self, term):
+        return [payload['product_name'] for payload, _ in self.index.search(term)]
+
+    def test_words_are_found_inside_names(self):
+        self.assertEqual(self.search('ilk'), ['Oat Milk', 'Whole Milk'])
+        self.assertEqual(self.search('hees'), ['Goat Cheese'])
+
+    def test_names_starting_with_the_term_come_first(self):
+        self.assertEqual(self.search('oat'), ['Oat Milk', 'Goat Cheese'])
+        self.assertEqual(self.search('milk'), ['Oat Milk', 'Whole Milk'])
+
+    def test_words_shorter_than_a_trigram_are_matched(self):
+        self.assertEqual(self.search('wh'), ['Whole Milk'])
+
+    def test_every_word_must_match_the_name_or_brand(self):
+        self.assertEqual(self.search('valley milk'), ['Whole Milk'])
+        self.assertEqual(self.search('oat butter'), [])
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.search('CREME'), ['Crème fraîche'])
+        self.assertEqual(self.search('fraîche'), ['Crème fraîche'])
+
+    def test_empty_term_returns_every_entry(self):
+        self.assertEqual(len(self.search('  ')), 4)
+
+
+class PantryPaginationTests(PantryTestCase):
+    def setUp(self):
+        super().setUp()
+        products = [self.create_product(str(i), f"Product {i}") for i in range(5)]
+        # items sharing an added date are told apart by their id
+        added_date = timezone.now()
+        PantryItem.objects.bulk_create([
+            PantryItem(pantry=self.pantry, product=product, quantity=1, added_date=added_date) for product in products
+        ])
+
+    def test_pages_cover_every_item_once(self):
+        item_ids = []
+        cursor = None
+        while True:
+            items, cursor = get_pantry_items_page(self.user, cursor=cursor, page_size=2)
+            item_ids.extend(item.id for item in items)
+            if cursor is None:
+                break
+        self.assertEqual(sorted(item_ids), sorted(PantryItem.objects.values_list('id', flat=True)))
+        self.assertEqual(len(item_ids), len(set(item_ids)))
+
+    def test_next_page_is_fetched_with_the_cursor(self):
+        _, cursor = get_pantry_items_page(self.user, page_size=3)
+        response = self.client.get(reverse('pantry:pantry_items'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_cursors_are_rejected(self):
+        bad_cursors = {
+            'pantry:pantry_items': ['not a cursor', encode_cursor(['yesterday', 1]), encode_cursor([1])],
+            'pantry:favourite_products': ['not a cursor', encode_cursor(['1']), encode_cursor([1, 2])],
+        }
+        for url_name, cursors in bad_cursors.items():
+            for cursor in cursors:
+                with self.subTest(url_name=url_name, cursor=cursor):
+                    self.assertEqual(self.client.get(reverse(url_name), {'cursor': cursor}).status_code, 400)
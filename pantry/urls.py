@@ -6,9 +6,12 @@ app_name = 'pantry'
 urlpatterns = [
     path('', views.index, name='index'),
     path('pantry/', views.pantry_view, name="pantry_view"),
+    path('pantry/items', views.pantry_items, name="pantry_items"),
+    path('favourites/', views.favourite_products, name="favourite_products"),
     path('product/search/', views.search_product, name='search_product'),
     path("pantry/add_product", views.add_product, name = "add_product"),
     path("pantry/remove_pantryitem", views.remove_pantryitem, name="remove_pantryitem"),
+    path("pantry/batch", views.batch_pantry_update, name="batch_pantry_update"),
     path("favourite_product/<int:id>", views.toggle_favourite_product, name="toggle_favourite_product"),
     path("suggestions/", views.product_suggestions, name="product_suggestions"),
     path("adv_search/populate_criteria", views.populate_adv_search_criteria, name="populate_adv_search_criteria"),
@@ -1,17 +1,38 @@
+import json
+import time
+import hashlib
 import requests
 from django.core.cache import cache
 from django.conf import settings
+from django.db import transaction
 from django_ratelimit.decorators import ratelimit
 from django.utils import timezone 
-from pantry.models import Product
-from savor.utils import get_headers, rate_limit_error_response, LANGUAGE_CODE_MAP, COUNTRY_CODE_MAP, get_cached_json
-from users.models import UserSettings, Allergen
+from pantry.models import Pantry, Product
+from savor.utils import get_cached_json, single_flight, acquire_single_flight, release_single_flight, lookup_facet_names, NAME_LOOKUP_FACETS
+from savor.off_client import off_client, split_off_subdomain
+from users.models import Allergen
+from users.profile import get_user_profile, get_request_off_base_url
+from .taxonomy import get_ingredient_index
+from .search import search_products
+from .versions import bump_pantry_versions
 
 OFF_API_BASE_URL = settings.OPENFOODFACTS_API['BASE_URL']
-OFF_USER_AGENT = settings.OPENFOODFACTS_API['USER_AGENT']
-USE_STAGING_AUTH = settings.OPENFOODFACTS_API['USE_STAGING_AUTH']
-OFF_USERNAME = settings.OPENFOODFACTS_API['USERNAME']
-OFF_PASSWORD = settings.OPENFOODFACTS_API['PASSWORD']
+BARCODE_HIT_TTL = settings.OPENFOODFACTS_CACHE['BARCODE_HIT_TTL']
+BARCODE_MISS_TTL = settings.OPENFOODFACTS_CACHE['BARCODE_MISS_TTL']
+SEARCH_FRESH_TTL = settings.OPENFOODFACTS_CACHE['SEARCH_FRESH_TTL']
+SEARCH_STALE_TTL = settings.OPENFOODFACTS_CACHE['SEARCH_STALE_TTL']
+SEARCH_REFRESH_LOCK_TTL = settings.OPENFOODFACTS_CACHE['SEARCH_REFRESH_LOCK_TTL']
+SUGGESTIONS_FALLBACK = settings.OPENFOODFACTS_API['SUGGESTIONS_FALLBACK']
+PREFETCH_NEXT_PAGE = settings.OPENFOODFACTS_API['PREFETCH_NEXT_PAGE']
+SEARCH_STREAM_CHUNK_SIZE = settings.OPENFOODFACTS_API['SEARCH_STREAM_CHUNK_SIZE']
+HEDGE_LOCALISED_SEARCHES = settings.OPENFOODFACTS_API['HEDGING']['ENABLED']
+
+# the product fields we persist (see `build_product_fields`), requested from OFF via its `fields`
+# parameter so that only these are downloaded rather than the full product documents
+OFF_PRODUCT_FIELDS = ','.join([
+    'code', 'product_name', 'brands', 'image_small_url', 'product_quantity', 'product_quantity_unit',
+    'labels_tags', 'allergens_tags', 'nutriscore_score', 'nutriscore_grade', 'ecoscore_score', 'ecoscore_grade',
+])
 
 
 @ratelimit(key='ip', rate='10/m', block=True, group='off_advsearch_api_call')
@@ -23,45 +44,22 @@ def adv_search_product(request, search_params, page=1):
     region-specific results, then applies additional search parameters.
     """
 
-    api_url = f"{OFF_API_BASE_URL}/cgi/search.pl"
+    api_url = f"{get_request_off_base_url(request)}/cgi/search.pl"
 
-    user = request.user
-    if user.is_authenticated:
-        user_settings = UserSettings.objects.get(user=user)
-
-        # adjust API endpoint to localise results if user setting is enabled
-        if user_settings.prioritise_local_results:
-            user_country_name = user_settings.country
-            country_code = COUNTRY_CODE_MAP.get(user_country_name, 'world')
-            api_url = f"https://{country_code}.openfoodfacts.net/cgi/search.pl"
-
-        if user_settings.language_preference != 'en':
-            user_lang_name = user_settings.language_preference
-            language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
-            api_url = f"https://{country_code}-{language_code}.openfoodfacts.net/cgi/search.pl"
-
-    headers = get_headers()
     final_params = {
         'action': 'process',
         'json': 1,
         'page_size': 21,
-        'page': page
+        'page': page,
+        'fields': OFF_PRODUCT_FIELDS,
     }
 
     # merge base API parameters with search criteria
     final_params.update(search_params)
 
-    try:
-        response = requests.get(api_url, params=final_params, headers=headers)
-
-        print(f"Full URL requested: {response.url}")
-
-        response.raise_for_status()         
-        return response.json()
-    
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
-        return []
+    response_data = get_cached_search_results(api_url, final_params)
+    schedule_next_page_prefetch(api_url, final_params, response_data)
+    return response_data
 
 
 
@@ -75,53 +73,334 @@ def fetch_product_by_barcode(request, barcode):
     """
 
     api_url = f"{OFF_API_BASE_URL}/api/v2/product/{barcode}.json"
-    headers = get_headers()
-    
-    response = requests.get(api_url, headers=headers)
-    response.raise_for_status() 
-    return response.json()
+    return off_client.get_json(api_url, params={'fields': OFF_PRODUCT_FIELDS})
 
 
 
-@ratelimit(key='ip', rate='10/m', block=True, group='off_name_api_call')
-def search_products_by_name(request, product_name, page=1):
+def get_barcode_cache_key(barcode):
+    """Returns the cache key used to store the Open Food Facts lookup for a barcode."""
+    return f"off_barcode_cache_{barcode}"
+
+
+def lookup_product_by_barcode(request, barcode):
     """
-    Searches for products by name using the Open Food Facts API.
+    Returns the Open Food Facts barcode lookup for a product, served from the cache where possible.
 
-    Adjusts API endpoint based on user's country and language preferences for localized results.
+    Both found and unknown barcodes are cached, with separate lifetimes, so that
+    repeated scans of the same code never reach the API more than once per TTL.
+    """
+    cache_key = get_barcode_cache_key(barcode)
+    cached_response = cache.get(cache_key)
+
+    if cached_response is not None:
+        print(f"Barcode {barcode} served from cache.")
+        return cached_response
+
+    try:
+        response_data = fetch_product_by_barcode(request, barcode)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        # remember unknown barcodes so they don't hit the API on every scan
+        response_data = {'code': barcode, 'status': 0, 'product': None}
+
+    if response_data.get('status') == 1 and response_data.get('product'):
+        cache.set(cache_key, response_data, timeout=BARCODE_HIT_TTL)
+    else:
+        cache.set(cache_key, response_data, timeout=BARCODE_MISS_TTL)
+
+    return response_data
+
+
+def get_product_by_barcode(request, barcode):
+    """
+    Looks up a barcode on OFF and saves the product to the local database.
+
+    Concurrent lookups of the same barcode are coalesced, so only one worker calls
+    the API and writes the product row. Returns the saved product, or None if the
+    barcode is unknown to OFF.
+    """
+    def lookup_and_save():
+        response_data = lookup_product_by_barcode(request, barcode)
+        if response_data.get('status') == 1 and response_data.get('product'):
+            return save_product_to_db(response_data['product'])
+        return None
+
+    return single_flight(get_barcode_cache_key(barcode), lookup_and_save)
+
+
+def invalidate_barcode_cache(barcodes):
+    """Removes any cached Open Food Facts lookups for several barcodes, forcing the next scan of each to refetch it."""
+    cache.delete_many([get_barcode_cache_key(barcode) for barcode in barcodes])
+
+
+
+def normalise_search_params(params):
+    """
+    Normalises search parameters so that equivalent searches share a cache entry.
+
+    Free-text values are lowercased and have their whitespace collapsed, and the
+    page number is coerced to an integer, falling back to the first page if the
+    client sent something that isn't a positive whole number.
+    """
+    normalised = {}
+    for key, value in params.items():
+        if value is None or value == '':
+            continue
+        if key == 'page':
+            try:
+                value = max(int(value), 1)
+            except (TypeError, ValueError):
+                value = 1
+        elif key == 'search_terms' or key.startswith('tag_'):
+            value = ' '.join(str(value).lower().split())
+        normalised[key] = value
+    return normalised
+
+
+def get_search_cache_key(api_url, params):
+    """Returns the cache key for an OFF search, derived from the endpoint and its normalised parameters."""
+    key_source = json.dumps([api_url, sorted(params.items())], default=str)
+    return f"off_search_cache_{hashlib.sha1(key_source.encode()).hexdigest()}"
+
+
+def get_search_hedge_url(api_url):
+    """
+    Returns the world endpoint equivalent of a localised search URL, to hedge slow or
+    empty localised searches with, or None if the URL already targets the world endpoint.
+    """
+    subdomain, path = split_off_subdomain(api_url)
+    if not HEDGE_LOCALISED_SEARCHES or subdomain == 'world':
+        return None
+    return f"{OFF_API_BASE_URL}{path}"
+
+
+def fetch_search_page(api_url, params):
+    """
+    Performs an OFF search request and returns the response, without saving anything.
+
+    Localised searches are hedged against the world endpoint, so a slow or empty
+    country mirror doesn't hold up or blank out the results.
+    """
+    hedge_url = get_search_hedge_url(api_url)
+    if hedge_url:
+        return off_client.get_json_hedged(
+            api_url, hedge_url, params=params, is_usable=lambda data: bool(data.get('products'))
+        )
+    return off_client.get_json(api_url, params=params)
+
+
+def cache_search_results(api_url, params, response_data, saved_products):
+    """
+    Stores a page of OFF search results in the search cache, along with the ids of its
+    saved products so that later requests served from the cache can load them without
+    writing them again. Entries are kept for the fresh and stale periods combined, with
+    the time they stop being fresh recorded alongside the data.
+    """
+    response_data['saved_product_ids'] = [product.id for product in saved_products]
+    cache.set(
+        get_search_cache_key(api_url, params),
+        {'data': response_data, 'fresh_until': time.time() + SEARCH_FRESH_TTL},
+        timeout=SEARCH_FRESH_TTL + SEARCH_STALE_TTL
+    )
+
+
+def fetch_search_results(api_url, params):
+    """
+    Performs an OFF search request, saves the page of products to the local database
+    and stores the response in the search cache.
+    """
+    response_data = fetch_search_page(api_url, params)
+    saved_products = save_products_to_db(response_data.get('products', []))
+    cache_search_results(api_url, params, response_data, saved_products)
+    return response_data
+
+
+def get_search_cache_entry(api_url, params):
+    """
+    Returns cached OFF search results for normalised parameters, or None on a miss.
+
+    Stale entries are returned too, while a Celery task refreshes them.
     """
+    # imported here as the tasks module depends on this one
+    from .tasks import refresh_search_cache
+
+    cache_key = get_search_cache_key(api_url, params)
+    cached_entry = cache.get(cache_key)
+    if cached_entry is None:
+        return None
+
+    if cached_entry['fresh_until'] < time.time():
+        # only schedule one refresh per stale entry
+        if cache.add(f"{cache_key}_refreshing", True, timeout=SEARCH_REFRESH_LOCK_TTL):
+            refresh_search_cache.delay(api_url, params)
+    return cached_entry['data']
+
+
+def get_cached_search_results(api_url, params):
+    """
+    Returns OFF search results, using a stale-while-revalidate cache.
+
+    - Fresh entries are returned as is.
+    - Stale entries are returned immediately while a Celery task refreshes them.
+    - On a miss, concurrent identical searches are coalesced so that only one
+      worker queries the API and saves the results.
+    """
+    params = normalise_search_params(params)
+    response_data = get_search_cache_entry(api_url, params)
+    if response_data is not None:
+        return response_data
+
+    return single_flight(get_search_cache_key(api_url, params), lambda: fetch_search_results(api_url, params))
+
+
+def iter_saved_search_chunks(api_url, params, response_data, chunk_size=SEARCH_STREAM_CHUNK_SIZE):
+    """
+    Yields the locally saved products for a page of search results in chunks, in the order OFF returned them.
+
+    A page that hasn't been saved yet is written a chunk at a time as the chunks are
+    consumed, so the first products can be sent before the rest are saved. Only the
+    caller holding the search's single-flight lock is given such a page: once the last
+    chunk is saved, the page is cached and handed to the searches waiting on the lock,
+    which then only load it. Pages already saved are loaded at once.
+    """
+    if 'saved_product_ids' in response_data:
+        yield get_saved_search_products(response_data)
+        return
+
+    products_data = response_data.get('products', [])
+    saved_products = []
+    saved = False
+    try:
+        for start in range(0, len(products_data), chunk_size):
+            chunk = save_products_to_db(products_data[start:start + chunk_size])
+            saved_products.extend(chunk)
+            yield chunk
+
+        cache_search_results(api_url, params, response_data, saved_products)
+        saved = True
+    finally:
+        # if the stream was cut short, waiting searches are left to fetch and save the page themselves
+        release_single_flight(get_search_cache_key(api_url, params), response_data, publish=saved)
+
+
+def schedule_next_page_prefetch(api_url, params, response_data):
+    """
+    Queues a background fetch of the page after the one just served, so that
+    flipping to the next page of results is answered from the search cache.
+
+    Each next page is only queued once at a time, and nothing is queued past the last page.
+    """
+    # imported here as the tasks module depends on this one
+    from .tasks import prefetch_search_page
+
+    if not PREFETCH_NEXT_PAGE:
+        return
+
+    try:
+        page = int(params.get('page', 1))
+        page_size = int(response_data.get('page_size') or params.get('page_size', 21))
+        count = int(response_data.get('count') or 0)
+    except (TypeError, ValueError):
+        return
+
+    if page * page_size >= count:
+        return
+
+    next_page_params = normalise_search_params({**params, 'page': page + 1})
+    next_page_key = get_search_cache_key(api_url, next_page_params)
+
+    if cache.add(f"{next_page_key}_prefetching", True, timeout=SEARCH_REFRESH_LOCK_TTL):
+        prefetch_search_page.delay(api_url, next_page_params)
 
-    api_url = f"{OFF_API_BASE_URL}/cgi/search.pl"
 
-    user = request.user
-    if user.is_authenticated:
-        user_settings = UserSettings.objects.get(user=user)
+def get_saved_search_products(response_data):
+    """Returns the locally saved products for a page of search results, in the order OFF returned them."""
+    if 'saved_product_ids' not in response_data:
+        return save_products_to_db(response_data.get('products', []))
 
-        # adjust API endpoint to localise results if user setting is enabled
-        if user_settings.prioritise_local_results:
-         user_country_name = user_settings.country
-         country_code = COUNTRY_CODE_MAP.get(user_country_name, 'world')
-         api_url = f"https://{country_code}.openfoodfacts.net/cgi/search.pl"
+    product_ids = response_data['saved_product_ids']
+    products = Product.objects.in_bulk(product_ids)
+    return [products[product_id] for product_id in product_ids if product_id in products]
 
-         if user_settings.language_preference != 'en':
-             user_lang_name = user_settings.language_preference
-             language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
-             api_url = f"https://{country_code}-{language_code}.openfoodfacts.net/cgi/search.pl"
 
-         
-    headers = get_headers()
+
+def fetch_products_by_codes(codes):
+    """
+    Fetches several products from the Open Food Facts API in a single request,
+    using the v2 search endpoint's multi-code filter.
+
+    Used by background tasks, so it isn't rate limited per request like the user-facing searches.
+    """
+    api_url = f"{OFF_API_BASE_URL}/api/v2/search"
     params = {
+        'code': ','.join(codes),
+        'page_size': len(codes),
+        'fields': OFF_PRODUCT_FIELDS,
+    }
+
+    response_data = off_client.get_json(api_url, params=params)
+    return response_data.get('products', [])
+
+
+
+def get_name_search_params(product_name, page=1):
+    """Returns the OFF search parameters for a name search."""
+    return {
         'search_terms': product_name,
         'search_simple': 1,
         'action': 'process',
         'json': 1,
         'page_size': 21,
-        'page': page
+        'page': page,
+        'fields': OFF_PRODUCT_FIELDS,
     }
 
-    response = requests.get(api_url, headers=headers, params=params)
-    response.raise_for_status()
-    return response.json()
+
+@ratelimit(key='ip', rate='10/m', block=True, group='off_name_api_call')
+def search_products_by_name(request, product_name, page=1):
+    """
+    Searches for products by name using the Open Food Facts API.
+
+    Adjusts API endpoint based on user's country and language preferences for localized results.
+    """
+
+    api_url = f"{get_request_off_base_url(request)}/cgi/search.pl"
+    params = get_name_search_params(product_name, page)
+
+    response_data = get_cached_search_results(api_url, params)
+    schedule_next_page_prefetch(api_url, params, response_data)
+    return response_data
+
+
+@ratelimit(key='ip', rate='10/m', block=True, group='off_name_api_call')
+def search_products_by_name_in_chunks(request, product_name, page=1):
+    """
+    Streaming counterpart of `search_products_by_name`, sharing its rate limit and search cache.
+
+    Returns the OFF response along with an iterator over the page's products in saved
+    chunks (see `iter_saved_search_chunks`), rather than saving the whole page before
+    returning. Concurrent identical searches, streamed or not, still share a single API
+    request and a single save of the page.
+    """
+    api_url = f"{get_request_off_base_url(request)}/cgi/search.pl"
+    params = normalise_search_params(get_name_search_params(product_name, page))
+    cache_key = get_search_cache_key(api_url, params)
+
+    response_data = get_search_cache_entry(api_url, params)
+    if response_data is None:
+        if acquire_single_flight(cache_key):
+            # the lock is released by `iter_saved_search_chunks` once the page is saved
+            try:
+                response_data = fetch_search_page(api_url, params)
+            except BaseException:
+                release_single_flight(cache_key)
+                raise
+        else:
+            response_data = single_flight(cache_key, lambda: fetch_search_results(api_url, params))
+
+    schedule_next_page_prefetch(api_url, params, response_data)
+    return response_data, iter_saved_search_chunks(api_url, params, response_data)
 
 
 @ratelimit(key='ip', rate='30/m', block=True, group='off_suggestions_api_call')
@@ -131,23 +410,8 @@ def get_product_suggestions(request, query):
 
     Localises the API endpoint based on user settings to provide more relevant suggestions.
     """
-    api_url = f"{OFF_API_BASE_URL}/api/v3/taxonomy_suggestions"
-    
-    if request.user.is_authenticated:
-        user_settings = UserSettings.objects.get(user=request.user)
-        
-        # adjust API endpoint to localise results if user setting is enabled
-        if user_settings.prioritise_local_results:
-            user_country_name = user_settings.country
-            country_code = COUNTRY_CODE_MAP.get(user_country_name, 'world')
-            api_url = f"https://{country_code}.openfoodfacts.net/api/v3/taxonomy_suggestions"
-
-            if user_settings.language_preference != 'en':
-                user_lang_name = user_settings.language_preference
-                language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
-                api_url = f"https://{country_code}-{language_code}.openfoodfacts.net/api/v3/taxonomy_suggestions"
-           
-        
+    api_url = f"{get_request_off_base_url(request)}/api/v3/taxonomy_suggestions"
+
     params = {
         'tagtype': 'ingredients',
         'string': query,
@@ -155,9 +419,7 @@ def get_product_suggestions(request, query):
     }
 
     try:
-        response = requests.get(api_url, params=params)
-        response.raise_for_status()
-        data = response.json()
+        data = off_client.get_json(api_url, params=params)
         return data.get('suggestions', [])
     except requests.exceptions.RequestException as e:
         print(f"Error fetching suggestions: {e}")
@@ -165,19 +427,41 @@ def get_product_suggestions(request, query):
 
 
 
+def suggest_ingredients(request, query, limit=5):
+    """
+    Returns autocomplete suggestions for a product search from the local ingredient index.
+
+    The index for the user's language is held in memory by each process, so no API
+    call is made. If no index has been published yet, falls back to the live OFF
+    taxonomy suggestions API when `SUGGESTIONS_FALLBACK` is enabled.
+    """
+    profile = get_user_profile(request)
+    language_code = profile.language_code if profile else 'en'
+
+    index = get_ingredient_index(language_code) or get_ingredient_index('en')
+
+    if index is not None:
+        return index.suggest(query, limit=limit)
+
+    if SUGGESTIONS_FALLBACK:
+        return get_product_suggestions(request, query)
+
+    return []
+
+
+
 def check_db_for_product(barcode = None, search_term = None, country=None, category= None, brand = None):
     """
     Checks the local database for products matching the given criteria.
 
     This function implements the "DB-first" part of the search strategy to reduce external API calls.
+    Search terms are matched through the product text index, with the best matches returned first.
     """
     found_products_json = []
     query_params = {}
 
     if barcode:
         query_params['code'] = barcode
-    if search_term:
-        query_params['product_name__icontains'] = search_term
     if country:
         query_params['countries_en__iexact'] = country
     if category:
@@ -185,12 +469,15 @@ def check_db_for_product(barcode = None, search_term = None, country=None, categ
     if brand:
         query_params['brands__iexact'] = brand
 
-    if query_params:
+    if query_params or search_term:
         try:
             products_from_db = Product.objects.filter(**query_params)
+
+            if search_term:
+                products_from_db = search_products(products_from_db, search_term)
             
             if products_from_db.exists():
-                print(f"Products found in local DB for criteria: {query_params}")
+                print(f"Products found in local DB for criteria: {query_params} {search_term or ''}")
                 for product in products_from_db:
                     found_products_json.append({
                         'code': product.code,
@@ -212,6 +499,94 @@ def check_db_for_product(barcode = None, search_term = None, country=None, categ
             
 
 
+# product fields refreshed from the API response whenever a product is saved
+PRODUCT_UPDATE_FIELDS = [
+    'product_name', 'brands', 'image_url', 'last_updated', 'product_quantity', 'product_quantity_unit',
+    'labels_tags', 'allergens_tags', 'nutrition_score', 'nutrition_grade', 'ecoscore_score', 'ecoscore_grade',
+]
+
+
+def build_product_fields(product_data):
+    """
+    Maps an Open Food Facts product document to the `Product` model fields we persist.
+
+    Any new field read here must also be added to `OFF_PRODUCT_FIELDS`.
+    """
+    return {
+        # the column isn't nullable, products OFF has no name for are shown as "No Name"
+        'product_name': product_data.get('product_name') or '',
+        'brands': product_data.get('brands'),
+        'image_url': product_data.get('image_small_url'),
+        'last_updated': timezone.now(),
+        'product_quantity': product_data.get('product_quantity'),
+        'product_quantity_unit': product_data.get('product_quantity_unit'),
+        'labels_tags': product_data.get('labels_tags', []),
+        'allergens_tags': product_data.get('allergens_tags', []),
+        'nutrition_score': product_data.get('nutriscore_score'),
+        'nutrition_grade': product_data.get('nutriscore_grade'),
+        'ecoscore_score': product_data.get('ecoscore_score'),
+        'ecoscore_grade': product_data.get('ecoscore_grade'),
+    }
+
+
+# fields the stored conflicts of a product are computed from
+PRODUCT_TAG_FIELDS = ['labels_tags', 'allergens_tags']
+# fields the pantry scores are computed from
+PRODUCT_SCORE_FIELDS = ['nutrition_score', 'ecoscore_score']
+# fields shown for a product on the pantry and favourites pages
+PRODUCT_DISPLAY_FIELDS = ['product_name', 'brands', 'image_url', 'product_quantity', 'product_quantity_unit']
+PRODUCT_COMPARED_FIELDS = PRODUCT_TAG_FIELDS + PRODUCT_SCORE_FIELDS + PRODUCT_DISPLAY_FIELDS
+
+
+def get_product_field_values(codes, fields=PRODUCT_COMPARED_FIELDS):
+    """Returns the stored values of some fields of the products with the given codes, keyed by code, in one query."""
+    return {row['code']: row for row in Product.objects.filter(code__in=codes).values('code', *fields)}
+
+
+def get_changed_product_ids(previous_values, products, fields):
+    """
+    Returns the ids of saved products whose fields differ from the values read by
+    `get_product_field_values` before saving them. Products that were just created are
+    left out, as nothing can have been derived from them yet.
+    """
+    model_fields = [Product._meta.get_field(field) for field in fields]
+    changed_ids = set()
+    for product in products:
+        if product.code not in previous_values:
+            continue
+        # values are compared as their model field would load them, e.g. an API's integer score against a stored decimal
+        current_values = [model_field.to_python(getattr(product, model_field.attname)) for model_field in model_fields]
+        stored_values = [model_field.to_python(previous_values[product.code][model_field.attname]) for model_field in model_fields]
+        if current_values != stored_values:
+            changed_ids.add(product.id)
+    return changed_ids
+
+
+def refresh_saved_products(previous_values, products):
+    """
+    Brings what is derived from saved products up to date with what actually changed in
+    them, given their values read by `get_product_field_values` before saving.
+
+    Stored conflicts are recomputed for products whose tags changed, the scores of
+    pantries holding products whose scores changed are recalculated, and every user
+    tracking a product that changed in any way their pages show moves on to a new
+    pantry version. Saving unchanged products costs no queries and bumps nothing.
+    """
+    # imported here as the conflicts module depends on this one
+    from .conflicts import refresh_product_conflicts, get_tracking_user_ids
+
+    products = list(products)
+    tags_changed_ids = get_changed_product_ids(previous_values, products, PRODUCT_TAG_FIELDS)
+    scores_changed_ids = get_changed_product_ids(previous_values, products, PRODUCT_SCORE_FIELDS)
+    display_changed_ids = get_changed_product_ids(previous_values, products, PRODUCT_DISPLAY_FIELDS)
+
+    changed_user_ids = refresh_product_conflicts(tags_changed_ids)
+    changed_user_ids |= Pantry.recalculate_scores_for_products(scores_changed_ids)
+    # users with the product in their favourites are tracking it too, so their pages move on as well
+    changed_user_ids |= get_tracking_user_ids(display_changed_ids - tags_changed_ids)
+    bump_pantry_versions(changed_user_ids)
+
+
 def save_product_to_db(product_data):
     """
     Saves or updates product data in the local database from Open Food Facts API response.
@@ -223,46 +598,85 @@ def save_product_to_db(product_data):
         print("No valid product data or code to save to DB.")
         return None
 
-    off_quantity = product_data.get('product_quantity')
-    off_unit = product_data.get('product_quantity_unit')
-
-    api_allergen_tags = product_data.get('allergens_tags', []) 
-    api_labels_tags = product_data.get('labels_tags', [])
-
-    nutri_score = product_data.get('nutriscore_score')
-    nutri_grade = product_data.get('nutriscore_grade')
-    
-    ecoscore_score = product_data.get('ecoscore_score')
-    ecoscore_grade = product_data.get('ecoscore_grade')
-
-
     try:
+        previous_values = get_product_field_values([product_data.get('code')])
         product, created = Product.objects.update_or_create(
             code=product_data.get('code'),
-            defaults={
-                'product_name': product_data.get('product_name'),
-                'brands': product_data.get('brands'),
-                'image_url': product_data.get('image_small_url'),
-                'last_updated': timezone.now(),
-                'product_quantity': off_quantity,
-                'product_quantity_unit': off_unit,
-                'labels_tags': api_labels_tags, 
-                'allergens_tags': api_allergen_tags,
-                'nutrition_score': nutri_score,
-                'nutrition_grade': nutri_grade,
-                'ecoscore_score': ecoscore_score,
-                'ecoscore_grade': ecoscore_grade,
-            }
+            defaults=build_product_fields(product_data)
         )
 
-        product_allergens = Allergen.objects.filter(api_tag__in=api_allergen_tags)
+        product_allergens = Allergen.objects.filter(api_tag__in=product.allergens_tags)
 
         product.allergens.set(product_allergens)
         print(f"Product {'created' if created else 'updated'} in local DB: {product.product_name}")
+
+        refresh_saved_products(previous_values, [product])
         return product
     except Exception as e:
         print(f"Error saving product to DB: {e}")
         return None
+
+
+def save_products_to_db(products_data):
+    """
+    Saves or updates a page of Open Food Facts products in a constant number of queries.
+
+    Products are upserted in a single `bulk_create`, their allergen tags resolved with
+    one query and the allergen relations rewritten in bulk. Only what depends on the
+    fields that actually changed is then refreshed (see `refresh_saved_products`).
+
+    Returns the saved products in the order they were given. Should the batch fail (e.g.
+    one product has invalid data), falls back to saving each product individually so
+    valid ones are kept.
+    """
+    # duplicate codes would conflict within one upsert
+    products_by_code = {}
+    for product_data in products_data:
+        if product_data and product_data.get('code'):
+            products_by_code[product_data['code']] = product_data
+
+    if not products_by_code:
+        return []
+
+    try:
+        with transaction.atomic():
+            previous_values = get_product_field_values(list(products_by_code))
+            Product.objects.bulk_create(
+                [Product(code=code, **build_product_fields(product_data)) for code, product_data in products_by_code.items()],
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=PRODUCT_UPDATE_FIELDS,
+            )
+            saved_products = Product.objects.in_bulk(list(products_by_code), field_name='code')
+
+            all_allergen_tags = set()
+            for product in saved_products.values():
+                all_allergen_tags.update(product.allergens_tags or [])
+            allergen_ids = dict(Allergen.objects.filter(api_tag__in=all_allergen_tags).values_list('api_tag', 'id'))
+
+            ProductAllergen = Product.allergens.through
+            ProductAllergen.objects.filter(product_id__in=[product.id for product in saved_products.values()]).delete()
+            ProductAllergen.objects.bulk_create([
+                ProductAllergen(product_id=product.id, allergen_id=allergen_ids[tag])
+                for product in saved_products.values()
+                for tag in set(product.allergens_tags or [])
+                if tag in allergen_ids
+            ])
+    except Exception as e:
+        print(f"Error bulk saving products to DB: {e}. Saving products individually.")
+        saved_products = {}
+        for code, product_data in products_by_code.items():
+            product = save_product_to_db(product_data)
+            if product:
+                saved_products[code] = product
+    else:
+        refresh_saved_products(previous_values, saved_products.values())
+
+    # a cached miss, or an older copy, of a barcode saved from a search, refresh or import would otherwise outlive this save
+    invalidate_barcode_cache(list(saved_products))
+
+    print(f"{len(saved_products)} products saved to local DB.")
+    return [saved_products[code] for code in products_by_code if code in saved_products]
     
 
 def build_api_search_params(params):
@@ -301,22 +715,31 @@ def get_localised_names( product_tags, cached_data_type, language_code ):
     localised names using cached data.
 
     This ensures that product details are displayed in the user's preferred language.
+    Names are read from the compiled lookup tables published by the facet tasks,
+    falling back to the full cached facet data until a table has been published.
     """
 
     if not product_tags:
         return []
-    
-    full_cached_data = get_cached_json(language_code =language_code , data_type=cached_data_type)
 
-    if not full_cached_data:
-        return product_tags
-    
-    tag_list = full_cached_data.get('tags', [])
-    
-    localised_name_map = {}
-    for item in tag_list:
-        if 'id' in item and 'name' in item:
-            localised_name_map[item['id']] = item['name'] 
+    product_tags = list(product_tags)
+    localised_name_map = None
+
+    if cached_data_type in NAME_LOOKUP_FACETS:
+        localised_name_map = lookup_facet_names(cached_data_type, language_code, product_tags)
+
+    if localised_name_map is None:
+        full_cached_data = get_cached_json(language_code =language_code , data_type=cached_data_type)
+
+        if not full_cached_data:
+            return product_tags
+        
+        tag_list = full_cached_data.get('tags', [])
+        
+        localised_name_map = {}
+        for item in tag_list:
+            if 'id' in item and 'name' in item:
+                localised_name_map[item['id']] = item['name'] 
     
     localised_names = []
     
@@ -328,4 +751,4 @@ def get_localised_names( product_tags, cached_data_type, language_code ):
         
         localised_names.append(localised_name)
     
-    return localised_names
\ No newline at end of file
+    return localised_names
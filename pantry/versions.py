@@ -0,0 +1,86 @@
+import json
+import time
+import hashlib
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import translation
+from django.middleware.csrf import get_token
+from users.profile import get_user_profile
+
+# part of every pantry ETag, bump it when the pantry or favourites templates or scripts change so browsers drop their copies
+PANTRY_ETAG_VERSION = 1
+
+
+def get_pantry_version_key(user_id):
+    return f"pantry_version_{user_id}"
+
+
+def get_pantry_version(user_id):
+    """
+    Returns the current version of a user's pantry, a counter bumped whenever its contents change.
+
+    Anything derived from the pantry can be cached under this version and is
+    then simply ignored, rather than deleted, once the pantry changes.
+    """
+    cache_key = get_pantry_version_key(user_id)
+    version = cache.get(cache_key)
+
+    if version is None:
+        # seeded from the clock rather than from zero, so that a counter dropped from the cache can't repeat an old version
+        version = time.time_ns()
+        if not cache.add(cache_key, version, timeout=None):
+            version = cache.get(cache_key, version)
+    return version
+
+
+def bump_pantry_versions(user_ids):
+    """Moves the pantries of the given users on to a new version, now and again once the change is committed."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        for user_id in user_ids:
+            cache_key = get_pantry_version_key(user_id)
+            try:
+                cache.incr(cache_key)
+            except ValueError:
+                # no counter yet, the next read seeds one
+                pass
+
+    bump()
+    # bumped again once committed, in case another request cached data from before the change in the meantime
+    transaction.on_commit(bump)
+
+
+def bump_pantry_version(user_id):
+    bump_pantry_versions([user_id])
+
+
+def get_pantry_etag(request, *parts):
+    """
+    Returns a strong ETag for a page or payload built from the user's pantry and favourites,
+    or None for anonymous users. `parts` tell apart the views and queries sharing a version.
+
+    Besides the pantry's version, the tag covers everything else the response depends on:
+    the user's profile, the active language and the CSRF secret embedded in forms. It costs
+    two cache lookups and no queries, so unchanged reloads can be answered with a 304
+    before any product or conflict data is loaded.
+    """
+    if not request.user.is_authenticated:
+        return None
+
+    # a request without a CSRF cookie gets its secret here rather than while rendering, so the tag
+    # already matches the cookie set by this response and the next request can be answered with a 304
+    get_token(request)
+
+    tag_data = [
+        PANTRY_ETAG_VERSION,
+        request.user.pk,
+        get_pantry_version(request.user.pk),
+        get_user_profile(request).to_cache(),
+        translation.get_language(),
+        request.META.get('CSRF_COOKIE'),
+        *parts,
+    ]
+    return hashlib.sha1(json.dumps(tag_data, default=str).encode()).hexdigest()
@@ -1,149 +1,234 @@
 import json
 import requests 
-from decimal import Decimal 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.templatetags.static import static
-from django.views.decorators.http import require_POST
-from django.db.models import QuerySet
+from django.views.decorators.http import require_POST, require_http_methods, condition
+from django.views.decorators.cache import cache_control
+from django.core.exceptions import ValidationError
 from django.contrib.auth.decorators import login_required
 from django_ratelimit.exceptions import Ratelimited
 from django.shortcuts import render
 from pantry.forms import ProductSearchForm 
-from pantry.models import Pantry, Product, PantryItem
-from users.models import UserSettings
-from savor.utils import LANGUAGE_CODE_MAP, COUNTRY_CODE_MAP
+from pantry.models import Pantry, Product
+from users.profile import get_user_profile
+from .versions import get_pantry_etag
 from savor.utils import get_cached_json, rate_limit_error_response
+from savor.off_client import CircuitOpenError
 from .utils import (
     check_db_for_product,
-    fetch_product_by_barcode,
+    get_product_by_barcode,
     search_products_by_name,
-    save_product_to_db,
-    get_product_suggestions,
+    search_products_by_name_in_chunks,
+    get_saved_search_products,
+    suggest_ingredients,
     adv_search_product,
     build_api_search_params,
-    get_localised_names,
 )
+from .conflicts import ConflictProfile, get_product_conflicts, get_stored_conflicts, localise_conflicts
+from .pantry_index import get_pantry_index, get_pantry_item_payload
+from .pagination import get_pantry_items_page, get_favourites_page
+from .mutations import parse_pantry_operations, apply_pantry_operations, parse_quantity, add_to_pantry, remove_from_pantry
 
 
 # Create your views here.
 
+
+def get_pantry_search_query(request):
+    """Returns the pantry search query, sent either as a GET parameter or in a JSON request body."""
+    if request.method == 'GET':
+        return request.GET.get('query', '').strip()
+    return (json.loads(request.body).get('query') or '').strip()
+
+
+def get_pantry_search_etag(request):
+    # only GET searches can be answered with a 304, so POSTs aren't tagged
+    if request.method != 'GET':
+        return None
+    return get_pantry_etag(request, 'pantry_search', get_pantry_search_query(request))
+
+
+def get_product_payload(product, conflicts):
+    """Returns the JSON data the homepage needs to render a favourited product card."""
+    return {
+        'id': product.id,
+        'product_name': product.product_name,
+        'code': product.code,
+        'brands': product.brands,
+        'image_url': product.image_url,
+        'product_quantity': product.product_quantity,
+        'product_quantity_unit': product.product_quantity_unit,
+        **conflicts.as_dict(),
+    }
+
+
+def get_search_result_payload(product, conflicts, favourite_product_ids):
+    """Returns the JSON data for a product in search results."""
+    return {
+        'id': product.id,
+        'code': product.code,
+        'product_name': product.product_name,
+        'brands': product.brands,
+        'image_url': product.image_url,
+        'product_quantity': product.product_quantity,
+        'product_quantity_unit': product.product_quantity_unit,
+        'is_favourited': product.id in favourite_product_ids,
+        **conflicts.as_dict(),
+    }
+
+
+def get_search_page_info(response_data):
+    return {
+        'count': response_data.get("count", 0),
+        'page_size': response_data.get("page_size", 21),
+        'page_count': response_data.get("page", 1)
+    }
+
+
+def get_local_search_results(product_name, conflict_profile, favourite_product_ids):
+    """Returns the products in the local database matching a name, used when the OFF API can't be reached."""
+    db_results = check_db_for_product(search_term=product_name)
+    results = []
+    products_by_id = Product.objects.in_bulk([result['id'] for result in db_results])
+    conflicts = get_product_conflicts(products_by_id.values(), conflict_profile)
+    for result in db_results:
+        product_obj = products_by_id[result['id']]
+        result.update(conflicts[product_obj.id].as_dict())
+        result['is_favourited'] = product_obj.id in favourite_product_ids
+        result['product_name'] = product_obj.product_name 
+        print(f"Local DB default name: {result['product_name']}")
+                
+        results.append(result)
+    return results
+
+
+def iter_name_search_lines(request, product_name, page, conflict_profile, favourite_product_ids):
+    """
+    Yields the lines of a streamed name search as `(type, data)` pairs: each product as
+    soon as its chunk of the page has been saved and checked for conflicts, then a
+    `meta` line with the page info.
+
+    The OFF request is made once the response has started rather than before, so if
+    it fails the local database results are streamed instead, followed by their `meta` line.
+    """
+    try:
+        print(f"Calling OFF API for product name '{product_name}' page {page}, streaming results.")
+        response_data, product_chunks = search_products_by_name_in_chunks(request, product_name, page=page)
+    except (requests.exceptions.RequestException, Ratelimited) as e:
+        print(f"API call failed during name search: {e}. Streaming local db_results only.")
+        results = get_local_search_results(product_name, conflict_profile, favourite_product_ids)
+        for result in results:
+            yield 'product', {'product': result}
+        yield 'meta', {'count': len(results), 'page_size': len(results), 'page_count': 1}
+        return
+
+    for products in product_chunks:
+        conflicts = get_product_conflicts(products, conflict_profile)
+        for product in products:
+            yield 'product', {'product': get_search_result_payload(product, conflicts[product.id], favourite_product_ids)}
+    yield 'meta', get_search_page_info(response_data)
+
+
+def stream_ndjson(lines):
+    """
+    Yields `(type, data)` pairs as newline-delimited JSON, for use with a `StreamingHttpResponse`.
+
+    Each line is sent as soon as it is produced. If producing a line fails mid-stream,
+    an `error` line is sent instead, as the response status can no longer be changed.
+    """
+    try:
+        for line_type, data in lines:
+            yield json.dumps({'type': line_type, **data}, cls=DjangoJSONEncoder) + '\n'
+    except Exception as e:
+        print(f"An unexpected error occurred while streaming results: {e}")
+        yield json.dumps({'type': 'error', 'error': 'An unexpected server error occurred.'}) + '\n'
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lambda request: get_pantry_etag(request, 'index'))
 def index(request):
     """
-    Renders the homepage, processing the user's favorited products to display
-    with relevant dietary and allergen conflict warnings.
+    Renders the homepage, with the first page of the user's favourited products
+    flagged with relevant dietary and allergen conflict warnings. Further pages
+    are loaded by the page as it is scrolled, from `favourite_products`.
     """
     user = request.user
     placeholder_image_url = static('media/placeholder-img.jpeg')
     processed_favourites = []
+    next_cursor = None
 
     if user.is_authenticated:
         
-        user_settings = UserSettings.objects.get(user=user) 
-        user_allergens = user_settings.allergens.all()
-        user_dietary_requirements = user_settings.dietary_requirements.all()
-        user_allergens_tags = set(user_allergens.values_list('api_tag', flat=True))
-        user_required_tags = set(user_dietary_requirements.values_list('api_tag', flat=True))
-        user_lang_name = user_settings.language_preference
-        language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en') 
+        profile = get_user_profile(request)
+        favourites, next_cursor = get_favourites_page(user)
+        conflicts = get_stored_conflicts(favourites, user, profile.language_code, get_product=lambda favourite: favourite.product)
                     
         # flag each favorited product with conflict data before rendering.
-        for product in user.favourited_products.all():
-            
-            has_allergen_conflict = False
-            conflicting_allergens = []
-            has_dietary_mismatch = False
-            missing_dietary_tags = []
-
-            if user_settings:
-                if product.allergens.filter(pk__in=user_allergens).exists():
-                    has_allergen_conflict = True
-                    product_allergen_tags = set(product.allergens.values_list('api_tag', flat=True)) 
-                    conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-                    conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set) 
-
-                product_label_tags = set(product.labels_tags or [])
-                missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-                if missing_dietary_tags_set:
-                    has_dietary_mismatch = True
-                    missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags=missing_dietary_tags_set)
-
-            product.has_allergen_conflict = has_allergen_conflict
-            product.conflicting_allergens = conflicting_allergens
-            product.has_dietary_mismatch = has_dietary_mismatch
-            product.missing_dietary_tags = missing_dietary_tags
-            processed_favourites.append(product)
-
-        # forces .all() to return the pre-processed list instead of a query set, which lets the template display the new conflict data without needing any template code changes.
-        user.favourited_products.all = lambda: processed_favourites 
+        for favourite in favourites:
+            processed_favourites.append(conflicts[favourite.product.id].apply_to(favourite.product))
 
     return render(request, 'pantry/index.html', {
         "user": user,
         'placeholder_image_url': placeholder_image_url,
         'favourite_products_list': processed_favourites,
+        'favourites_next_cursor': next_cursor,
     })
 
 
-@require_POST
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lambda request: get_pantry_etag(request, 'favourite_products', request.GET.get('cursor')))
+def favourite_products(request):
+    """
+    Handles AJAX requests for a further page of the user's favourited products,
+    returning them as JSON with conflict data and the cursor of the next page.
+    """
+    profile = get_user_profile(request)
+
+    try:
+        favourites, next_cursor = get_favourites_page(request.user, cursor=request.GET.get('cursor'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    conflicts = get_stored_conflicts(favourites, request.user, profile.language_code, get_product=lambda favourite: favourite.product)
+
+    return JsonResponse({
+        'products': [
+            get_product_payload(favourite.product, conflicts[favourite.product.id]) for favourite in favourites
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_http_methods(['GET', 'POST'])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=get_pantry_search_etag)
 def pantry_search(request):
     """
     Handles AJAX requests to search for items within the user's pantry,
     returning a JSON list of matching items with conflict data.
+
+    Searches are answered from the pantry's in-memory index, which is only
+    rebuilt after the pantry changes. The query can be sent as a GET parameter,
+    so that repeated searches of an unchanged pantry are answered with a 304.
     """
     user = request.user
-    user_pantry =  Pantry.objects.get(user=user)
-    user_settings = UserSettings.objects.get(user=user)
-    user_allergens = user_settings.allergens.all()
-    user_dietary_requirements = user_settings.dietary_requirements.all()
-    user_allergens_tags = set(user_allergens.values_list('api_tag', flat=True))
-    user_required_tags = set(user_dietary_requirements.values_list('api_tag', flat=True))
-    user_lang_name = user_settings.language_preference
-    language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
+    profile = get_user_profile(request)
     
     try:
-        data = json.loads(request.body)
+        query = get_pantry_search_query(request)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON in request body.'}, status=400)
     
-    query = data.get('query').strip()
-    found_items = PantryItem.objects.filter( pantry=user_pantry, product__product_name__icontains=query)
+    found_entries = get_pantry_index(user).search(query)
+    conflicts = localise_conflicts(
+        {payload['product_id']: conflict_tags for payload, conflict_tags in found_entries},
+        profile.language_code,
+    )
 
     found_items_list = []
-    has_allergen_conflict = False
-    has_dietary_mismatch = False
-    conflicting_allergens = []
-    missing_dietary_tags = []
-    for item in found_items:
-
-        product_obj = item.product
-
-        if product_obj.allergens.filter(pk__in=user_allergens).exists():
-            has_allergen_conflict = True
-            product_allergen_tags = set(product_obj.allergens.values_list('api_tag', flat=True)) 
-            conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-            conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set)
-
-        product_label_tags = set(product_obj.labels_tags or [])
-
-        missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-        if missing_dietary_tags_set:
-            has_dietary_mismatch = True
-            missing_dietary_tags = get_localised_names(language_code=language_code,cached_data_type='labels', product_tags = missing_dietary_tags_set)
-
-
-        found_items_list.append({
-            'id': item.id,
-            'quantity': str(item.quantity),
-            "product_quantity": item.product.product_quantity,
-            "product_quantity_unit": item.product.product_quantity_unit,
-            'product_name': item.product.product_name,
-            'image_url': item.product.image_url,
-            'has_allergen_conflict': has_allergen_conflict,
-            "conflicting_allergens": conflicting_allergens,
-            'has_dietary_mismatch': has_dietary_mismatch,
-            "missing_dietary_tags": missing_dietary_tags
-        })
+    for payload, _ in found_entries:
+        found_items_list.append({**payload, **conflicts[payload['product_id']].as_dict()})
 
     return JsonResponse({'found_items': found_items_list})
 
@@ -158,26 +243,14 @@ def search_product(request):
     database for the product. If not found, it queries the Open Food Facts API,
     saves the new product data, and then returns the result.
     """
-    favourite_products = set()
-    user_dietary_requirements = []
-    user_allergens = []
-    language_code = 'en'
-    user_allergens_tags = set()
-    user_required_tags = set()
-    user_settings = None
-    user = request.user
+    favourite_product_ids = set()
+    profile = get_user_profile(request)
+    conflict_profile = ConflictProfile.from_profile(profile)
     scan_to_add = False
 
-    if user.is_authenticated:
-        favourite_products = set(user.favourited_products.all())
-        user_settings = UserSettings.objects.get(user=user)
-        user_lang_name = user_settings.language_preference
-        language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
-        user_allergens = user_settings.allergens.all()
-        user_dietary_requirements = user_settings.dietary_requirements.all()
-        user_allergens_tags = set(user_allergens.values_list('api_tag', flat=True))
-        user_required_tags = set(user_dietary_requirements.values_list('api_tag', flat=True))
-        scan_to_add = user_settings.scan_to_add
+    if profile is not None:
+        favourite_product_ids = profile.favourite_product_ids
+        scan_to_add = profile.scan_to_add
        
     try:
         data = json.loads(request.body)
@@ -198,33 +271,13 @@ def search_product(request):
             db_results = check_db_for_product(barcode=barcode)
             results = []
             if db_results:
+                products_by_id = Product.objects.in_bulk([result['id'] for result in db_results])
+                conflicts = get_product_conflicts(products_by_id.values(), conflict_profile)
                 for result in db_results:
                         
-                        product_obj = Product.objects.get(id=result['id'])
-                        
-                        missing_dietary_tags = [] 
-                        conflicting_allergens = []
-                        product_label_tags = set() 
-                        result['has_dietary_mismatch'] = False
-                        result['has_allergen_conflict'] = False
-
-                        if product_obj.allergens.filter(pk__in=user_allergens).exists():
-                            result['has_allergen_conflict'] = True
-                            product_allergen_tags = set(product_obj.allergens.values_list('api_tag', flat=True)) 
-                            conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-                            conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set)                               
-                            result['conflicting_allergens'] = conflicting_allergens
-                        
-                        if user_required_tags:
-                            product_label_tags = set(product_obj.labels_tags or [])
-                
-                        missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-                        if missing_dietary_tags_set:
-                            result['has_dietary_mismatch'] = True
-                            missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags=missing_dietary_tags_set )
-                            result['missing_dietary_tags'] = missing_dietary_tags
-
-                        result['is_favourited'] = product_obj in favourite_products
+                        product_obj = products_by_id[result['id']]
+                        result.update(conflicts[product_obj.id].as_dict())
+                        result['is_favourited'] = product_obj.id in favourite_product_ids
                         result['product_name'] = product_obj.product_name 
                             
                         results.append(result)
@@ -234,145 +287,52 @@ def search_product(request):
             
             ## if no db object found via barcode, fetches api results and saves the results to the db
             print(f"Calling OFF API for barcode {barcode}.")
-            response_data = fetch_product_by_barcode(request, barcode)
+            saved_product = get_product_by_barcode(request, barcode)
             
             api_products = []
-            if response_data.get('status') == 1 and response_data.get('product'):
-
-                saved_product = save_product_to_db(response_data['product'])
-
-                if saved_product:
-                    has_allergen_conflict = False
-                    has_dietary_mismatch = False
-                    conflicting_allergens = []
-                    missing_dietary_tags = []
-                    product_label_tags = set() 
-                    product_name = saved_product.product_name 
-                    is_favourited = saved_product in favourite_products
-
-                    if saved_product.allergens.filter(pk__in=user_allergens).exists():
-                        has_allergen_conflict = True
-                        product_allergen_tags = set(saved_product.allergens.values_list('api_tag', flat=True))
-                        conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-                        conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set)
-                        
-                    
-                    if user_required_tags:
-                        product_label_tags = set(saved_product.labels_tags or [])
+            if saved_product:
+                is_favourited = saved_product.id in favourite_product_ids
+                conflicts = get_product_conflicts([saved_product], conflict_profile)[saved_product.id]
                 
-                    missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-                    if missing_dietary_tags_set:
-                        has_dietary_mismatch = True
-                        missing_dietary_tags = get_localised_names(language_code=language_code,cached_data_type='labels', product_tags = missing_dietary_tags_set)
-                    
-                    api_products.append({
-                        'id': saved_product.id,
-                        'code': saved_product.code,
-                        'product_name': saved_product.product_name,
-                        'brands': saved_product.brands,
-                        'image_url': saved_product.image_url,
-                        'product_quantity': saved_product.product_quantity,
-                        'product_quantity_unit': saved_product.product_quantity_unit,
-                        'is_favourited': is_favourited,
-                        'has_allergen_conflict': has_allergen_conflict,
-                        'has_dietary_mismatch': has_dietary_mismatch,
-                        'missing_dietary_tags': missing_dietary_tags,
-                        'conflicting_allergens': conflicting_allergens,
-                    })
+                api_products.append({
+                    'id': saved_product.id,
+                    'code': saved_product.code,
+                    'product_name': saved_product.product_name,
+                    'brands': saved_product.brands,
+                    'image_url': saved_product.image_url,
+                    'product_quantity': saved_product.product_quantity,
+                    'product_quantity_unit': saved_product.product_quantity_unit,
+                    'is_favourited': is_favourited,
+                    **conflicts.as_dict(),
+                })
 
             return JsonResponse({'products': api_products, "scan_to_add": scan_to_add})
         
         # if no barcode supplied, fetches api results via product name and saves results to the db
         elif product_name:
+            # streaming mode makes the API call and saves the page within the response, sending products a chunk at a time
+            if data.get('stream'):
+                lines = iter_name_search_lines(request, product_name, page, conflict_profile, favourite_product_ids)
+                return StreamingHttpResponse(stream_ndjson(lines), content_type='application/x-ndjson')
+
             try:
                 print(f"Calling OFF API for product name '{product_name}' page {page}.")
                 response_data = search_products_by_name(request, product_name, page=page)
-                api_products = response_data.get('products', [])
-                products_found = []
-                
-                for off_prod in api_products:
-                    saved_product = save_product_to_db(off_prod)
-
-                    if saved_product:
-                        is_favourited = saved_product in favourite_products
-                        conflicting_allergens = []
-                        missing_dietary_tags = [] 
-                        product_label_tags = set() 
-                        has_dietary_mismatch = False
-                        has_allergen_conflict = False
-
-                        if saved_product.allergens.filter(pk__in=user_allergens).exists():
-                            has_allergen_conflict = True
-                            product_allergen_tags = set(saved_product.allergens.values_list('api_tag', flat=True))
-                            conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-                            conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set )
-
-                        if user_required_tags:
-                            product_label_tags = set(saved_product.labels_tags or [])
-                
-                        missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-                        if missing_dietary_tags_set:
-                            has_dietary_mismatch = True
-                            missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags=missing_dietary_tags_set )
-
-                        products_found.append({
-                            'id': saved_product.id,
-                            'code': saved_product.code,
-                            'product_name': saved_product.product_name,
-                            'brands': saved_product.brands,
-                            'image_url': saved_product.image_url,
-                            'product_quantity': saved_product.product_quantity,
-                            'product_quantity_unit': saved_product.product_quantity_unit,
-                            'is_favourited': is_favourited,
-                            'has_dietary_mismatch': has_dietary_mismatch,
-                            'has_allergen_conflict': has_allergen_conflict,
-                            'missing_dietary_tags': missing_dietary_tags,
-                            'conflicting_allergens': conflicting_allergens,
-                        })
+                saved_products = get_saved_search_products(response_data)
+                conflicts = get_product_conflicts(saved_products, conflict_profile)
 
                 return JsonResponse({
-                    'products': products_found,
-                    'count': response_data.get("count", 0),
-                    'page_size': response_data.get("page_size", 21),
-                    'page_count': response_data.get("page", 1) 
+                    'products': [
+                        get_search_result_payload(saved_product, conflicts[saved_product.id], favourite_product_ids)
+                        for saved_product in saved_products
+                    ],
+                    **get_search_page_info(response_data),
                 })
             
             ## if api call fails to fetch results via product name, falls back to local db 
             except (requests.exceptions.RequestException, Ratelimited) as e:
                 print(f"API call failed during name search: {e}. Returning local db_results only.")
-                db_results = check_db_for_product(search_term=product_name)
-                results = []
-                for result in db_results:
-                    product_obj = Product.objects.get(id=result['id'])
-                    missing_dietary_tags = [] 
-                    conflicting_allergens = []
-                    product_label_tags = set() 
-                    result['has_allergen_conflict'] = False
-                    result['has_dietary_mismatch'] = False
-
-                    if product_obj.allergens.filter(pk__in=user_allergens).exists():
-                            result['has_allergen_conflict'] = True
-                            product_allergen_tags = set(product_obj.allergens.values_list('api_tag', flat=True)) 
-                            conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-                            conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set)                               
-                            result['conflicting_allergens'] = conflicting_allergens
-
-                    if user_required_tags:
-                            product_label_tags = set(product_obj.labels_tags or [])
-                
-                    missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-                    if missing_dietary_tags_set:
-                        result['has_dietary_mismatch'] = True
-                        missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags=missing_dietary_tags_set )
-                        result['missing_dietary_tags'] = missing_dietary_tags
-
-                    result['is_favourited'] = product_obj in favourite_products
-                    result['product_name'] = product_obj.product_name 
-                    print(f"Local DB default name: {result['product_name']}")
-                            
-                    results.append(result)
+                results = get_local_search_results(product_name, conflict_profile, favourite_product_ids)
                 
                 return JsonResponse({
                     'products': results,
@@ -392,6 +352,9 @@ def search_product(request):
             return JsonResponse({'products': []}) 
         print(f"HTTP Error from OFF API: {e}")
         return JsonResponse({'error': 'Error communicating with external product database.'}, status=503)
+    except CircuitOpenError as e:
+        print(f"Skipping OFF API call: {e}")
+        return JsonResponse({'error': 'External product database is temporarily unavailable.'}, status=503)
     except requests.exceptions.RequestException as e:
         print(f"Request Error from OFF API: {e}")
         return JsonResponse({'error': 'Could not connect to external product database.'}, status=503)
@@ -408,7 +371,6 @@ def advanced_product_search(request):
     Similar to the basic search, it queries the external API. If the API call
     fails, it falls back to searching the local database with the same criteria.
     """
-    user = request.user
     try:
         data = json.loads(request.body)
         search_params = {
@@ -423,33 +385,28 @@ def advanced_product_search(request):
     except (json.JSONDecodeError, KeyError):
         return JsonResponse({'error': 'Invalid request data'}, status=400)
     
-    favourite_products = set()
-    if user.is_authenticated:
-        favourite_products = set(user.favourited_products.all())
+    profile = get_user_profile(request)
+    favourite_product_ids = profile.favourite_product_ids if profile else set()
 
     try:
         api_search_params = build_api_search_params(search_params)
         response_data = adv_search_product( request, api_search_params, page=page)
 
-        api_products = response_data.get('products', [])
         products_found = []        
 
-        for product in api_products:
-            saved_product = save_product_to_db(product)
-            if saved_product:
-                is_favourited = saved_product in favourite_products
-
-                
-                products_found.append({
-                    'id': saved_product.id,
-                    'code': saved_product.code,
-                    'product_name': saved_product.product_name,
-                    'brands': saved_product.brands,
-                    'image_url': saved_product.image_url,
-                    'product_quantity': saved_product.product_quantity,
-                    'product_quantity_unit': saved_product.product_quantity_unit,
-                    'is_favourited': is_favourited
-                })
+        for saved_product in get_saved_search_products(response_data):
+            is_favourited = saved_product.id in favourite_product_ids
+
+            products_found.append({
+                'id': saved_product.id,
+                'code': saved_product.code,
+                'product_name': saved_product.product_name,
+                'brands': saved_product.brands,
+                'image_url': saved_product.image_url,
+                'product_quantity': saved_product.product_quantity,
+                'product_quantity_unit': saved_product.product_quantity_unit,
+                'is_favourited': is_favourited
+            })
         return JsonResponse({
             'products': products_found,
             'page_count': response_data.get('page', 0),
@@ -465,7 +422,7 @@ def advanced_product_search(request):
         for result in local_results:
             try:
                 product_obj = Product.objects.get(id=result['id'])
-                result['is_favourited'] = product_obj in favourite_products
+                result['is_favourited'] = product_obj.id in favourite_product_ids
             except Product.DoesNotExist:
                 result['is_favourited'] = False
 
@@ -488,15 +445,8 @@ def populate_adv_search_criteria(request):
 
     This data is fetched from cached JSON files to avoid hitting the API on every page load.
     """
-    language_code = 'en' 
-
-    if request.user.is_authenticated:
-        try:
-            user_settings = UserSettings.objects.get(user=request.user)
-            language_name = user_settings.language_preference
-            language_code = LANGUAGE_CODE_MAP.get(language_name, 'en')
-        except UserSettings.DoesNotExist:
-            pass
+    profile = get_user_profile(request)
+    language_code = profile.language_code if profile else 'en'
 
     categories_data = get_cached_json(language_code = language_code , data_type="categories")
     brands_data = get_cached_json(language_code = language_code, data_type="brands")
@@ -528,58 +478,29 @@ def populate_adv_search_criteria(request):
     
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lambda request: get_pantry_etag(request, 'pantry_view'))
 def pantry_view(request):
     """
     Renders the user's pantry page.
 
-    It calculates aggregate scores and augments each pantry item with dietary
-    and allergen conflict information before rendering.
+    It reads the pantry's stored aggregate scores and augments the first page of
+    pantry items with dietary and allergen conflict information before rendering.
+    Further pages are loaded by the page as it is scrolled, from `pantry_items`.
     """
     pantry = Pantry.objects.get(user=request.user)
-    pantry.calculate_aggregate_scores()
-    pantryitems = PantryItem.objects.filter(pantry=pantry)
-
-    user_settings = UserSettings.objects.get(user=request.user)
-    show_nutriscore = user_settings.show_nutri_score
-    show_ecoscore = user_settings.show_eco_score
-    user_allergens = user_settings.allergens.all()
-    user_dietary_requirements = user_settings.dietary_requirements.all()
-    user_allergens_tags = set(user_allergens.values_list('api_tag', flat=True))
-    user_required_tags = set(user_dietary_requirements.values_list('api_tag', flat=True))
-    user_lang_name = user_settings.language_preference
-    language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en')
+
+    profile = get_user_profile(request)
+    show_nutriscore = profile.show_nutri_score
+    show_ecoscore = profile.show_eco_score
     
-    initial_pantry_items = PantryItem.objects.filter(pantry=pantry).select_related('product')
+    initial_pantry_items, next_cursor = get_pantry_items_page(request.user)
     placeholder_image_url = static('media/placeholder-img.jpeg')
+    conflicts = get_stored_conflicts(initial_pantry_items, request.user, profile.language_code, get_product=lambda item: item.product)
     
     pantryitems = []
     for item in initial_pantry_items:
-        product_obj = item.product 
-        
-        has_allergen_conflict = False
-        conflicting_allergens = []
-        has_dietary_mismatch = False
-        missing_dietary_tags = []
-
-        if product_obj.allergens.filter(pk__in=user_allergens).exists():
-            has_allergen_conflict = True
-            product_allergen_tags = set(product_obj.allergens.values_list('api_tag', flat=True)) 
-            conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-            conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set)
-
-        product_label_tags = set(product_obj.labels_tags or [])
-        missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-        if missing_dietary_tags_set:
-            has_dietary_mismatch = True
-            missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags = missing_dietary_tags_set)
-        
-        item.has_allergen_conflict = has_allergen_conflict
-        item.conflicting_allergens = conflicting_allergens
-        item.has_dietary_mismatch = has_dietary_mismatch
-        item.missing_dietary_tags = missing_dietary_tags
-        
-        pantryitems.append(item)
+        pantryitems.append(conflicts[item.product.id].apply_to(item))
 
     return render(request, "pantry/pantry.html", {
         "user" : request.user,
@@ -587,6 +508,30 @@ def pantry_view(request):
         "pantry_nutri_grade": pantry.aggregate_nutri_grade if show_nutriscore else None,
         "pantry_eco_grade": pantry.aggregate_eco_grade if show_ecoscore else None,
         'placeholder_image_url': placeholder_image_url,
+        'next_cursor': next_cursor,
+    })
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lambda request: get_pantry_etag(request, 'pantry_items', request.GET.get('cursor')))
+def pantry_items(request):
+    """
+    Handles AJAX requests for a further page of the user's pantry items,
+    returning them as JSON with conflict data and the cursor of the next page.
+    """
+    profile = get_user_profile(request)
+
+    try:
+        items, next_cursor = get_pantry_items_page(request.user, cursor=request.GET.get('cursor'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    conflicts = get_stored_conflicts(items, request.user, profile.language_code, get_product=lambda item: item.product)
+
+    return JsonResponse({
+        'items': [{**get_pantry_item_payload(item), **conflicts[item.product.id].as_dict()} for item in items],
+        'next_cursor': next_cursor,
     })
 
 
@@ -597,7 +542,8 @@ def add_product(request):
     Handles AJAX requests to add a product to the user's pantry.
 
     If the item already exists, its quantity is updated. Otherwise, a new
-    PantryItem is created.
+    PantryItem is created. Both happen in a single upsert, so concurrent adds
+    of the same product are never lost.
     """
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required.'}, status=401)
@@ -607,20 +553,21 @@ def add_product(request):
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON in request body.'}, status=400)
 
-    pantry = Pantry.objects.get(user=request.user)
-    product = Product.objects.get(id=data.get('product_id'))
-
-    quantity_to_add = data.get('quantityToAdd')
-
-    quantity = Decimal(str(quantity_to_add))
+    product = Product.objects.filter(id=data.get('product_id')).only('id', 'product_name', 'nutrition_score', 'ecoscore_score').first()
+    if product is None:
+        return JsonResponse({'message': 'Product not found.', 'success': False}, status=404)
 
+    quantity = parse_quantity(data.get('quantityToAdd'))
+    if quantity is None:
+        return JsonResponse({'message': 'Invalid quantity.', 'success': False}, status=400)
 
     try:
-        pantry_item, created = PantryItem.objects.get_or_create( pantry=pantry, product=product, defaults={'quantity': quantity})
-        
+        result = add_to_pantry(request.user, product, quantity)
+        if result is None:
+            return JsonResponse({'message': 'Pantry not found.', 'success': False}, status=404)
+
+        _, _, created = result
         if not created:
-            pantry_item.quantity += quantity 
-            pantry_item.save() 
             message = f"{product.product_name} quantity updated."
         else:
             message = f"{product.product_name} added to your pantry."
@@ -648,20 +595,58 @@ def remove_pantryitem(request):
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON in request body.'}, status=400)
     
-    quantity_to_remove = data.get('quantityToRemove')
-    item = PantryItem.objects.get(id = data.get('itemId'))
+    quantity_to_remove = parse_quantity(data.get('quantityToRemove'))
+    if quantity_to_remove is None:
+        return JsonResponse({'error': 'Invalid quantity.'}, status=400)
 
-    item.quantity -= Decimal(quantity_to_remove)
-    item.save()
+    result = remove_from_pantry(request.user, data.get('itemId'), quantity_to_remove)
+    if result is None:
+        return JsonResponse({'error': 'Pantry item not found.'}, status=404)
 
-    if item.quantity <= 0:
-        item.delete()
-        
-    return JsonResponse({'message' : f"{data['quantityToRemove']} of {item.product.product_name} has been removed", 'quantity_left': item.quantity})
+    product, quantity_left = result
+    return JsonResponse({'message' : f"{data['quantityToRemove']} of {product.product_name} has been removed", 'quantity_left': quantity_left})
 
     
    
 
+@require_POST
+@login_required
+def batch_pantry_update(request):
+    """
+    Handles AJAX requests to apply several add, remove or set operations to the
+    user's pantry at once, e.g. after scanning a basket of groceries.
+
+    The operations are applied in one transaction and the pantry is only
+    processed as changed once, rather than once per item.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON in request body.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+
+    try:
+        pantry = Pantry.objects.select_related('user').get(user=request.user)
+    except Pantry.DoesNotExist:
+        return JsonResponse({'error': 'Pantry not found.'}, status=404)
+
+    try:
+        operations = parse_pantry_operations(data.get('operations'))
+        quantities = apply_pantry_operations(pantry, operations)
+    except ValidationError as e:
+        return JsonResponse({'error': e.message, 'success': False}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {'product_id': product_id, 'quantity': str(quantity) if quantity is not None else None}
+            for product_id, quantity in quantities.items()
+        ],
+    })
+
+
+
 def toggle_favourite_product(request, id):
     """
     Adds or removes a product from a user's list of favourited products.
@@ -674,33 +659,10 @@ def toggle_favourite_product(request, id):
         return JsonResponse({'error': 'Authentication required.'}, status=401)
     
     product = Product.objects.get(id=id)
-    user_settings = UserSettings.objects.get(user=user)
-    user_allergens = user_settings.allergens.all()
-    user_dietary_requirements = user_settings.dietary_requirements.all()
-    user_allergens_tags = set(user_allergens.values_list('api_tag', flat=True))
-    user_required_tags = set(user_dietary_requirements.values_list('api_tag', flat=True))
-    user_lang_name = user_settings.language_preference
-    language_code = LANGUAGE_CODE_MAP.get(user_lang_name, 'en') 
-
-    has_allergen_conflict = False
-    conflicting_allergens = []
-    has_dietary_mismatch = False
-    missing_dietary_tags = []
-
-    if product.allergens.filter(pk__in=user_allergens).exists():
-        has_allergen_conflict = True
-        product_allergen_tags = set(product.allergens.values_list('api_tag', flat=True)) 
-        conflicting_allergens_set = user_allergens_tags.intersection(product_allergen_tags)
-        conflicting_allergens = get_localised_names(language_code=language_code, cached_data_type='allergens', product_tags=conflicting_allergens_set) 
-
-    product_label_tags = set(product.labels_tags or [])
-    missing_dietary_tags_set = user_required_tags.difference(product_label_tags)
-
-    if missing_dietary_tags_set:
-        has_dietary_mismatch = True
-        missing_dietary_tags = get_localised_names(language_code=language_code, cached_data_type='labels', product_tags = missing_dietary_tags_set)
-
-    if product in user.favourited_products.all():
+    profile = get_user_profile(request)
+    conflicts = get_product_conflicts([product], ConflictProfile.from_profile(profile))[product.id]
+
+    if product.id in profile.favourite_product_ids:
         user.favourited_products.remove(product)
         is_favourited = False
         message = f"'{product.product_name}' unfavourited."
@@ -709,29 +671,14 @@ def toggle_favourite_product(request, id):
         is_favourited = True
         message = f"'{product.product_name}' favourited."
 
-    if not user.favourited_products.exists():
-        favorites_exist = False
-    else:
-        favorites_exist = True
+    favorites_exist = is_favourited or bool(profile.favourite_product_ids - {product.id})
 
 
     return JsonResponse({
         'message': message,
         'is_favourited': is_favourited,
         'favourites_exist': favorites_exist,
-        'product': {
-            'id': product.id,
-            'product_name': product.product_name,
-            'code': product.code,
-            'brands': product.brands,
-            'image_url': product.image_url,
-            'product_quantity': product.product_quantity,
-            'product_quantity_unit': product.product_quantity_unit,
-            'has_dietary_mismatch': has_dietary_mismatch,
-            'missing_dietary_tags': missing_dietary_tags,
-            'conflicting_allergens': conflicting_allergens,
-            'has_allergen_conflict': has_allergen_conflict,
-        }
+        'product': get_product_payload(product, conflicts),
     })
 
 def product_suggestions(request):
@@ -746,7 +693,7 @@ def product_suggestions(request):
         if not query:
             return JsonResponse({'suggestions': []}) 
 
-        suggestions_data = get_product_suggestions(request, query)
+        suggestions_data = suggest_ingredients(request, query)
 
         return JsonResponse({'suggestions': suggestions_data})
 
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from savor.off_client import get_fixture_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve recorded Open Food Facts responses from a local HTTP server, '
+        'with optional latency and error injection. Point OFF_BASE_URL at it to use it in place of the API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures',
+            default=settings.OPENFOODFACTS_API['RECORD_DIR'],
+            help='Directory of recorded responses. Defaults to the OFF_RECORD_DIR setting.',
+        )
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on.')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Delay in milliseconds added before every response.',
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0,
+            help='Random extra delay in milliseconds, up to this value, added on top of --latency.',
+        )
+        parser.add_argument(
+            '--error-rate',
+            type=float,
+            default=0,
+            help='Fraction of requests (0 to 1) answered with --error-status instead of the recording.',
+        )
+        parser.add_argument(
+            '--error-status',
+            type=int,
+            default=503,
+            help='HTTP status returned for injected errors.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Seed for the latency and error randomness, to make runs repeatable.',
+        )
+
+    def handle(self, *args, **options):
+        fixtures_dir = options['fixtures']
+        if not fixtures_dir or not os.path.isdir(fixtures_dir):
+            raise CommandError('No fixtures directory found, pass --fixtures or set OFF_RECORD_DIR.')
+
+        fixtures = self.load_fixtures(fixtures_dir)
+        self.stdout.write(f'Loaded {len(fixtures)} recorded responses from {fixtures_dir}')
+
+        handler = build_handler(
+            fixtures,
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            rng=random.Random(options['seed']),
+            stdout=self.stdout,
+        )
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Serving on http://{options['host']}:{options['port']}, "
+            f"set OFF_BASE_URL to this address to use it. Press Ctrl+C to stop."
+        ))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    def load_fixtures(self, fixtures_dir):
+        """Reads every recorded response into memory, keyed by fixture file name."""
+        fixtures = {}
+        for file_name in os.listdir(fixtures_dir):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(fixtures_dir, file_name), encoding='utf-8') as fixture_file:
+                    fixtures[file_name] = json.load(fixture_file)
+            except (OSError, json.JSONDecodeError) as e:
+                self.stderr.write(self.style.ERROR(f'Skipping unreadable fixture {file_name}: {e}'))
+        return fixtures
+
+
+def build_handler(fixtures, latency, jitter, error_rate, error_status, rng, stdout):
+    """Returns a request handler class answering GET requests from the recorded fixtures."""
+
+    class StandinRequestHandler(BaseHTTPRequestHandler):
+        # keep connections open, as the pooled OFF client expects
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            delay = latency + (rng.uniform(0, jitter) if jitter else 0)
+            if delay:
+                time.sleep(delay)
+
+            if error_rate and rng.random() < error_rate:
+                self.send_body(error_status, 'application/json', json.dumps({'status': 0, 'error': 'injected error'}))
+                return
+
+            fixture = fixtures.get(get_fixture_name(self.path))
+            if fixture is None:
+                self.send_body(404, 'application/json', json.dumps({'status': 0, 'error': 'no recorded response'}))
+                return
+
+            self.send_body(fixture['status'], fixture['content_type'], fixture['body'])
+
+        def send_body(self, status, content_type, body):
+            encoded_body = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(encoded_body)))
+            self.end_headers()
+            self.wfile.write(encoded_body)
+
+        def log_message(self, format, *args):
+            stdout.write(f'{self.address_string()} - {format % args}')
+
+    return StandinRequestHandler
@@ -1,8 +1,8 @@
 
-from django.core.cache import cache
 from pantry.signals import schedule_recipe_generation_task 
 from django.utils import translation
 from .utils import LANGUAGE_CODE_MAP 
+from users.profile import get_user_profile
 
 class PantryRecipeMiddleware:
     """
@@ -41,9 +41,11 @@ class UserLanguageMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated and hasattr(request.user, 'settings'):
+        profile = get_user_profile(request)
 
-            user_language = request.user.settings.language_preference
+        if profile is not None:
+
+            user_language = profile.language_preference
             
             
             if user_language:
@@ -0,0 +1,423 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import lru_cache
+from urllib.parse import urlsplit, parse_qsl
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+OFF_API_BASE_URL = settings.OPENFOODFACTS_API['BASE_URL']
+OFF_USER_AGENT = settings.OPENFOODFACTS_API['USER_AGENT']
+USE_STAGING_AUTH = settings.OPENFOODFACTS_API['USE_STAGING_AUTH']
+OFF_USERNAME = settings.OPENFOODFACTS_API['USERNAME']
+OFF_PASSWORD = settings.OPENFOODFACTS_API['PASSWORD']
+OFF_TIMEOUT = settings.OPENFOODFACTS_API['TIMEOUT']
+OFF_POOL_SIZE = settings.OPENFOODFACTS_API['POOL_SIZE']
+CIRCUIT_BREAKER_CONFIG = settings.OPENFOODFACTS_API['CIRCUIT_BREAKER']
+HEDGING_CONFIG = settings.OPENFOODFACTS_API['HEDGING']
+OFF_RECORD_DIR = settings.OPENFOODFACTS_API['RECORD_DIR']
+
+
+def get_headers():
+    """
+    Constructs the necessary HTTP headers for making requests to the Open Food Facts API.
+
+    Includes the User-Agent and, if configured, Basic Authentication credentials.
+    """
+    headers = {"User-Agent": OFF_USER_AGENT}
+    if USE_STAGING_AUTH:
+        auth_string = f"{OFF_USERNAME}:{OFF_PASSWORD}".encode()
+        headers["Authorization"] = f"Basic {base64.b64encode(auth_string).decode()}"
+    return headers
+
+
+# path prefix carrying the OFF subdomain of a request sent to a base URL that has no subdomains, e.g. the stand-in server
+SUBDOMAIN_PATH_PREFIX = '/_subdomain/'
+
+
+def split_off_subdomain(url):
+    """
+    Returns the OFF subdomain a URL targets (e.g. `fr` or `world-de`) and its path without
+    any subdomain prefix. Subdomains are read from an OFF host name, or from the path
+    prefix added by `build_off_subdomain_url`, and default to `world`.
+    """
+    parts = urlsplit(url)
+    if parts.path.startswith(SUBDOMAIN_PATH_PREFIX):
+        subdomain, _, path = parts.path[len(SUBDOMAIN_PATH_PREFIX):].partition('/')
+        return subdomain, f"/{path}"
+    host_labels = parts.hostname.split('.', 1) if parts.hostname else []
+    if len(host_labels) == 2 and host_labels[1].startswith('openfoodfacts.'):
+        return host_labels[0], parts.path
+    return 'world', parts.path
+
+
+def get_fixture_name(url, params=None):
+    """
+    Returns the file name a response is recorded under, derived from the OFF subdomain,
+    URL path and query parameters but not the rest of the host, so that recordings made
+    against any OFF mirror are replayed for the same request to the stand-in server,
+    while localised and world requests are kept apart.
+    """
+    subdomain, path = split_off_subdomain(url)
+    query = parse_qsl(urlsplit(url).query, keep_blank_values=True) + [(key, value) for key, value in (params or {}).items() if value is not None]
+    normalised_query = sorted((str(key), str(value)) for key, value in query)
+    digest = hashlib.sha1(json.dumps([subdomain, path, normalised_query]).encode()).hexdigest()
+    path_label = path.strip('/').replace('/', '_') or 'root'
+    return f"{subdomain}_{path_label[:80]}_{digest[:16]}.json"
+
+
+def record_response(record_dir, url, params, response):
+    """Saves a response as a fixture in `record_dir`, for the `off_standin` command to replay."""
+    fixture = {
+        'url': url,
+        'params': {key: value for key, value in (params or {}).items() if value is not None},
+        'status': response.status_code,
+        'content_type': response.headers.get('Content-Type', 'application/json'),
+        'body': response.text,
+    }
+    os.makedirs(record_dir, exist_ok=True)
+    fixture_path = os.path.join(record_dir, get_fixture_name(url, params))
+    # write then rename, so the stand-in server never reads a half written fixture
+    temp_path = f"{fixture_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as fixture_file:
+        json.dump(fixture, fixture_file, ensure_ascii=False)
+    os.replace(temp_path, fixture_path)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling an OFF endpoint whose circuit is open.
+
+    Subclasses `ConnectionError` so that existing `RequestException` handlers
+    fall back to the local database exactly as they would for an outage.
+    """
+
+
+def get_circuit_endpoint(url):
+    """
+    Returns the key a URL's failures are counted under: its host and path,
+    without a trailing barcode so that every product lookup shares one circuit.
+    """
+    parts = urlsplit(url)
+    path = parts.path
+    prefix, _, last_segment = path.rpartition('/')
+    if any(char.isdigit() for char in last_segment):
+        path = prefix
+    return f"{parts.netloc}{path}"
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker shared by every process through the Redis cache.
+
+    Failures (connection errors, timeouts and 5xx responses) are counted per endpoint.
+    Once `failure_threshold` failures happen within `failure_window` seconds the
+    circuit opens and requests to that endpoint are rejected without being sent.
+    After `recovery_timeout` seconds the circuit is half-open: a single probe request
+    is let through, closing the circuit if it succeeds or re-opening it if it fails.
+    """
+    def __init__(self, failure_threshold, failure_window, recovery_timeout):
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+
+    def get_keys(self, endpoint):
+        return {
+            'failures': f"off_circuit_failures_{endpoint}",
+            'open': f"off_circuit_open_{endpoint}",
+            'tripped': f"off_circuit_tripped_{endpoint}",
+            'probe': f"off_circuit_probe_{endpoint}",
+        }
+
+    def before_request(self, endpoint):
+        """
+        Checks whether a request to the endpoint may be sent, raising `CircuitOpenError` if not.
+
+        Returns the circuit state read from the cache, to be passed on to `after_request`.
+        """
+        keys = self.get_keys(endpoint)
+        state = cache.get_many([keys['failures'], keys['open'], keys['tripped']])
+
+        if keys['open'] in state:
+            raise CircuitOpenError(f"Circuit open for {endpoint}, skipping request.")
+
+        if keys['tripped'] in state:
+            # half-open, only one request may probe whether the endpoint has recovered
+            if not cache.add(keys['probe'], True, timeout=self.recovery_timeout):
+                raise CircuitOpenError(f"Circuit half-open for {endpoint}, probe already in flight.")
+
+        return state
+
+    def after_request(self, endpoint, state, succeeded):
+        """Records the outcome of a request, opening or closing the circuit as needed."""
+        keys = self.get_keys(endpoint)
+
+        if succeeded:
+            # only touch the cache when there is failure state to clear
+            if state:
+                cache.delete_many([keys['failures'], keys['tripped'], keys['probe']])
+            return
+
+        if keys['tripped'] in state:
+            self.open(endpoint)
+            return
+
+        cache.add(keys['failures'], 0, timeout=self.failure_window)
+        try:
+            failures = cache.incr(keys['failures'])
+        except ValueError:
+            # the counter expired between the add and the increment
+            failures = 1
+
+        if failures >= self.failure_threshold:
+            self.open(endpoint)
+
+    def open(self, endpoint):
+        keys = self.get_keys(endpoint)
+        print(f"Opening circuit for {endpoint} for {self.recovery_timeout} seconds.")
+        cache.set(keys['open'], time.time(), timeout=self.recovery_timeout)
+        cache.set(keys['tripped'], True, timeout=None)
+        cache.delete_many([keys['failures'], keys['probe']])
+
+
+circuit_breaker = CircuitBreaker(
+    failure_threshold=CIRCUIT_BREAKER_CONFIG['FAILURE_THRESHOLD'],
+    failure_window=CIRCUIT_BREAKER_CONFIG['FAILURE_WINDOW'],
+    recovery_timeout=CIRCUIT_BREAKER_CONFIG['RECOVERY_TIMEOUT'],
+)
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent request latencies of each endpoint, per process.
+
+    Used to pick how long to wait on an endpoint before hedging, so that the
+    delay follows how each OFF mirror is actually performing.
+    """
+    def __init__(self, sample_size):
+        self.sample_size = sample_size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.sample_size)
+            samples.append(seconds)
+
+    def percentile(self, endpoint, percentile, min_samples=1):
+        """Returns the given percentile (0 to 1) of the endpoint's recent latencies, or None if too few were recorded."""
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+
+latency_tracker = LatencyTracker(sample_size=HEDGING_CONFIG['SAMPLE_SIZE'])
+
+
+class OFFClient:
+    """
+    A pooled, keep-alive HTTP client for the Open Food Facts API.
+
+    Wraps a single `requests.Session` per process so that connections to each
+    OFF host are reused between searches instead of paying a new TCP+TLS
+    handshake on every call. All requests share the same headers, bounded
+    connect/read timeouts and compressed transfer encoding, and go through the
+    shared circuit breaker so that an OFF outage fails fast.
+    """
+    def __init__(self, timeout=OFF_TIMEOUT, pool_size=OFF_POOL_SIZE, breaker=circuit_breaker, latencies=latency_tracker,
+                 record_dir=OFF_RECORD_DIR):
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.pool_size = pool_size
+        self.breaker = breaker
+        self.latencies = latencies
+        self._session = None
+        self._executor = None
+        self._executor_slots = None
+        self._pid = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update(get_headers())
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    @property
+    def session(self):
+        # sessions must not be shared across forked worker processes (gunicorn, celery prefork),
+        # so a new pool is built lazily the first time each process uses the client.
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+        return self._session
+
+    @property
+    def executor(self):
+        # threads don't survive a fork either, so each process gets its own pool for hedged requests
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='off-hedge')
+                    # one slot per worker thread, so that submitted requests never wait in the pool's queue
+                    self._executor_slots = threading.BoundedSemaphore(self.pool_size)
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def try_submit(self, url, params=None, **kwargs):
+        """
+        Sends a GET request on the hedging pool, returning its future, or None without
+        sending anything if every worker is busy (e.g. with slow requests left running
+        after losing a race), rather than queueing the request behind them.
+        """
+        executor = self.executor
+        if not self._executor_slots.acquire(blocking=False):
+            return None
+        try:
+            future = executor.submit(self.get_json, url, params, **kwargs)
+        except BaseException:
+            self._executor_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._executor_slots.release())
+        return future
+
+    def get(self, url, params=None, **kwargs):
+        """
+        Performs a GET request through the shared connection pool.
+
+        Raises `CircuitOpenError` without sending anything if the endpoint's circuit is open.
+        If a record directory is configured, the response is also saved there as a fixture.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = get_circuit_endpoint(url)
+        circuit_state = self.breaker.before_request(endpoint)
+        started_at = time.monotonic()
+
+        try:
+            response = self.session.get(url, params=params, **kwargs)
+        except requests.exceptions.RequestException:
+            self.latencies.record(endpoint, time.monotonic() - started_at)
+            self.breaker.after_request(endpoint, circuit_state, succeeded=False)
+            raise
+
+        self.latencies.record(endpoint, time.monotonic() - started_at)
+        self.breaker.after_request(endpoint, circuit_state, succeeded=response.status_code < 500)
+
+        # streamed bodies (e.g. full data exports) are too large to record
+        if self.record_dir and not kwargs.get('stream') and response.status_code < 500:
+            record_response(self.record_dir, url, params, response)
+        return response
+
+    def get_json(self, url, params=None, **kwargs):
+        """Performs a GET request, raising for HTTP errors, and returns the decoded JSON body."""
+        response = self.get(url, params=params, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_hedge_delay(self, url):
+        """
+        Returns how long to wait on a URL before hedging: the configured percentile
+        of its endpoint's recent latencies, clamped to the configured bounds.
+        """
+        delay = self.latencies.percentile(
+            get_circuit_endpoint(url), HEDGING_CONFIG['PERCENTILE'], min_samples=HEDGING_CONFIG['MIN_SAMPLES']
+        )
+        if delay is None:
+            return HEDGING_CONFIG['DEFAULT_DELAY']
+        return min(max(delay, HEDGING_CONFIG['MIN_DELAY']), HEDGING_CONFIG['MAX_DELAY'])
+
+    def get_json_hedged(self, url, hedge_url, params=None, is_usable=None, **kwargs):
+        """
+        Performs a GET request against `url`, also sending it to `hedge_url` if the
+        first hasn't returned a usable answer within its hedge delay.
+
+        The first usable JSON body is returned, where `is_usable` decides whether a body
+        is worth returning (e.g. a search with no results isn't). A failed or unusable
+        answer fires the hedge straight away. If neither answer is usable, the first
+        body received is returned, or the first error raised if both requests failed.
+
+        Requests only run on the hedging pool while it has idle workers. When it is full,
+        the request is sent unhedged on the calling thread, and a hedge that can't be
+        started is skipped, so neither ever queues behind requests already in flight.
+        """
+        if is_usable is None:
+            is_usable = lambda data: True
+
+        primary = self.try_submit(url, params, **kwargs)
+        if primary is None:
+            print(f"Hedging pool busy, sending OFF request to {url} unhedged.")
+            return self.get_json(url, params=params, **kwargs)
+
+        pending = {primary}
+        hedge_delay = self.get_hedge_delay(url)
+        hedged = False
+        fallback_data = None
+        first_error = None
+
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else hedge_delay, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    data = future.result()
+                except requests.exceptions.RequestException as e:
+                    first_error = first_error or e
+                    continue
+                if is_usable(data):
+                    # a slower request still in flight is left to finish, which keeps its latency recorded
+                    return data
+                if fallback_data is None:
+                    fallback_data = data
+
+            if not hedged:
+                hedged = True
+                hedge = self.try_submit(hedge_url, params, **kwargs)
+                if hedge is None:
+                    print(f"Hedging pool busy, not hedging OFF request to {url}.")
+                    continue
+                print(f"Hedging OFF request to {url} with {hedge_url}.")
+                pending.add(hedge)
+
+        if fallback_data is not None:
+            return fallback_data
+        raise first_error
+
+
+# per-process client shared by every Open Food Facts call site
+off_client = OFFClient()
+
+
+@lru_cache(maxsize=128)
+def build_off_subdomain_url(subdomain, base_url=OFF_API_BASE_URL):
+    """
+    Swaps the `world` subdomain of the configured base URL for the given one. A base URL
+    without one, such as the stand-in server's, gets the subdomain as a path prefix instead.
+    """
+    parts = urlsplit(base_url)
+    host_labels = parts.netloc.split('.', 1)
+
+    if len(host_labels) != 2 or host_labels[0] != 'world':
+        if subdomain == 'world':
+            return base_url
+        return f"{base_url.rstrip('/')}{SUBDOMAIN_PATH_PREFIX}{subdomain}"
+
+    return f"{parts.scheme}://{subdomain}.{host_labels[1]}"
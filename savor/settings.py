@@ -210,11 +210,54 @@ LOGIN_URL = 'login'
 # config for interacting with the Open Food Facts API.
 OPENFOODFACTS_API = {
     # world.openfoodfacts.net : staging environment, world.openfoodfacts.org : production enviornment
-     'BASE_URL': "https://world.openfoodfacts.net", # base URL for the OFF API 
+     # point at a local `off_standin` server (e.g. http://127.0.0.1:8765) to replay recorded responses instead
+     'BASE_URL': env('OFF_BASE_URL', default="https://world.openfoodfacts.net"), # base URL for the OFF API 
      'USERNAME': "off", # username for API authentication.
      'PASSWORD': "off", # password for API authentication. 
      'USER_AGENT': "Savor/1.0 (mnm.fullmetal@gmail.com)", # user-agent header for API requests, identifying the app
      'USE_STAGING_AUTH': True,  # flag to use staging authentication credentials
+     'TIMEOUT': (3.05, 10), # (connect, read) timeouts in seconds for every API request
+     'POOL_SIZE': 10, # keep-alive connections held open per OFF host, per process
+     'SUGGESTIONS_FALLBACK': True, # query the OFF taxonomy suggestions API when no local ingredient index is loaded
+     'RECORD_DIR': env('OFF_RECORD_DIR', default=None), # when set, every OFF response is also saved there as a fixture for `off_standin`
+     'PREFETCH_NEXT_PAGE': True, # fetch and save the next page of search results in the background after serving a page
+     'SEARCH_STREAM_CHUNK_SIZE': 3, # products saved, checked for conflicts and sent at a time when a name search is streamed
+     # requests to an endpoint are skipped for RECOVERY_TIMEOUT seconds once FAILURE_THRESHOLD requests fail within FAILURE_WINDOW seconds
+     'CIRCUIT_BREAKER': {
+         'FAILURE_THRESHOLD': 5,
+         'FAILURE_WINDOW': 60,
+         'RECOVERY_TIMEOUT': 30,
+     },
+     # when a localised endpoint hasn't answered within PERCENTILE of its recent latencies (clamped to MIN_DELAY..MAX_DELAY
+     # seconds, DEFAULT_DELAY until MIN_SAMPLES are recorded), the same search is also sent to the world endpoint
+     'HEDGING': {
+         'ENABLED': True,
+         'PERCENTILE': 0.9,
+         'MIN_DELAY': 0.2,
+         'MAX_DELAY': 2.0,
+         'DEFAULT_DELAY': 0.75,
+         'SAMPLE_SIZE': 100,
+         'MIN_SAMPLES': 10,
+     },
+}
+
+# lifetimes (in seconds) of cached Open Food Facts responses
+OPENFOODFACTS_CACHE = {
+    'BARCODE_HIT_TTL': 60 * 60 * 24, # barcode lookups that found a product
+    'BARCODE_MISS_TTL': 60 * 60, # barcode lookups unknown to OFF, kept shorter so newly added products show up
+    'SEARCH_FRESH_TTL': 60 * 15, # search results served without a refresh
+    'SEARCH_STALE_TTL': 60 * 60 * 24, # search results served while a background refresh runs
+    'SEARCH_REFRESH_LOCK_TTL': 60, # stops a stale search from being queued for refresh more than once
+    'COALESCE_LOCK_TTL': 15, # lock held by the request performing a coalesced upstream lookup
+    'COALESCE_WAIT': 5, # how long concurrent identical requests wait on that lookup's result
+    'COALESCE_RESULT_TTL': 10, # how long the shared result is kept for requests that were waiting on it
+}
+
+# controls the background refresh of locally saved products
+PRODUCT_REFRESH = {
+    'MAX_AGE': timedelta(days=7), # products last updated longer ago than this are refreshed
+    'BATCH_SIZE': 50, # products fetched per API request
+    'MAX_PER_RUN': 1000, # products queued for refresh each time the task runs
 }
 
 # configures redis as the main caching backend for django
@@ -253,4 +296,12 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'savor.tasks.update_facet_data',
         'schedule': timedelta(days=5), # Runs every 5 days to refresh cached Open Food Facts facet data.
     },
+    'update-ingredient-taxonomy': {
+        'task': 'savor.tasks.update_ingredient_taxonomy',
+        'schedule': timedelta(days=5), # Runs every 5 days to rebuild the local autocomplete indexes.
+    },
+    'refresh-stale-products': {
+        'task': 'pantry.tasks.refresh_stale_products',
+        'schedule': timedelta(hours=1), # Runs every hour to keep the most used products up to date.
+    },
 }
\ No newline at end of file
@@ -1,9 +1,12 @@
+import time
 from celery import shared_task
 from datetime import timedelta
 from django.core.cache import cache
 from django.db.utils import IntegrityError
 from users.models import Allergen, DietaryRequirement
+from pantry.taxonomy import build_ingredient_index_data, get_ingredient_index_cache_key, get_ingredient_index_version_key
 from .utils import fetch_single_facet_json_data, get_supported_language_codes, fetch_single_localised_facet_json_data
+from .utils import publish_facet_names, NAME_LOOKUP_FACETS
 
 @shared_task
 def update_facet_data():
@@ -28,9 +31,9 @@ def fetch_and_process_facet_data(facet_name):
     Fetches a single facet's data (e.g., 'allergens') from the Open Food Facts API
     in English and caches it.
 
-    For 'allergens' and 'labels' facets, it also populates or updates the
-    corresponding Django models (`Allergen`, `DietaryRequirement`) to enable
-    database-driven lookups and relationships.
+    For 'allergens' and 'labels' facets, it also publishes their compiled name
+    lookup tables and populates or updates the corresponding Django models
+    (`Allergen`, `DietaryRequirement`) to enable database-driven lookups and relationships.
     The `rate_limit` is applied to respect API usage policies.
     """
     facet_data = fetch_single_facet_json_data(facet_name=facet_name)
@@ -40,6 +43,9 @@ def fetch_and_process_facet_data(facet_name):
         facet_data['tags'] = filtered_tags
 
     cache.set(f"off_{facet_name}_cache_en", facet_data, timeout=None)
+
+    if facet_name in NAME_LOOKUP_FACETS:
+        publish_facet_names(facet_name, 'en', facet_data)
     
     relevant_dietary_tags = [
         'en:halal', 'en:kosher', 'en:no-lactose', 'en:vegan', 
@@ -88,5 +94,38 @@ def fetch_and_cache_localised_facet_data(language_code, facet):
 
     cache.set(f"off_{facet}_cache_{language_code}", facet_data, timeout=None)
 
+    if facet in NAME_LOOKUP_FACETS:
+        publish_facet_names(facet, language_code, facet_data)
 
-    
+
+@shared_task
+def update_ingredient_taxonomy():
+    """
+    Orchestrates the periodic download of the ingredients taxonomy in every
+    supported language, used to answer product name autocomplete locally.
+    """
+    for language_code in get_supported_language_codes():
+        fetch_and_index_ingredient_taxonomy.delay(language_code)
+
+
+@shared_task(rate_limit='2/m')
+def fetch_and_index_ingredient_taxonomy(language_code):
+    """
+    Fetches the ingredients facet for a language, compiles it into a sorted
+    prefix index and publishes it to the cache under a new version stamp.
+
+    Web processes notice the new version and reload their in-memory copy.
+    """
+    if language_code == 'en':
+        facet_data = fetch_single_facet_json_data(facet_name='ingredients')
+    else:
+        facet_data = fetch_single_localised_facet_json_data(language_code, 'ingredients')
+
+    index_data = build_ingredient_index_data(facet_data)
+
+    if not index_data['keys']:
+        print(f"No ingredient taxonomy data received for '{language_code}', keeping the existing index.")
+        return
+
+    cache.set(get_ingredient_index_cache_key(language_code), index_data, timeout=None)
+    cache.set(get_ingredient_index_version_key(language_code), time.time(), timeout=None)
@@ -0,0 +1,51 @@
+import io
+import json
+import random
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+import requests
+from django.test import SimpleTestCase
+from savor.off_client import record_response, build_off_subdomain_url
+from savor.management.commands.off_standin import Command as StandinCommand, build_handler
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status_code = 200
+        self.headers = {'Content-Type': 'application/json'}
+        self.text = json.dumps(body)
+
+
+class OFFReplayTests(SimpleTestCase):
+    """Records localised and world OFF responses, then replays them from the stand-in server."""
+
+    def setUp(self):
+        fixtures_dir = tempfile.mkdtemp()
+        params = {'search_terms': 'milk', 'page': 1}
+        record_response(fixtures_dir, 'https://fr.openfoodfacts.net/cgi/search.pl', params, FakeResponse({'products': ['lait']}))
+        record_response(fixtures_dir, 'https://world.openfoodfacts.net/cgi/search.pl', params, FakeResponse({'products': ['milk']}))
+
+        fixtures = StandinCommand().load_fixtures(fixtures_dir)
+        handler = build_handler(fixtures, latency=0, jitter=0, error_rate=0, error_status=503, rng=random.Random(0), stdout=io.StringIO())
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.params = params
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, url):
+        return requests.get(f"{url}/cgi/search.pl", params=self.params, timeout=5)
+
+    def test_localised_and_world_requests_replay_their_own_recordings(self):
+        localised = self.get(build_off_subdomain_url('fr', self.base_url))
+        world = self.get(build_off_subdomain_url('world', self.base_url))
+
+        self.assertEqual(localised.json(), {'products': ['lait']})
+        self.assertEqual(world.json(), {'products': ['milk']})
+
+    def test_unrecorded_subdomain_is_not_found(self):
+        self.assertEqual(self.get(build_off_subdomain_url('de', self.base_url)).status_code, 404)
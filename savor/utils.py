@@ -1,8 +1,10 @@
-import requests
-import base64
+import time
+from functools import lru_cache
 from django.conf import settings
 from django.core.cache import cache
 from django.http import JsonResponse
+from django_redis import get_redis_connection
+from .off_client import off_client, build_off_subdomain_url
 
 # maps open food facts language tag ids to language codes, used for djangos internationalisation and for localised API requests
 LANGUAGE_CODE_MAP = {
@@ -136,10 +138,14 @@ COUNTRY_CODE_MAP = {
 }
 
 OFF_API_BASE_URL = settings.OPENFOODFACTS_API['BASE_URL']
-OFF_USER_AGENT = settings.OPENFOODFACTS_API['USER_AGENT']
-USE_STAGING_AUTH = settings.OPENFOODFACTS_API['USE_STAGING_AUTH']
-OFF_USERNAME = settings.OPENFOODFACTS_API['USERNAME']
-OFF_PASSWORD = settings.OPENFOODFACTS_API['PASSWORD']
+COALESCE_LOCK_TTL = settings.OPENFOODFACTS_CACHE['COALESCE_LOCK_TTL']
+COALESCE_WAIT = settings.OPENFOODFACTS_CACHE['COALESCE_WAIT']
+COALESCE_RESULT_TTL = settings.OPENFOODFACTS_CACHE['COALESCE_RESULT_TTL']
+
+# facets whose tags are translated one by one (e.g. a product's allergens), published as compiled name lookup tables
+NAME_LOOKUP_FACETS = ['allergens', 'labels']
+# how often (in seconds) each process checks whether a newer name lookup table has been published
+NAME_LOOKUP_VERSION_CHECK_INTERVAL = 60
 
 def rate_limit_error_response(request, exception):
     """
@@ -156,17 +162,28 @@ def rate_limit_error_response(request, exception):
         status=429
     )
 
-def get_headers():
+
+@lru_cache(maxsize=512)
+def resolve_off_base_url(country=None, language_preference=None, prioritise_local_results=False):
     """
-    Constructs the necessary HTTP headers for making requests to the Open Food Facts API.
+    Maps a user's localisation settings to the Open Food Facts base URL to query.
 
-    Includes the User-Agent and, if configured, Basic Authentication credentials.
+    Localised endpoints follow the `{country}-{language}` subdomain convention of the
+    configured base URL (e.g. `https://fr-de.openfoodfacts.net`). If the base URL
+    isn't a `world.` host, such as the stand-in server's, the subdomain is sent as a
+    path prefix instead (see `build_off_subdomain_url`).
     """
-    headers = {"User-Agent": OFF_USER_AGENT}
-    if USE_STAGING_AUTH:
-        auth_string = f"{OFF_USERNAME}:{OFF_PASSWORD}".encode()
-        headers["Authorization"] = f"Basic {base64.b64encode(auth_string).decode()}"
-    return headers
+    if not prioritise_local_results:
+        return OFF_API_BASE_URL
+
+    country_code = COUNTRY_CODE_MAP.get(country, 'world')
+    language_code = LANGUAGE_CODE_MAP.get(language_preference, 'en')
+
+    subdomain = country_code
+    if language_code != 'en':
+        subdomain = f"{country_code}-{language_code}"
+
+    return build_off_subdomain_url(subdomain)
 
 
 def fetch_single_facet_json_data( facet_name):
@@ -176,11 +193,10 @@ def fetch_single_facet_json_data( facet_name):
     """
 
     api_url = f'{OFF_API_BASE_URL}/facets/{facet_name}.json'
-    headers = get_headers()
     response_data = {}
 
     try:
-        response = requests.get(api_url, headers=headers)
+        response = off_client.get(api_url)
         print(f'response from world {facet_name} endpoint: {response}')
         response.raise_for_status()
         response_data = response.json()
@@ -197,12 +213,11 @@ def fetch_single_localised_facet_json_data(language_code, facet):
     Open Food Facts API. Used by Celery tasks to populate the cache with translations.
     """
 
-    api_url = f"https://world-{language_code}.openfoodfacts.net/facets/{facet}.json"
-    headers= get_headers()
+    api_url = f"{build_off_subdomain_url(f'world-{language_code}')}/facets/{facet}.json"
     response_data = {}
     
     try:
-        response = requests.get(api_url, headers=headers)
+        response = off_client.get(api_url)
         print(f'response from localised {facet} endpoint: {response}')
         response.raise_for_status()
         response_data = response.json()
@@ -213,11 +228,153 @@ def fetch_single_localised_facet_json_data(language_code, facet):
     return response_data
 
 
+def acquire_single_flight(key, lock_timeout=COALESCE_LOCK_TTL):
+    """
+    Takes the lock `single_flight` callers wait on, for a caller that produces the value
+    itself, e.g. a bit at a time, rather than through a function. Returns True if the
+    lock was taken, in which case the caller must call `release_single_flight`.
+    """
+    return cache.add(f"single_flight_lock_{key}", True, timeout=lock_timeout)
+
+
+def release_single_flight(key, value=None, publish=False, result_timeout=COALESCE_RESULT_TTL):
+    """Releases a lock taken by `acquire_single_flight`, publishing `value` to waiting callers if `publish` is set."""
+    if publish:
+        # results are wrapped so that a None return value can be told apart from a missing key
+        cache.set(f"single_flight_result_{key}", {'value': value}, timeout=result_timeout)
+    cache.delete(f"single_flight_lock_{key}")
+
+
+def single_flight(key, func, lock_timeout=COALESCE_LOCK_TTL, wait_timeout=COALESCE_WAIT, result_timeout=COALESCE_RESULT_TTL):
+    """
+    Runs `func` once across all workers for concurrent calls that share the same key.
+
+    The first caller takes a Redis lock, runs `func` and publishes its return value
+    under a result key. Concurrent callers wait for that result instead of repeating
+    the work. If the first caller fails, or doesn't finish within `wait_timeout`
+    seconds, waiting callers run `func` themselves.
+    """
+    lock_key = f"single_flight_lock_{key}"
+    result_key = f"single_flight_result_{key}"
+
+    shared_result = cache.get(result_key)
+    if shared_result is not None:
+        return shared_result['value']
+
+    if acquire_single_flight(key, lock_timeout=lock_timeout):
+        value = None
+        succeeded = False
+        try:
+            value = func()
+            succeeded = True
+            return value
+        finally:
+            release_single_flight(key, value, publish=succeeded, result_timeout=result_timeout)
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        shared_result = cache.get(result_key)
+        if shared_result is not None:
+            return shared_result['value']
+        # the lock was released without a result, so the first caller failed
+        if cache.get(lock_key) is None:
+            break
+
+    return func()
+
+
 def get_cached_json(language_code , data_type):
     """A helper function to retrieve facet data from the Redis cache."""
     return cache.get(f"off_{data_type}_cache_{language_code }")
 
 
+def get_facet_names_key(facet, language_code):
+    return cache.make_key(f"off_{facet}_names_{language_code}")
+
+
+def get_facet_names_version_key(facet, language_code):
+    return cache.make_key(f"off_{facet}_names_version_{language_code}")
+
+
+def publish_facet_names(facet, language_code, facet_data):
+    """
+    Compiles a facet's tags into a Redis hash of tag id to localised name, so that
+    names can be looked up individually instead of loading the whole facet.
+
+    The new table is built under a staging key and renamed into place, then a new
+    version stamp is set so that processes drop their memoised names.
+    """
+    names = {tag['id']: tag['name'] for tag in facet_data.get('tags', []) if tag.get('id') and tag.get('name')}
+    if not names:
+        print(f"No {facet} names received for '{language_code}', keeping the existing lookup table.")
+        return
+
+    names_key = get_facet_names_key(facet, language_code)
+    staging_key = f"{names_key}_staging"
+
+    pipeline = get_redis_connection('default').pipeline()
+    pipeline.delete(staging_key)
+    pipeline.hset(staging_key, mapping=names)
+    pipeline.rename(staging_key, names_key)
+    pipeline.set(get_facet_names_version_key(facet, language_code), time.time())
+    pipeline.execute()
+
+
+# per-process names already looked up, keyed by (facet, language code), along with their version stamp
+_memoised_facet_names = {}
+
+
+def lookup_facet_names(facet, language_code, tags):
+    """
+    Returns a dict of localised names for the given tag ids of a facet, leaving out unknown tags,
+    or None if no lookup table has been published for the facet and language.
+
+    Names already looked up by this process are answered from memory while the published
+    version is unchanged, the version itself being checked at most once every
+    `NAME_LOOKUP_VERSION_CHECK_INTERVAL` seconds. Otherwise the version and the requested
+    names are fetched together in a single round trip.
+    """
+    tags = list(tags)
+    memo = _memoised_facet_names.get((facet, language_code))
+    now = time.monotonic()
+
+    if (
+        memo is not None
+        and now - memo['checked_at'] < NAME_LOOKUP_VERSION_CHECK_INTERVAL
+        and all(tag in memo['names'] for tag in tags)
+    ):
+        return {tag: memo['names'][tag] for tag in tags if memo['names'][tag]}
+
+    try:
+        redis = get_redis_connection('default')
+    except NotImplementedError:
+        # the cache isn't backed by Redis, e.g. a local memory cache in development
+        return None
+
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.get(get_facet_names_version_key(facet, language_code))
+    if tags:
+        pipeline.hmget(get_facet_names_key(facet, language_code), tags)
+    results = pipeline.execute()
+
+    version = results[0]
+    if version is None:
+        return None
+
+    if memo is None or memo['version'] != version:
+        memo = {'version': version, 'names': {}}
+        _memoised_facet_names[(facet, language_code)] = memo
+    memo['checked_at'] = now
+
+    if tags:
+        # unknown tags are remembered too, so they aren't looked up again
+        for tag, name in zip(tags, results[1]):
+            memo['names'][tag] = name.decode() if name else None
+
+    return {tag: memo['names'][tag] for tag in tags if memo['names'][tag]}
+
+
 def get_supported_language_codes():
     """Returns a list of all supported two-letter language codes."""
     return list(LANGUAGE_CODE_MAP.values())
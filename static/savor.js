@@ -194,6 +194,17 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   });
 
+  // load further pages of favourites as the end of the row is scrolled into view
+  const favouritesSentinel = document.getElementById("favouritesSentinel");
+  if (favouritesSentinel) {
+    favouritesObserver = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) {
+        loadFavourites(csrfToken);
+      }
+    }, { root: favouritesSentinel.closest(".horizontal-scroll-container"), rootMargin: "0px 600px 0px 0px" });
+    favouritesObserver.observe(favouritesSentinel);
+  }
+
   const advModalElement = document.getElementById('exampleModal');
   let advModalInstance;
   if (advModalElement) {
@@ -326,8 +337,11 @@ function searchProduct(barcode = "None", productName = "None", csrfToken, wasSca
     barcode: barcode,
     product_name: productName,
     page: page,
-    wasScanned: wasScanned
+    wasScanned: wasScanned,
+    // name searches are streamed so that results render as soon as each product is ready
+    stream: !barcode
   };
+  const repeatSearch = (params, token) => searchProduct(params.barcode, params.productName, token, wasScanned, params.page);
 
   fetch("/product/search/", {
     method: "POST",
@@ -337,8 +351,18 @@ function searchProduct(barcode = "None", productName = "None", csrfToken, wasSca
     },
     body: JSON.stringify(requestData),
   })
-  .then((response) => response.json())
+  .then((response) => {
+    const contentType = response.headers.get("Content-Type") || "";
+    if (contentType.startsWith("application/x-ndjson")) {
+      return displayStreamedSearchResults(response, searchedProductsDiv, csrfToken, {barcode, productName}, repeatSearch).then(() => null);
+    }
+    return response.json();
+  })
   .then((data) => {
+    // streamed results have already been rendered
+    if (data === null) {
+      return;
+    }
     console.log("Response from Django API:", data);
     if (data.error || data.errors) {
       const errorMessage = data.error || JSON.parse(data.errors);
@@ -348,7 +372,7 @@ function searchProduct(barcode = "None", productName = "None", csrfToken, wasSca
        ${gettext('Error')}: ${data.error || gettext("Invalid input.")}
        </div>`;
     } else  {
-      displaySearchResults(searchedProductsDiv, data, csrfToken, {barcode, productName}, (params, token) => searchProduct(params.barcode, params.productName, token, wasScanned, params.page));
+      displaySearchResults(searchedProductsDiv, data, csrfToken, {barcode, productName}, repeatSearch);
 
       // if scan-to-add enabled and wasScanned true, automatically add the product to pantry.
       if(data.scan_to_add === true && data.products.length > 0 && wasScanned === true){
@@ -408,109 +432,168 @@ function advProductSearch(searchRequestData, csrfToken){
 function displaySearchResults(container, data, csrfToken, searchParams, searchFunction) {
   if (data.products && data.products.length > 0) {
     container.innerHTML = "";
-    data.products.forEach((product) => {
-      const productColumnDiv = document.createElement("div");
-      productColumnDiv.classList.add("col-12", "col-sm-6", "col-md-4", "col-lg-4", "mb-4");
-      const hasAllergenConflict = product.has_allergen_conflict;
-      const hasDietaryMismatch = product.has_dietary_mismatch;
-      const missingTags = product.missing_dietary_tags || [];
-      const conflictingTags = product.conflicting_allergens || []; 
-      let safetyAlertsHtml = '';
-      let cardClasses = "card h-100 border-0 shadow";
-
-      // add alerts based on user's dietary preferences and allergens.
-      if (hasAllergenConflict) {
-        const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        cardClasses = "card h-100 shadow border-danger border-3"; 
-        safetyAlertsHtml += `
-        <div class="alert alert-danger p-1 mb-2 small" role="alert">
-        <strong> <i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')} : </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
-        </div>`;
+    data.products.forEach((product) => appendProductCard(container, product, csrfToken));
+    displayPagination(container, data, csrfToken, searchParams, searchFunction);
+  } else {
+    displayNoResults(container);
+  }
+}
+
+
+// reads a newline-delimited JSON search response, rendering each product card as soon as its line arrives.
+// the stream ends with a "meta" line holding the page info used for pagination.
+async function displayStreamedSearchResults(response, container, csrfToken, searchParams, searchFunction) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let productCount = 0;
+
+  const handleRecord = (record) => {
+    if (record.type === "product") {
+      if (productCount === 0) {
+        container.innerHTML = "";
       }
-    
-      if (hasDietaryMismatch) {
-        const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        safetyAlertsHtml += `
-        <div class="alert alert-warning p-1 mb-2 small" role="alert">
-        <strong> <i class="bi bi-question-circle"></i> ${gettext('POSSIBLE MISMATCH')} : </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
-        </div>`;
+      appendProductCard(container, record.product, csrfToken);
+      productCount++;
+    } else if (record.type === "meta") {
+      if (productCount > 0) {
+        displayPagination(container, record, csrfToken, searchParams, searchFunction);
+      } else {
+        displayNoResults(container);
       }
+    } else if (record.type === "error") {
+      container.innerHTML = `
+      <div class="alert alert-danger text-center mt-3" role="alert">
+       ${gettext('Error')}: ${record.error}
+       </div>`;
+    }
+  };
 
-      const productCard = document.createElement("div");
-      productCard.classList.add(...cardClasses.split(' '));
-      const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
-      const imageUrl = product.image_url || placeholderImageUrl;
-
-      productCard.innerHTML = `
-          <img src="${imageUrl}" 
-             alt="${product.product_name || gettext("Product Image")}" 
-             class="card-img-top img-fluid rounded-top" 
-             style="max-height: 150px; object-fit: cover;"
-             onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
-          <div class="card-body d-flex flex-column justify-content-between">
-            <h3 class="card-title h5 mb-2 text-dark">${
-              product.product_name || gettext("No Name")
-            }</h3>
-            <div>
-            <p class="card-text text-muted mb-1 small"><strong>${gettext('Brands')}:</strong> ${
-              product.brands || "N/A"
-            }</p>
-            <p class="card-text text-muted mb-3 small"><strong>${gettext('Code')}:</strong> ${
-              product.code || "N/A"
-            }</p>
-            </div>
-            <div>
-             ${safetyAlertsHtml} 
-             </div>
-            <div class="d-flex align-items-center mb-3">
-              <input class="product-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1">
-              <span class="text-secondary me-1">${
-                product.product_quantity || ""
-              }</span>
-              <span class="text-muted small">${
-                product.product_quantity_unit || gettext("item")
-              }</span>
-            </div>
-
-            <div class="mt-1 d-flex flex-column">
-              <button class="btn btn-outline-primary btn-sm mb-2 add-btn" 
-                      data-product-name="${
-                        product.product_name || gettext("No Name")
-                      }" 
-                      data-product-id="${product.id}">
-                ${gettext('Add to Pantry')}
-              </button>
-              <button class="btn btn-sm favourite-btn ${
-                product.is_favourited
-                  ? "btn-outline-danger"
-                  : "btn-outline-primary"
-              }" data-product-id="${product.id}">
-                ${product.is_favourited ? gettext("Remove Favourite") : gettext("Favourite")}
-              </button>
-            </div>
-          </div>`;
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    // keep any partial line until the rest of it arrives
+    buffer = lines.pop();
+    lines.filter((line) => line.trim()).forEach((line) => handleRecord(JSON.parse(line)));
+  }
 
-      productColumnDiv.appendChild(productCard);
-      container.appendChild(productColumnDiv);
+  if (buffer.trim()) {
+    handleRecord(JSON.parse(buffer));
+  }
+}
 
-      const favouriteButton = productCard.querySelector(".favourite-btn");
-      favouriteButton.addEventListener("click", (event) => {
-        const clickedButton = event.target;
-        const productIdToFav = clickedButton.dataset.productId;
-        favouriteProduct(productIdToFav, csrfToken, clickedButton);
-      });
 
-      const addButton = productCard.querySelector(".add-btn");
-      addButton.addEventListener("click", (event) => {
-        const clickedButton = event.target;
-        const productIdToAdd = clickedButton.dataset.productId;
-        const quantityInput = productCard.querySelector(
-          ".product-quantity-input"
-        ).value;
-        addProduct(productIdToAdd, quantityInput, csrfToken, productCard);
-      });
-    });
+// renders a single search result as a product card at the end of the results container
+function appendProductCard(container, product, csrfToken) {
+  const productColumnDiv = document.createElement("div");
+  productColumnDiv.classList.add("col-12", "col-sm-6", "col-md-4", "col-lg-4", "mb-4");
+  const hasAllergenConflict = product.has_allergen_conflict;
+  const hasDietaryMismatch = product.has_dietary_mismatch;
+  const missingTags = product.missing_dietary_tags || [];
+  const conflictingTags = product.conflicting_allergens || []; 
+  let safetyAlertsHtml = '';
+  let cardClasses = "card h-100 border-0 shadow";
+
+  // add alerts based on user's dietary preferences and allergens.
+  if (hasAllergenConflict) {
+    const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+    cardClasses = "card h-100 shadow border-danger border-3"; 
+    safetyAlertsHtml += `
+    <div class="alert alert-danger p-1 mb-2 small" role="alert">
+    <strong> <i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')} : </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
+    </div>`;
+  }
+
+  if (hasDietaryMismatch) {
+    const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+    safetyAlertsHtml += `
+    <div class="alert alert-warning p-1 mb-2 small" role="alert">
+    <strong> <i class="bi bi-question-circle"></i> ${gettext('POSSIBLE MISMATCH')} : </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
+    </div>`;
+  }
+
+  const productCard = document.createElement("div");
+  productCard.classList.add(...cardClasses.split(' '));
+  const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
+  const imageUrl = product.image_url || placeholderImageUrl;
 
+  productCard.innerHTML = `
+      <img src="${imageUrl}" 
+         alt="${product.product_name || gettext("Product Image")}" 
+         class="card-img-top img-fluid rounded-top" 
+         style="max-height: 150px; object-fit: cover;"
+         onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
+      <div class="card-body d-flex flex-column justify-content-between">
+        <h3 class="card-title h5 mb-2 text-dark">${
+          product.product_name || gettext("No Name")
+        }</h3>
+        <div>
+        <p class="card-text text-muted mb-1 small"><strong>${gettext('Brands')}:</strong> ${
+          product.brands || "N/A"
+        }</p>
+        <p class="card-text text-muted mb-3 small"><strong>${gettext('Code')}:</strong> ${
+          product.code || "N/A"
+        }</p>
+        </div>
+        <div>
+         ${safetyAlertsHtml} 
+         </div>
+        <div class="d-flex align-items-center mb-3">
+          <input class="product-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1">
+          <span class="text-secondary me-1">${
+            product.product_quantity || ""
+          }</span>
+          <span class="text-muted small">${
+            product.product_quantity_unit || gettext("item")
+          }</span>
+        </div>
+
+        <div class="mt-1 d-flex flex-column">
+          <button class="btn btn-outline-primary btn-sm mb-2 add-btn" 
+                  data-product-name="${
+                    product.product_name || gettext("No Name")
+                  }" 
+                  data-product-id="${product.id}">
+            ${gettext('Add to Pantry')}
+          </button>
+          <button class="btn btn-sm favourite-btn ${
+            product.is_favourited
+              ? "btn-outline-danger"
+              : "btn-outline-primary"
+          }" data-product-id="${product.id}">
+            ${product.is_favourited ? gettext("Remove Favourite") : gettext("Favourite")}
+          </button>
+        </div>
+      </div>`;
+
+  productColumnDiv.appendChild(productCard);
+  container.appendChild(productColumnDiv);
+
+  const favouriteButton = productCard.querySelector(".favourite-btn");
+  favouriteButton.addEventListener("click", (event) => {
+    const clickedButton = event.target;
+    const productIdToFav = clickedButton.dataset.productId;
+    favouriteProduct(productIdToFav, csrfToken, clickedButton);
+  });
+
+  const addButton = productCard.querySelector(".add-btn");
+  addButton.addEventListener("click", (event) => {
+    const clickedButton = event.target;
+    const productIdToAdd = clickedButton.dataset.productId;
+    const quantityInput = productCard.querySelector(
+      ".product-quantity-input"
+    ).value;
+    addProduct(productIdToAdd, quantityInput, csrfToken, productCard);
+  });
+}
+
+
+// renders the pagination bar for a page of search results
+function displayPagination(container, data, csrfToken, searchParams, searchFunction) {
   const totalCount = data.count;
   const pageSize = data.page_size;
   const currentPage = data.page_count;
@@ -579,12 +662,14 @@ function displaySearchResults(container, data, csrfToken, searchParams, searchFu
     });
    });
   }
- } else {
+}
+
+
+function displayNoResults(container) {
   container.innerHTML = `
    <div class="alert alert-info text-center mt-3" role="alert">
     ${gettext('No products found. Try a different search term.')}
    </div>`;
- }
 }
 
 
@@ -671,126 +756,174 @@ function updateFavouriteSection(product, is_favourited, favourites_exist, csrfTo
       messageContainer.remove();
     }
     
-    const hasAllergenConflict = product.has_allergen_conflict;
-    const hasDietaryMismatch = product.has_dietary_mismatch;
-    const conflictingTags = product.conflicting_allergens || [];
-    const missingTags = product.missing_dietary_tags || [];
-    let safetyAlertsHtml = '';
-    let cardClasses = "card h-100 border-0 shadow"; 
-
-    if (hasAllergenConflict) {
-        const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        cardClasses = "card h-100 shadow border-danger border-3"; 
-        safetyAlertsHtml += `
-            <div class="alert alert-danger p-1 mb-2 small" role="alert">
-            <strong><i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')}: </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
-            </div>`;
+    favouriteSection.append(createFavouriteCard(product, csrfToken));
+  } else {
+    // the card may not be shown yet if it's on a page of favourites that hasn't been loaded
+    const cardButton = favouriteSection.querySelector(`[data-product-id="${product.id}"]`);
+    if (cardButton) {
+      const cardToRemove = cardButton.closest(".product-card-wrapper");
+      cardToRemove.classList.add("fade-out");
+      setTimeout(() => {
+        cardToRemove.remove();
+      }, 400);
     }
-            
-    if (hasDietaryMismatch) {
-        const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
-        safetyAlertsHtml += `
-          <div class="alert alert-warning p-1 mb-2 small" role="alert">
-          <strong><i class="bi bi-question-circle"></i>  ${gettext('POSSIBLE MISMATCH')}: </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
+    if (favourites_exist === false){
+      setTimeout(() => {
+      const newMessageContainer = document.createElement('div');
+      newMessageContainer.classList.add('product-card-wrapper', 'text-center', 'py-5');
+      newMessageContainer.innerHTML = `<p>${gettext("You haven't favourited any products yet. Start exploring today!")}</p>`
+      favouriteSection.appendChild(newMessageContainer);
+      favouriteSection.classList.add('justify-content-center')
+    }, 400);
+  }
+ }
+}
+
+
+function createFavouriteCard(product, csrfToken) {
+  const hasAllergenConflict = product.has_allergen_conflict;
+  const hasDietaryMismatch = product.has_dietary_mismatch;
+  const conflictingTags = product.conflicting_allergens || [];
+  const missingTags = product.missing_dietary_tags || [];
+  let safetyAlertsHtml = '';
+  let cardClasses = "card h-100 border-0 shadow"; 
+
+  if (hasAllergenConflict) {
+      const conflictingTagsList = conflictingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+      cardClasses = "card h-100 shadow border-danger border-3"; 
+      safetyAlertsHtml += `
+          <div class="alert alert-danger p-1 mb-2 small" role="alert">
+          <strong><i class="bi bi-exclamation-circle"></i>  ${gettext('WARNING')}: </strong> ${gettext('Contains user-specified allergens:')} ${conflictingTagsList}
           </div>`;
-    }
+  }
+          
+  if (hasDietaryMismatch) {
+      const missingTagsList = missingTags.map(tag => `<code>${tag.replace(/_/g, ' ').toUpperCase()}</code>`).join(', ');
+      safetyAlertsHtml += `
+        <div class="alert alert-warning p-1 mb-2 small" role="alert">
+        <strong><i class="bi bi-question-circle"></i>  ${gettext('POSSIBLE MISMATCH')}: </strong> ${gettext('Missing dietary requirements:')} ${missingTagsList}.
+        </div>`;
+  }
 
-    const newFavouriteCard = document.createElement("div");
-    newFavouriteCard.className = "product-card-wrapper";
+  const newFavouriteCard = document.createElement("div");
+  newFavouriteCard.className = "product-card-wrapper";
+
+  const productCard = document.createElement("div");
+  productCard.classList.add(...cardClasses.split(' '));
+  const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
+  const imageUrl = product.image_url || placeholderImageUrl;
+
+  productCard.innerHTML = `
+  <div class="card h-100 border-0 shadow">
+    <img src="${imageUrl}" 
+           alt="${product.product_name || gettext("Product Image")}" 
+           class="card-img-top img-fluid rounded-top" 
+           style="max-height: 150px; object-fit: cover;"
+           onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
+    <div class="card-body d-flex flex-column justify-content-between">
+      <h3 class="card-title h5 mb-2 text-dark">${
+        product.product_name || gettext("No Name")
+      }</h3>
+
+      <div>
+       ${safetyAlertsHtml}
+      </div>
 
-    const productCard = document.createElement("div");
-    productCard.classList.add(...cardClasses.split(' '));
-    const placeholderImageUrl = "/static/media/placeholder-img.jpeg";
-    const imageUrl = product.image_url || placeholderImageUrl;
+      <div>
+      <p class="card-text text-muted mb-1 small"><strong>${gettext('Brands')}:</strong> ${
+        product.brands || "N/A"
+      }</p>
+      <p class="card-text text-muted mb-3 small"><strong>${gettext('Code')}:</strong> ${
+        product.code || "N/A"
+      }</p>
+      </div>
 
-    productCard.innerHTML = `
-    <div class="card h-100 border-0 shadow">
-      <img src="${imageUrl}" 
-             alt="${product.product_name || gettext("Product Image")}" 
-             class="card-img-top img-fluid rounded-top" 
-             style="max-height: 150px; object-fit: cover;"
-             onerror="this.onerror=null;this.src='${placeholderImageUrl}';">
-      <div class="card-body d-flex flex-column justify-content-between">
-        <h3 class="card-title h5 mb-2 text-dark">${
-          product.product_name || gettext("No Name")
-        }</h3>
+      <div class="d-flex align-items-center mb-3">
+        <input class="product-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1">
+        <span class="text-secondary me-1">${
+          product.product_quantity || ""
+        }</span>
+        <span class="text-muted small">${
+          product.product_quantity_unit || gettext("item")
+        }</span>
+      </div>
 
-        <div>
-         ${safetyAlertsHtml}
-        </div>
+      <div class="mt-auto d-flex flex-column">
+        <button class="btn btn-outline-primary btn-sm mb-2 add-btn" 
+                data-product-name="${product.product_name || gettext("No Name")}" 
+                data-product-id="${product.id}">
+          ${gettext('Add to Pantry')}
+        </button>
+        <button class="btn btn-outline-danger btn-sm favourite-btn" 
+                data-product-id="${product.id}">
+          ${gettext('Remove Favourite')}
+        </button>
+      </div>
+    </div>
+  </div>`;
 
-        <div>
-        <p class="card-text text-muted mb-1 small"><strong>${gettext('Brands')}:</strong> ${
-          product.brands || "N/A"
-        }</p>
-        <p class="card-text text-muted mb-3 small"><strong>${gettext('Code')}:</strong> ${
-          product.code || "N/A"
-        }</p>
-        </div>
+  newFavouriteCard.appendChild(productCard);
 
-        <div class="d-flex align-items-center mb-3">
-          <input class="product-quantity-input form-control me-2" type="number" min="1.00" step="1.00" value="1">
-          <span class="text-secondary me-1">${
-            product.product_quantity || ""
-          }</span>
-          <span class="text-muted small">${
-            product.product_quantity_unit || gettext("item")
-          }</span>
-        </div>
+  const favouriteButton = newFavouriteCard.querySelector(".favourite-btn");
+  favouriteButton.addEventListener("click", (event) => {
+    const clickedButton = event.target;
+    const productIdToFav = clickedButton.dataset.productId;
+    favouriteProduct(productIdToFav, csrfToken, clickedButton);
+  });
 
-        <div class="mt-auto d-flex flex-column">
-          <button class="btn btn-outline-primary btn-sm mb-2 add-btn" 
-                  data-product-name="${product.product_name || gettext("No Name")}" 
-                  data-product-id="${product.id}">
-            ${gettext('Add to Pantry')}
-          </button>
-          <button class="btn btn-outline-danger btn-sm favourite-btn" 
-                  data-product-id="${product.id}">
-            ${gettext('Remove Favourite')}
-          </button>
-        </div>
-      </div>
-    </div>`;
+  const addButton = newFavouriteCard.querySelector(".add-btn");
+  addButton.addEventListener("click", (event) => {
+    const clickedButton = event.target;
+    const productIdToAdd = clickedButton.dataset.productId;
+    const quantityInput = newFavouriteCard.querySelector(
+      ".product-quantity-input"
+    ).value;
+    addProduct(productIdToAdd, quantityInput, csrfToken, newFavouriteCard);
+  });
 
-    newFavouriteCard.appendChild(productCard);
+  return newFavouriteCard;
+}
 
-    favouriteSection.append(newFavouriteCard);
 
-    const favouriteButton = newFavouriteCard.querySelector(".favourite-btn");
-    favouriteButton.addEventListener("click", (event) => {
-      const clickedButton = event.target;
-      const productIdToFav = clickedButton.dataset.productId;
-      favouriteProduct(productIdToFav, csrfToken, clickedButton);
-    });
+let isLoadingFavourites = false;
+let favouritesObserver = null;
 
-    const addButton = newFavouriteCard.querySelector(".add-btn");
-    addButton.addEventListener("click", (event) => {
-      const clickedButton = event.target;
-      const productIdToAdd = clickedButton.dataset.productId;
-      const quantityInput = newFavouriteCard.querySelector(
-        ".product-quantity-input"
-      ).value;
-      addProduct(productIdToAdd, quantityInput, csrfToken, newFavouriteCard);
-    });
-  } else {
-    const cardToRemove = favouriteSection.querySelector(`[data-product-id="${product.id}"]`).closest(".product-card-wrapper");
-    cardToRemove.classList.add("fade-out");
-    setTimeout(() => {
-      cardToRemove.remove();
-    }, 400);
-    if (favourites_exist === false){
-      setTimeout(() => {
-      const newMessageContainer = document.createElement('div');
-      newMessageContainer.classList.add('product-card-wrapper', 'text-center', 'py-5');
-      newMessageContainer.innerHTML = `<p>${gettext("You haven't favourited any products yet. Start exploring today!")}</p>`
-      favouriteSection.appendChild(newMessageContainer);
-      favouriteSection.classList.add('justify-content-center')
-    }, 400);
+function loadFavourites(csrfToken) {
+  const favouriteSection = document.querySelector(".product-cards-wrapper");
+  const cursor = favouriteSection.dataset.nextCursor;
+
+  if (!cursor || isLoadingFavourites) {
+    return;
   }
- }
+  isLoadingFavourites = true;
+
+  fetch(`/favourites/?cursor=${encodeURIComponent(cursor)}`)
+    .then((response) => response.json())
+    .then((data) => {
+      const sentinel = document.getElementById("favouritesSentinel");
+      data.products.forEach((product) => {
+        // skip products favourited since the page loaded, their cards were already added
+        if (!favouriteSection.querySelector(`.favourite-btn[data-product-id="${product.id}"]`)) {
+          favouriteSection.insertBefore(createFavouriteCard(product, csrfToken), sentinel);
+        }
+      });
+      favouriteSection.dataset.nextCursor = data.next_cursor || "";
+
+      // the observer only fires when the sentinel enters or leaves view, so it is observed again after a
+      // page loads, to load the next one if a short page left the sentinel in view (errors aren't retried)
+      if (data.next_cursor && favouritesObserver) {
+        favouritesObserver.unobserve(sentinel);
+        favouritesObserver.observe(sentinel);
+      }
+    })
+    .catch((error) => console.error(gettext("Error loading favourites:"), error))
+    .finally(() => {
+      isLoadingFavourites = false;
+    });
 }
 
 
+
 function displaySuggestions(suggestions, autocompleteSuggestionsDiv, productNameInput) {
   autocompleteSuggestionsDiv.innerHTML = "";
 
@@ -879,4 +1012,4 @@ function startScanner() {
       html5QrCode = null;
     });
   }
-}
\ No newline at end of file
+}
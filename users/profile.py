@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.db import transaction
+from savor.utils import LANGUAGE_CODE_MAP, OFF_API_BASE_URL, resolve_off_base_url
+from .models import User, UserSettings
+
+# how long (in seconds) a user's profile is kept in the cache, it is also dropped whenever it changes
+USER_PROFILE_CACHE_TTL = 60 * 60 * 24
+
+
+class UserProfile:
+    """
+    Everything a request needs to know about a user: their settings, the language and
+    OFF endpoint those resolve to, their allergen and dietary tags, and the ids of
+    their favourited products.
+
+    Built once per request by `get_user_profile` and cached across requests, so
+    that the middleware, views and search functions share a single copy instead
+    of each loading the user's settings and favourites again.
+    """
+    def __init__(self, user_id, language_preference=None, country=None, scan_to_add=False, show_nutri_score=True,
+                 show_eco_score=True, prioritise_local_results=False, allergens=(), dietary_tags=(), favourite_product_ids=()):
+        self.user_id = user_id
+        self.language_preference = language_preference
+        self.country = country
+        self.scan_to_add = scan_to_add
+        self.show_nutri_score = show_nutri_score
+        self.show_eco_score = show_eco_score
+        self.prioritise_local_results = prioritise_local_results
+        # (id, api_tag) pairs
+        self.allergens = [tuple(allergen) for allergen in allergens]
+        self.dietary_tags = set(dietary_tags)
+        self.favourite_product_ids = set(favourite_product_ids)
+
+        self.language_code = LANGUAGE_CODE_MAP.get(language_preference, 'en')
+        self.allergen_tags = {api_tag for _, api_tag in self.allergens}
+        self.off_base_url = resolve_off_base_url(
+            country=country,
+            language_preference=language_preference,
+            prioritise_local_results=prioritise_local_results,
+        )
+
+    def to_cache(self):
+        return {
+            'user_id': self.user_id,
+            'language_preference': self.language_preference,
+            'country': self.country,
+            'scan_to_add': self.scan_to_add,
+            'show_nutri_score': self.show_nutri_score,
+            'show_eco_score': self.show_eco_score,
+            'prioritise_local_results': self.prioritise_local_results,
+            'allergens': self.allergens,
+            'dietary_tags': sorted(self.dietary_tags),
+            'favourite_product_ids': sorted(self.favourite_product_ids),
+        }
+
+
+def get_user_profile_cache_key(user_id):
+    return f"user_profile_{user_id}"
+
+
+def build_user_profile(user_id):
+    """Loads a user's profile from the database, in four queries."""
+    user_settings = UserSettings.objects.filter(user_id=user_id).values(
+        'id', 'language_preference', 'country', 'scan_to_add', 'show_nutri_score', 'show_eco_score', 'prioritise_local_results'
+    ).first()
+
+    favourite_product_ids = User.favourited_products.through.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+
+    if user_settings is None:
+        return UserProfile(user_id, favourite_product_ids=favourite_product_ids)
+
+    settings_id = user_settings.pop('id')
+    allergens = UserSettings.allergens.through.objects.filter(usersettings_id=settings_id).values_list('allergen_id', 'allergen__api_tag')
+    dietary_tags = UserSettings.dietary_requirements.through.objects.filter(usersettings_id=settings_id).values_list(
+        'dietaryrequirement__api_tag', flat=True
+    )
+
+    return UserProfile(
+        user_id,
+        allergens=allergens,
+        dietary_tags=dietary_tags,
+        favourite_product_ids=favourite_product_ids,
+        **user_settings,
+    )
+
+
+def load_user_profile(user_id):
+    """Returns a user's profile from the cache, building and caching it on a miss."""
+    cache_key = get_user_profile_cache_key(user_id)
+    cached_profile = cache.get(cache_key)
+
+    if cached_profile is not None:
+        return UserProfile(**cached_profile)
+
+    profile = build_user_profile(user_id)
+    cache.set(cache_key, profile.to_cache(), timeout=USER_PROFILE_CACHE_TTL)
+    return profile
+
+
+def get_user_profile(request):
+    """Returns the profile of the request's user, loaded at most once per request, or None for anonymous users."""
+    if not request.user.is_authenticated:
+        return None
+
+    profile = getattr(request, '_user_profile', None)
+    if profile is None:
+        profile = load_user_profile(request.user.pk)
+        request._user_profile = profile
+    return profile
+
+
+def get_request_off_base_url(request):
+    """Returns the Open Food Facts base URL to query for a request, based on its user's localisation settings."""
+    profile = get_user_profile(request)
+    return profile.off_base_url if profile else OFF_API_BASE_URL
+
+
+def invalidate_user_profile(user_id):
+    cache_key = get_user_profile_cache_key(user_id)
+    cache.delete(cache_key)
+    # deleted again once the change is committed, in case another request cached the old profile in the meantime
+    transaction.on_commit(lambda: cache.delete(cache_key))
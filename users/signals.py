@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from .models import UserSettings
+from .profile import invalidate_user_profile
 
 User = get_user_model()
 
@@ -12,4 +13,36 @@ def create_user_settings(sender, instance, created, **kwargs):
     """
     if created:
         UserSettings.objects.create(user=instance)
-        print("user settings created")
\ No newline at end of file
+        print("user settings created")
+
+
+@receiver(post_save, sender=UserSettings)
+def invalidate_profile_on_settings_save(sender, instance, **kwargs):
+    """Drops the cached profile of a user whose settings were saved."""
+    invalidate_user_profile(instance.user_id)
+
+
+@receiver(m2m_changed, sender=UserSettings.allergens.through)
+@receiver(m2m_changed, sender=UserSettings.dietary_requirements.through)
+def invalidate_profile_on_requirements_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drops the cached profile of a user whose allergens or dietary requirements changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # an allergen or requirement's set of users was changed, rather than a user's settings
+        for user_id in UserSettings.objects.filter(id__in=pk_set or []).values_list('user_id', flat=True):
+            invalidate_user_profile(user_id)
+    else:
+        invalidate_user_profile(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.favourited_products.through)
+def invalidate_profile_on_favourites_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drops the cached profile of a user whose favourited products changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        for user_id in pk_set or []:
+            invalidate_user_profile(user_id)
+    else:
+        invalidate_user_profile(instance.pk)